@@ -3,7 +3,9 @@ from __future__ import annotations
 
 import os
 import shlex
+import subprocess
 import sys
+import time
 from pathlib import Path
 from typing import Optional
 import typer
@@ -21,20 +23,59 @@ def _abs(p: str) -> str:
     return str(Path(p).expanduser().resolve())
 
 
-@app.command()
+@app.callback(invoke_without_command=True)
 def main(
-    input_dir: str = typer.Option(..., "--input_dir", "-i", help="Directory with MAG FASTA files"),
-    output_dir: str = typer.Option(..., "--output_dir", "-o", help="Output directory"),
-    file_extension: str = typer.Option(".fasta", "--file_extension", "-e", help="FASTA extension (e.g. .fa,.fna,.fasta)"),
+    ctx: typer.Context,
+    input_dir: Optional[str] = typer.Option(None, "--input_dir", "-i", help="Directory with MAG FASTA files"),
+    output_dir: Optional[str] = typer.Option(None, "--output_dir", "-o", help="Output directory"),
+    file_extension: str = typer.Option(".fasta", "--file_extension", "-e", help="FASTA extension (e.g. .fa,.fna,.fasta,.fa.gz)"),
     threads: int = typer.Option(8, "--threads", "-t", help="Max threads"),
+    mem_gb: Optional[float] = typer.Option(None, "--mem_gb", help="Max memory (GB) shared by concurrent jobs"),
     modules: str = typer.Option(DEFAULT_MODULES, "--modules", help="Comma-separated modules to run"),
     force_rerun: bool = typer.Option(False, "--force_rerun", "-f", help="Force re-execution"),
+    cache_dir: Optional[str] = typer.Option(None, "--cache_dir", help="Shared result cache for CheckM2/GUNC/GTDB-Tk"),
+    shard: Optional[str] = typer.Option(None, "--shard", help="Run only shard i of n (e.g. 2/8) in <output_dir>/shards/; combine with magport merge"),
     snake_args: Optional[str] = typer.Option(None, "--snake_args", help="Extra Snakemake args, e.g. --snake_args '--unlock'"),
+    dashboard: bool = typer.Option(False, "--dashboard", help="Show live progress instead of the Snakemake log (saved under logs/)"),
 ):
     """Run MAGport Snakemake workflow."""
 
+    if ctx.invoked_subcommand is not None:
+        return
+    if not input_dir or not output_dir:
+        console.print("[red]Error:[/red] --input_dir and --output_dir are required to run the workflow")
+        raise typer.Exit(code=2)
+
+    cmd, config_data = _prepare_run(input_dir, output_dir, file_extension, threads, mem_gb, modules,
+                                    force_rerun, cache_dir, snake_args, shard)
+    output_dir = config_data["output_dir"]
+
+    # Don't print extra info if generating DAG
+    if not snake_args or "--dag" not in snake_args:
+        console.print("[bold]Running Snakemake...[/bold]")
+        console.print(" ".join(shlex.quote(c) for c in cmd))
+
+    if dashboard and not (snake_args and ("-n" in shlex.split(snake_args) or "--dag" in snake_args)):
+        rc = _run_with_dashboard(cmd, Path(output_dir), config_data)
+    else:
+        rc = os.spawnvp(os.P_WAIT, cmd[0], cmd)
+    raise typer.Exit(code=rc)
+
+
+def _prepare_run(input_dir: str, output_dir: str, file_extension: str, threads: int, mem_gb: Optional[float],
+                 modules: str, force_rerun: bool = False, cache_dir: Optional[str] = None,
+                 snake_args: Optional[str] = None, shard: Optional[str] = None) -> tuple[list[str], dict]:
+    """Write <output_dir>/config.yaml from the defaults and CLI options; returns the Snakemake command and config."""
     input_dir = _abs(input_dir)
     output_dir = _abs(output_dir)
+    if shard:
+        from magport.shard import parse_shard, shard_dir
+
+        try:
+            output_dir = str(shard_dir(Path(output_dir), *parse_shard(shard)))
+        except ValueError as e:
+            console.print(f"[red]Error:[/red] --shard: {e}")
+            raise typer.Exit(code=2)
     os.makedirs(output_dir, exist_ok=True)
 
     # 1. 读取默认 config.yaml
@@ -48,6 +89,10 @@ def main(
     config_data["file_extension"] = file_extension
     config_data["threads"] = threads
     config_data["modules"] = modules
+    if cache_dir:
+        config_data["result_cache_dir"] = _abs(cache_dir)
+    if shard:
+        config_data["shard"] = shard
 
     # 3. 写入输出目录下的 config.yaml
     new_config_path = Path(output_dir) / "config.yaml"
@@ -70,19 +115,432 @@ def main(
         "--configfile",
         str(new_config_path),
     ]
+    if mem_gb:
+        cmd += ["--resources", f"mem_mb={int(mem_gb * 1000)}"]
     if force_rerun:
         cmd += ["--forceall"]
     if snake_args:
         cmd += shlex.split(snake_args)
+    return cmd, config_data
 
-    # Don't print extra info if generating DAG
-    if not snake_args or "--dag" not in snake_args:
-        console.print("[bold]Running Snakemake...[/bold]")
-        console.print(" ".join(shlex.quote(c) for c in cmd))
 
+def _run_with_dashboard(cmd: list[str], output_dir: Path, config_data: dict, refresh_s: float = 5.0) -> int:
+    """Run Snakemake with its log sent to a file while a live status view refreshes."""
+    from rich.live import Live
+
+    from magport.status import StatusReader
+
+    log_dir = output_dir / config_data.get("directories", {}).get("logs", "logs")
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"snakemake.{time.strftime('%Y%m%d-%H%M%S')}.log"
+    console.print(f"Snakemake log: {log_path}")
+    reader = StatusReader(output_dir, Path.cwd())
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            with Live(_status_view(reader.snapshot()), console=console, refresh_per_second=1) as live:
+                while proc.poll() is None:
+                    time.sleep(refresh_s)
+                    live.update(_status_view(reader.snapshot()))
+        except KeyboardInterrupt:
+            proc.wait()  # Snakemake got the same SIGINT and cancels its jobs
+    if proc.returncode:
+        console.print(f"[red]Snakemake exited with code {proc.returncode}[/red]; last lines of {log_path}:")
+        with open(log_path, errors="replace") as f:
+            console.print("".join(f.readlines()[-20:]), markup=False, highlight=False)
+    return proc.returncode
+
+
+@app.command("watch")
+def watch(
+    input_dir: str = typer.Option(..., "--input_dir", "-i", help="Directory new MAG FASTA files arrive in"),
+    output_dir: str = typer.Option(..., "--output_dir", "-o", help="Project output directory"),
+    file_extension: str = typer.Option(".fasta", "--file_extension", "-e", help="FASTA extension (e.g. .fa,.fna,.fasta,.fa.gz)"),
+    threads: int = typer.Option(8, "--threads", "-t", help="Max threads, shared by the concurrent batches"),
+    mem_gb: Optional[float] = typer.Option(None, "--mem_gb", help="Max memory (GB), shared by the concurrent batches"),
+    modules: str = typer.Option(DEFAULT_MODULES, "--modules", help="Comma-separated modules to run"),
+    cache_dir: Optional[str] = typer.Option(None, "--cache_dir", help="Shared result cache for CheckM2/GUNC/GTDB-Tk"),
+    snake_args: Optional[str] = typer.Option(None, "--snake_args", help="Extra Snakemake args for every batch"),
+    batch_mags: int = typer.Option(50, "--batch_mags", help="MAGs per micro-batch"),
+    window: float = typer.Option(600, "--window", help="Start a smaller batch once its oldest MAG waited this many seconds"),
+    settle: float = typer.Option(60, "--settle", help="Only take files not modified for this many seconds"),
+    poll: float = typer.Option(30, "--poll", help="Seconds between scans of the input directory"),
+    parallel: int = typer.Option(1, "--parallel", help="Batches run at the same time"),
+    retries: int = typer.Option(2, "--retries", help="Reruns of a failed batch before it is set aside"),
+    once: bool = typer.Option(False, "--once", help="Process the MAGs present now and exit"),
+):
+    """Process MAGs arriving in --input_dir in micro-batches and merge them into one project."""
+    from magport.watch import WATCH_DIR, Watcher, acquire_lock
+
+    input_dir = _abs(input_dir)
+    output_dir = _abs(output_dir)
+    lock = acquire_lock(Path(output_dir) / WATCH_DIR)
+    if lock is None:
+        console.print(f"[red]Error:[/red] another watcher is running on {output_dir}")
+        raise typer.Exit(code=1)
+
+    with open(Path(__file__).parent.parent / "config" / "config.yaml", "r", encoding="utf-8") as f:
+        config_data = yaml.safe_load(f)
+
+    def make_cmd(batch_input: str, batch_output: str, batch_threads: int, batch_mem_gb: Optional[float]) -> list[str]:
+        return _prepare_run(batch_input, batch_output, file_extension, batch_threads, batch_mem_gb, modules,
+                            cache_dir=cache_dir, snake_args=snake_args)[0]
+
+    def log(msg: str) -> None:
+        console.print(f"[dim]{time.strftime('%Y-%m-%d %H:%M:%S')}[/dim] {msg}", highlight=False)
+
+    watcher = Watcher(Path(input_dir), Path(output_dir), file_extension, config_data, make_cmd,
+                      _load_script("result_store"), threads, mem_gb, batch_mags=batch_mags, window_s=window,
+                      settle_s=settle, poll_s=poll, parallel=parallel, retries=retries, log=log)
+    try:
+        watcher.run(once=once)
+    except KeyboardInterrupt:
+        log("stopped; running batches resume on the next start")
+    finally:
+        lock.close()
+
+
+@app.command("cache-evict")
+def cache_evict(
+    cache_dir: str = typer.Option(..., "--cache_dir", help="Result cache directory"),
+    max_gb: Optional[float] = typer.Option(None, "--max_gb", help="Evict least recently used entries until below this size"),
+    max_age_days: Optional[float] = typer.Option(None, "--max_age_days", help="Evict entries not used for this many days"),
+):
+    """Prune the shared CheckM2/GUNC/GTDB-Tk result cache."""
+
+    if max_gb is None and max_age_days is None:
+        console.print("[red]Error:[/red] give --max_gb and/or --max_age_days")
+        raise typer.Exit(code=2)
+    script = str(Path(__file__).parent.parent / "workflow" / "scripts" / "result_cache.py")
+    cmd = [sys.executable, script, "evict", "--cache-dir", _abs(cache_dir)]
+    if max_gb is not None:
+        cmd += ["--max-gb", str(max_gb)]
+    if max_age_days is not None:
+        cmd += ["--max-age-days", str(max_age_days)]
     rc = os.spawnvp(os.P_WAIT, cmd[0], cmd)
     raise typer.Exit(code=rc)
 
 
+@app.command("profile")
+def profile(
+    output_dir: str = typer.Argument(..., help="MAGport output directory of a finished (or running) run"),
+    top: int = typer.Option(15, "--top", help="Rows to show per table"),
+):
+    """Summarise the benchmark files of a run: cost per rule and per MAG, critical path, core usage."""
+
+    from magport.profile import build_profile, write_profile
+
+    prof = build_profile(Path(_abs(output_dir)))
+    if prof["jobs"].empty:
+        console.print(f"[red]Error:[/red] no benchmark files found in {prof['bench_dir']}")
+        raise typer.Exit(code=1)
+
+    jobs, rules = prof["jobs"], prof["rules"]
+    console.print(f"[bold]{len(jobs)} jobs[/bold], {jobs['cpu_time'].sum() / 3600:.2f} CPU hours, "
+                  f"{prof['span_s'] / 3600:.2f} h from first start to last end")
+
+    table = Table(title="Cost per rule (by CPU hours)")
+    for col in ["rule", "jobs", "wall h", "mean s", "max s", "CPU h", "share", "max RSS GB", "I/O in/out GB"]:
+        table.add_column(col, justify="left" if col == "rule" else "right")
+    for rule, r in rules.head(top).iterrows():
+        table.add_row(rule, str(int(r["jobs"])), f"{r['wall_s'] / 3600:.2f}", f"{r['mean_s']:.1f}", f"{r['max_s']:.1f}",
+                      f"{r['cpu_h']:.2f}", f"{r['cpu_share']:.1%}", f"{r['max_rss_mb'] / 1024:.2f}",
+                      f"{r['io_in_mb'] / 1024:.2f}/{r['io_out_mb'] / 1024:.2f}")
+    console.print(table)
+
+    if not prof["fits"].empty:
+        table = Table(title="Per-MAG cost vs genome size (s = base + slope * Mb)")
+        for col in ["rule", "jobs", "base s", "s per Mb", "r"]:
+            table.add_column(col, justify="left" if col == "rule" else "right")
+        for rule, r in prof["fits"].iterrows():
+            table.add_row(rule, str(int(r["jobs"])), f"{r['base_s']:.1f}", f"{r['s_per_mb']:.2f}", f"{r['r']:.2f}")
+        console.print(table)
+        mags = prof["mags"]
+        slowest = (mags["total_s"] / mags["genome_mb"].where(mags["genome_mb"] > 0)).dropna().nlargest(min(top, 5))
+        if not slowest.empty:
+            console.print("Slowest MAGs per Mb: " + ", ".join(f"{m} ({v:.0f} s/Mb)" for m, v in slowest.items()))
+
+    path = prof["critical_path"]
+    if path:
+        total = path[-1]["finish_s"]
+        table = Table(title=f"Critical path: {total / 3600:.2f} h of measured wall time")
+        for col in ["rule", "MAG / batch", "wall s", "share"]:
+            table.add_column(col, justify="left" if col in ("rule", "MAG / batch") else "right")
+        for step in path:
+            table.add_row(step["rule"], step["wildcard"] or "-", f"{step['s']:.1f}",
+                          f"{step['s'] / total:.1%}" if total else "-")
+        console.print(table)
+
+    timeline = prof["timeline"]
+    if not timeline.empty:
+        cores = prof["threads"] or max(1.0, float(timeline["cores"].max()))
+        mean = float(timeline["cores"].mean())
+        table = Table(title=f"Core utilisation ({mean:.1f} of {cores:g} cores on average, {mean / cores:.0%})")
+        for col in ["time", "cores", "jobs", ""]:
+            table.add_column(col, justify="right" if col else "left")
+        for r in timeline.itertuples(index=False):
+            bar = "#" * int(round(30 * min(1.0, r.cores / cores)))
+            table.add_row(f"{r.offset_s / 60:.1f} min", f"{r.cores:.1f}", f"{r.jobs:.1f}", bar)
+        console.print(table)
+
+    for written in write_profile(prof):
+        console.print(f"Wrote {written}")
+
+
+@app.command("estimate")
+def estimate(
+    input_dir: str = typer.Option(..., "--input_dir", "-i", help="Directory with MAG FASTA files"),
+    file_extension: str = typer.Option(".fasta", "--file_extension", "-e", help="FASTA extension (e.g. .fa,.fna,.fasta,.fa.gz)"),
+    threads: int = typer.Option(8, "--threads", "-t", help="Threads of the planned run"),
+    max_threads: int = typer.Option(128, "--max_threads", help="Largest thread count to simulate"),
+    mem_gb: Optional[float] = typer.Option(None, "--mem_gb", help="Memory cap (GB) of the planned run"),
+    output_dir: Optional[str] = typer.Option(None, "--output_dir", "-o", help="Output directory of the planned run (its config.yaml and benchmarks are used when present)"),
+    history: Optional[list[str]] = typer.Option(None, "--history", help="Output directory of an earlier run to refit the models from (repeatable)"),
+    config: Optional[list[str]] = typer.Option(None, "--config", help="Run setting as key=value, e.g. --config batch_size=500 (repeatable)"),
+    gate_pass: float = typer.Option(1.0, "--gate_pass", help="Expected share of MAGs passing the quality gate (quality_gate: true)"),
+    top: int = typer.Option(15, "--top", help="Rows to show per table"),
+):
+    """Predict wall time, peak memory, critical path and the best thread count of a run from its inputs."""
+
+    from magport.estimate import REF_THREADS, estimate_run, load_config, load_history, load_settings, read_inputs
+
+    overrides = {}
+    for item in config or []:
+        key, found, value = item.partition("=")
+        if not found:
+            console.print(f"[red]Error:[/red] --config expects key=value, got {item!r}")
+            raise typer.Exit(code=2)
+        overrides[key.strip()] = yaml.safe_load(value)
+    out = Path(_abs(output_dir)) if output_dir else None
+    models, used, ref_threads = load_history([Path(_abs(h)) for h in history or []] + ([out] if out else []))
+    settings = load_settings(load_config(out, overrides), ref_threads or REF_THREADS, gate_pass)
+    inputs = read_inputs(Path(_abs(input_dir)), file_extension, settings)
+    if not inputs:
+        console.print(f"[red]Error:[/red] no MAGs found in {input_dir} with extension {file_extension}")
+        raise typer.Exit(code=1)
+
+    est = estimate_run(inputs, settings, models, threads, max_threads, int(mem_gb * 1000) if mem_gb else None)
+    console.print(f"[bold]{est['mags']} MAGs[/bold], {est['total_mb'] / 1000:.2f} Gb, {est['jobs']} jobs"
+                  + (f", {est['sharded']} MAGs split into contig groups" if est["sharded"] else "")
+                  + "; models: " + ("refitted from " + ", ".join(used) if used else "built-in"))
+
+    table = Table(title="Predicted schedule by thread count")
+    for col in ["threads", "wall time", "peak mem GB", "core use", ""]:
+        table.add_column(col, justify="right" if col else "left")
+    for r in est["scaling"]:
+        note = " ".join(n for n, on in [("planned", r["cores"] == threads), ("optimal", r["cores"] == est["optimal"])] if on)
+        table.add_row(str(r["cores"]), _duration(r["wall_min"] * 60), f"{r['peak_mem_mb'] / 1000:.1f}",
+                      f"{r['use']:.0%}", note)
+    console.print(table)
+
+    table = Table(title=f"Cost per rule at {threads} threads (by core hours)")
+    for col in ["rule", "jobs", "threads", "mean", "max", "max mem GB", "core h"]:
+        table.add_column(col, justify="left" if col == "rule" else "right")
+    for tag, t in list(est["per_tag"].items())[:top]:
+        table.add_row(tag, str(t["jobs"]), str(t["threads"]), _duration(t["minutes"] / t["jobs"] * 60),
+                      _duration(t["max_min"] * 60), f"{t['max_mem_mb'] / 1000:.1f}", f"{t['core_h']:.1f}")
+    console.print(table)
+
+    path = est["critical_path"]
+    total = sum(job.minutes for job in path)
+    table = Table(title=f"Critical path: {_duration(total * 60)} with unlimited cores")
+    for col in ["rule", "MAG / batch", "time", "share"]:
+        table.add_column(col, justify="left" if col in ("rule", "MAG / batch") else "right")
+    for job in path:
+        table.add_row(job.tag, job.key or "-", _duration(job.minutes * 60), f"{job.minutes / total:.1%}" if total else "-")
+    console.print(table)
+
+    run = est["run"]
+    console.print(f"At {threads} threads: [bold]{_duration(run['wall_min'] * 60)}[/bold] wall time, "
+                  f"{run['peak_mem_mb'] / 1000:.1f} GB peak memory reserved; "
+                  f"optimal thread count: [bold]{est['optimal']}[/bold]")
+    big = max(est["per_tag"].values(), key=lambda t: t["max_mem_mb"])["max_mem_mb"]
+    if mem_gb and big > mem_gb * 1000:
+        console.print(f"[yellow]Warning:[/yellow] the largest job reserves {big / 1000:.1f} GB, above --mem_gb {mem_gb:g}")
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 90:
+        return f"{seconds:.0f} s"
+    if seconds < 5400:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def _status_view(snap, max_running: int = 15):
+    """Rich renderable of a magport.status.Snapshot."""
+    from datetime import datetime
+
+    from rich.console import Group
+
+    if snap.running:
+        finish = (f", done around {datetime.fromtimestamp(snap.taken + snap.eta_s):%Y-%m-%d %H:%M}"
+                  if snap.eta_s else "")
+        head = (f"[bold]{len(snap.running)} jobs running[/bold] on {snap.mags} MAGs, "
+                f"{snap.concurrency:.1f} jobs busy on average, ETA {_duration(snap.eta_s)}{finish}")
+    elif snap.finished:
+        head = f"[bold green]All jobs finished[/bold green] for {snap.mags} MAGs"
+    else:
+        head = f"[bold yellow]Not running[/bold yellow]: {snap.mags} MAGs, unfinished jobs remain"
+
+    table = Table(title=f"Progress per rule ({snap.output_dir})")
+    for col in ["rule", "jobs", "MAGs", "running", "MAGs/h", "mean s", "left (job time)"]:
+        table.add_column(col, justify="left" if col == "rule" else "right")
+    for r in snap.rules:
+        total, done = len(r.members), len(r.done)
+        style = "green" if done == total else "cyan" if r.running else ""
+        mean_s = sum(s for s, _ in r.done.values()) / done if done else None
+        table.add_row(r.tag, f"{done}/{total}", f"{r.mags_done}/{r.mags_total}", str(len(r.running) or ""),
+                      f"{r.mags_per_h:.0f}" if r.mags_per_h else "",
+                      f"{mean_s:.1f}" if mean_s is not None else "", _duration(r.remaining_s) if done < total else "",
+                      style=style)
+    parts = [head, table]
+
+    if snap.running:
+        table = Table(title="Running jobs")
+        for col in ["rule", "MAG / batch", "running for", "RSS"]:
+            table.add_column(col, justify="left" if col in ("rule", "MAG / batch") else "right")
+        for job in snap.running[:max_running]:
+            rss = f"{job.rss_mb / 1024:.2f} GB" if job.rss_mb is not None else "-"
+            table.add_row(job.tag, job.wildcard or "-", _duration(snap.taken - job.started), rss)
+        if len(snap.running) > max_running:
+            table.caption = f"... and {len(snap.running) - max_running} more"
+        parts.append(table)
+    return Group(*parts)
+
+
+@app.command("status")
+def status(
+    output_dir: str = typer.Argument(..., help="MAGport output directory of a running (or finished) run"),
+    watch: Optional[float] = typer.Option(None, "--watch", "-w", help="Refresh every this many seconds until the run ends"),
+    workdir: Optional[str] = typer.Option(None, "--workdir", help="Directory Snakemake runs in (holds .snakemake/); default: here and the MAGport repository"),
+):
+    """Per-rule progress, throughput, ETA and running jobs of a run (read-only)."""
+
+    from magport.status import StatusReader
+
+    out = Path(_abs(output_dir))
+    if not (out / "input_MAGs.txt").is_file():
+        console.print(f"[red]Error:[/red] {out} has no input_MAGs.txt; is it a MAGport output directory?")
+        raise typer.Exit(code=1)
+    reader = StatusReader(out, Path(_abs(workdir)) if workdir else None)
+    if not watch:
+        console.print(_status_view(reader.snapshot()))
+        return
+
+    from rich.live import Live
+
+    with Live(_status_view(reader.snapshot()), console=console, refresh_per_second=1) as live:
+        while True:
+            time.sleep(watch)
+            snap = reader.snapshot()
+            live.update(_status_view(snap))
+            if snap.finished:
+                break
+
+
+@app.command("merge")
+def merge(
+    output_dir: str = typer.Argument(..., help="Output directory of the merged run"),
+    shard_dirs: Optional[list[str]] = typer.Argument(None, help="Shard output directories (default: <output_dir>/shards/*)"),
+    partial: bool = typer.Option(False, "--partial", help="Merge the finished shards even if others are missing or unfinished"),
+):
+    """Combine the outputs of `magport --shard i/n` runs into one summary, store, tool tables and report."""
+
+    from magport.shard import check_shards, find_shards, merge_shards, read_shard
+
+    out = Path(_abs(output_dir))
+    paths = [Path(_abs(p)) for p in shard_dirs] if shard_dirs else find_shards(out)
+    shards = []
+    for path in paths:
+        shard = read_shard(path)
+        if shard is None:
+            console.print(f"[red]Error:[/red] {path} is not the output directory of a --shard run")
+            raise typer.Exit(code=2)
+        shards.append(shard)
+    if not shards:
+        console.print(f"[red]Error:[/red] no shard runs found in {out / 'shards'}")
+        raise typer.Exit(code=2)
+
+    table = Table(title=f"{len(shards)} shards")
+    for col in ("Shard", "MAGs", "Status", "Directory"):
+        table.add_column(col, justify="right" if col == "MAGs" else "left")
+    for s in sorted(shards, key=lambda s: s.index):
+        table.add_row(f"{s.index}/{s.count}", str(len(s.mags)), "finished" if s.finished else "[yellow]unfinished[/yellow]",
+                      str(s.path))
+    console.print(table)
+
+    problems = check_shards(shards)
+    if problems:
+        for problem in problems:
+            console.print(f"[yellow]Warning:[/yellow] {problem}")
+        if not partial:
+            console.print("[red]Error:[/red] not merging an incomplete set of shards (use --partial to merge anyway)")
+            raise typer.Exit(code=1)
+        shards = list({s.index: s for s in reversed(shards) if s.finished}.values())
+        if not shards:
+            raise typer.Exit(code=1)
+    merge_shards(out, shards, _load_script("result_store"), log=lambda msg: console.print(f"[merge] {msg}"))
+
+
+def _load_script(name: str):
+    """Import a workflow script (e.g. result_store.py) as a module."""
+    import importlib.util
+
+    path = Path(__file__).parent.parent / "workflow" / "scripts" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@app.command("query")
+def query(
+    output_dir: str = typer.Argument(..., help="MAGport output directory"),
+    expr: str = typer.Argument("", help="Filter, e.g. \"Completeness > 90 and MIMAG_level == 'HQ'\""),
+    columns: Optional[str] = typer.Option(None, "--columns", "-c", help="Comma-separated columns to show"),
+    sort: Optional[str] = typer.Option(None, "--sort", help="Sort by this column (default: ID)"),
+    desc: bool = typer.Option(False, "--desc", help="Sort descending"),
+    limit: Optional[int] = typer.Option(None, "--limit", "-n", help="Show at most this many MAGs"),
+    tsv: bool = typer.Option(False, "--tsv", help="Print all matching rows as TSV instead of a table"),
+):
+    """Filter the per-MAG results of a run through the indexed result store."""
+
+    from magport.profile import load_run_config
+
+    store = _load_script("result_store")
+    out = Path(_abs(output_dir))
+    db = out / load_run_config(out).get("output_files", {}).get("store", "magport.sqlite")
+    if not db.is_file():
+        console.print(f"[red]Error:[/red] no result store at {db}; run the workflow (or its summary step) first")
+        raise typer.Exit(code=1)
+
+    conn = store.connect(db)
+    cols = columns.split(',') if columns else None
+    try:
+        if cols is None and not tsv:
+            # a readable default for the terminal: the ID, the filtered columns and the headline results
+            known = store.columns(conn)
+            referenced = store.compile_query(expr, known)[2] if expr.strip() else []
+            cols = [c for c in dict.fromkeys(["ID", *referenced, "Completeness", "Contamination", "MIMAG_level",
+                                              "GTDB_taxonomy"]) if c in known]
+        header, rows = store.query(conn, expr, cols, limit, sort, desc)
+    except store.QueryError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(code=2)
+
+    if tsv:
+        store.write_tsv(sys.stdout, header, rows)
+        return
+    table = Table(title=f"{len(rows)} MAGs" + (f" where {expr}" if expr.strip() else ""))
+    for col in header:
+        table.add_column(col, justify="left" if col in ("ID", "GTDB_taxonomy", "16S_NCBI_taxonomy") else "right")
+    for row in rows:
+        table.add_row(*(store.format_value(v) for v in row))
+    console.print(table)
+
+
 if __name__ == "__main__":
     app()
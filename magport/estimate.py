@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+"""Runtime and memory estimate of a planned MAGport run (magport estimate)
+
+The jobs of the run are built from the input MAG sizes and the run settings with the same
+rules as the Snakefile (batches, chunks, per-rule threads, contig sharding, quality gate), and
+their cost comes from the resource models of magport.resources: the built-in DEFAULT_MODELS,
+refitted from the benchmark files of earlier runs when their output directories are given.
+The schedule is then simulated the way Snakemake runs it on one machine: a ready job starts
+as soon as its threads (scaled down to the cores, like Snakemake) and its reserved mem_mb
+fit, longest remaining chain first. Repeating this for several core counts gives the
+predicted wall time, peak memory reservation and the thread count beyond which more cores
+no longer pay off.
+
+The models give a job's runtime at the threads it had in the runs they were fitted on
+(ref_threads); other thread counts are scaled with Amdahl's law and the PARALLEL fractions.
+Estimates assume every MAG is its own cluster representative (dedup) and, with a quality
+gate, that gate_pass of the MAGs pass it.
+"""
+
+import gzip
+import heapq
+import math
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from magport.manifest import MANIFEST_FILE, is_compressed, scan_inputs
+from magport.resources import (DEFAULT_MODELS, DEPENDENCIES, GZIP_RATIO, MEM_HEADROOM, MODEL_FILE, fit_models,
+                               load_models, split_batches)
+
+REPO = Path(__file__).resolve().parent.parent
+REF_THREADS = 8  # --threads of the runs the built-in models describe (the CLI default)
+MIN_GAIN = 0.5  # optimal threads: more cores are worth it while each added core is >= half as productive
+READ_BLOCK = 1 << 20
+
+# share of a job's runtime that scales with its threads (the rest is serial)
+PARALLEL = {"seqkit": 0.9, "stats": 0.9, "dedup": 0.9, "prodigal": 0.95, "trnascan": 0.95, "barrnap": 0.95,
+            "blast16s": 0.9, "checkm2": 0.9, "gunc": 0.9, "gtdbtk": 0.7, "checkm1": 0.8}
+SHARDED_TAGS = ("prodigal", "trnascan", "barrnap")  # split into contig groups from shard_min_mb on
+# tag -> quality gate module (gate_modules) whose failed MAGs it skips
+GATED_TAGS = {"gunc": "gunc", "gtdbtk": "gtdb", "trnascan": "trna", "blast16s": "rrna16S"}
+
+"""estimate sample (magport estimate -i mags/ -e .fna -t 32, 2000 MAGs, built-in models)
+threads  wall time  peak mem GB  core use
+16       20.0 h     152.2        97%
+32       12.8 h     152.2        84%       planned optimal
+64       9.3 h      152.2        69%
+Critical path: gtdbtk batch0000 (3.1 h) -> gather_gtdbtk -> summary -> report_html
+"""
+
+
+@dataclass
+class Settings:
+    """Run settings that shape the DAG (config.yaml keys, see load_settings)."""
+    batch_size: int = 0
+    batch_threads: int = 0
+    chunk_size: int = 500
+    stats_backend: str = "seqkit"
+    use_checkm: str = "checkm2"
+    rrna16s_batch: bool = True
+    dedup: bool = False
+    quality_gate: bool = False
+    gate_modules: tuple = ("gunc", "gtdb", "trna", "rrna16S")
+    gate_pass: float = 1.0
+    shard_min_mb: float = 0.0
+    shard_parts: int = 8
+    ref_threads: int = REF_THREADS
+
+
+@dataclass
+class Job:
+    tag: str
+    key: str  # MAG ID, batch/chunk name or "" for single jobs
+    size_mb: float
+    threads: int
+    mem_mb: int
+    minutes: float
+    deps: list[int] = field(default_factory=list)
+
+
+def _bool(value) -> bool:
+    return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def load_settings(config: dict, ref_threads: int = REF_THREADS, gate_pass: float = 1.0) -> Settings:
+    return Settings(
+        batch_size=int(config.get("batch_size", 0) or 0),
+        batch_threads=int(config.get("batch_threads", 0) or 0),
+        chunk_size=int(config.get("chunk_size", 500) or 0),
+        stats_backend=str(config.get("stats_backend", "seqkit")),
+        use_checkm=str(config.get("use_checkm", "checkm2")),
+        rrna16s_batch=_bool(config.get("rrna16s_batch", True)),
+        dedup=_bool(config.get("dedup", False)),
+        quality_gate=_bool(config.get("quality_gate", False)),
+        gate_modules=tuple(config.get("gate_modules") or ()),
+        gate_pass=gate_pass,
+        shard_min_mb=float(config.get("shard_min_mb", 0) or 0),
+        shard_parts=int(config.get("shard_parts", 8)),
+        ref_threads=ref_threads,
+    )
+
+
+def load_config(output_dir: Optional[Path] = None, overrides: Optional[dict] = None) -> dict:
+    """config/config.yaml, then <output_dir>/config.yaml of an earlier run, then `overrides`."""
+    with open(REPO / "config" / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    if output_dir is not None and (Path(output_dir) / "config.yaml").is_file():
+        with open(Path(output_dir) / "config.yaml", encoding="utf-8") as f:
+            config.update(yaml.safe_load(f) or {})
+    config.update(overrides or {})
+    return config
+
+
+def count_contigs(path: str) -> int:
+    """Number of FASTA records ('>' at the start of a line), reading gzip transparently."""
+    opener = gzip.open if is_compressed(path) else open
+    n, last = 0, b"\n"
+    with opener(path, "rb") as f:
+        while block := f.read(READ_BLOCK):
+            n += block.count(b"\n>") + (last == b"\n" and block[:1] == b">")
+            last = block[-1:]
+    return n
+
+
+def read_inputs(input_dir: Path, ext: str, settings: Settings,
+                manifest: Optional[Path] = None) -> dict[str, tuple[float, Optional[int]]]:
+    """
+    MAG ID -> (uncompressed Mb, contigs) of the inputs. Contigs are only counted for MAGs that
+    contig sharding (shard_min_mb) splits, the only jobs whose cost depends on them.
+    Example:
+        read_inputs(Path("mags"), ".fna", Settings()) -> {'MAG1': (2.72, None), ...}
+    """
+    factor = GZIP_RATIO if is_compressed(ext) else 1.0
+    if manifest is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            found = scan_inputs(Path(input_dir), ext, Path(tmp) / MANIFEST_FILE)
+    else:
+        found = scan_inputs(Path(input_dir), ext, manifest)
+    inputs = {}
+    for mag, (path, size) in found.items():
+        mb = size / 1e6 * factor
+        sharded = 0 < settings.shard_min_mb <= mb
+        inputs[mag] = (mb, count_contigs(path) if sharded else None)
+    return inputs
+
+
+def load_history(output_dirs: list[Path], models: Optional[dict] = None) -> tuple[dict, list[str], Optional[int]]:
+    """
+    Models refitted from earlier runs: each directory's resource_model.yaml, then a fresh fit of
+    its benchmark files. Returns (models, directories used, --threads of the last run used).
+    """
+    models = models or load_models()
+    used, threads = [], None
+    for out in output_dirs:
+        out = Path(out)
+        config = load_config(out)
+        bench = out / config.get("directories", {}).get("benchmarks", "benchmarks")
+        if not bench.is_dir():
+            continue
+        models = _overlay_models(models, bench / MODEL_FILE)
+        sizes = {}
+        mags_txt = out / "input_MAGs.txt"
+        if mags_txt.is_file():
+            with open(mags_txt) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) >= 2 and os.path.exists(parts[1]):
+                        sizes[parts[0]] = os.path.getsize(parts[1]) / 1e6 * (GZIP_RATIO if is_compressed(parts[1]) else 1.0)
+        if sizes:
+            names = sorted(sizes)
+            groups = {**split_batches(names, int(config.get("batch_size", 0) or 0)),
+                      **split_batches(names, int(config.get("chunk_size", 500) or 0), prefix="chunk")}
+            sizes.update({g: sum(sizes[m] for m in members) for g, members in groups.items()})
+            total = sum(sizes[m] for m in names)
+            for tag, m in fit_models(bench, sizes, total, models).items():
+                models.setdefault(tag, {}).update(m)
+        used.append(str(out))
+        threads = int(config.get("threads", 0) or 0) or threads
+    return models, used, threads
+
+
+def _overlay_models(models: dict, path: Path) -> dict:
+    """`models` updated with the tags of a resource_model.yaml (when it exists)."""
+    models = {tag: dict(m) for tag, m in models.items()}
+    if path.is_file():
+        with open(path) as f:
+            for tag, m in (yaml.safe_load(f) or {}).items():
+                models.setdefault(tag, {}).update({k: float(v) for k, v in m.items()})
+    return models
+
+
+def job_threads(tag: str, cores: int, settings: Settings, mb: float = 0.0, contigs: Optional[int] = None) -> int:
+    """Threads of a job as the rule sets them for `--threads cores` (rules/*.smk)."""
+    def batch(default: int) -> int:
+        return min(settings.batch_threads, cores) if settings.batch_threads > 0 else default
+
+    if tag in SHARDED_TAGS:
+        if settings.shard_min_mb <= 0 or mb < settings.shard_min_mb:
+            return 1
+        return max(1, min(settings.shard_parts, cores))
+    if tag in ("checkm2", "gunc"):
+        return batch(min(8, cores))
+    if tag == "gtdbtk":
+        return batch(cores)
+    if tag == "seqkit" or (tag == "blast16s" and not settings.rrna16s_batch):
+        return min(4, cores)
+    if tag in ("stats", "dedup", "checkm1", "blast16s"):
+        return cores
+    return 1
+
+
+def job_minutes(models: dict, tag: str, mb: float, speedup: float = 1.0) -> float:
+    """
+    Expected runtime (minutes, without the reservation headroom) of a job `speedup` times the
+    threads of the job the model describes (Amdahl's law with the PARALLEL fraction of the tag).
+    Example:
+        job_minutes(DEFAULT_MODELS, "checkm2", 300.0, speedup=2.0) -> 88.0
+    """
+    m = models.get(tag, DEFAULT_MODELS["table"])
+    p = PARALLEL.get(tag, 0.0)
+    return (m["time_base"] + m["time_per_mb"] * mb) * ((1 - p) + p / speedup)
+
+
+def job_mem(models: dict, tag: str, mb: float) -> int:
+    """Reserved mem_mb of a job, as in the workflow (resources.estimate, first attempt)."""
+    m = models.get(tag, DEFAULT_MODELS["table"])
+    return int(math.ceil((m["mem_base"] + m["mem_per_mb"] * mb) * MEM_HEADROOM))
+
+
+def active_tags(settings: Settings) -> dict[str, str]:
+    """Benchmark tag -> scope ("mag", "batch", "chunk", "single") of every rule a full run schedules."""
+    tags = {}
+    if settings.stats_backend == "native":
+        tags["stats"] = "single"
+    else:
+        tags.update({"seqkit": "chunk", "stats_merge": "single"})
+    if settings.dedup:
+        tags["dedup"] = "single"
+    tags.update({"prodigal": "mag", "domain": "mag", "barrnap": "mag", "trnascan": "mag"})
+    tags["blast16s"] = "single" if settings.rrna16s_batch else "mag"
+    if settings.use_checkm == "checkm1":
+        tags["checkm1"] = "single"
+    else:
+        tags.update({"checkm2": "batch", "gather_checkm2": "single"})
+    if settings.quality_gate:
+        tags["quality_gate"] = "single"
+    tags.update({"gunc": "batch", "gather_gunc": "single", "gtdbtk": "batch", "gather_gtdbtk": "single",
+                 "park": "single", "mimag": "single", "summary": "single", "report_html": "single"})
+    return tags
+
+
+def _tag_order(tags: dict[str, str]) -> list[str]:
+    order, seen = [], set()
+
+    def visit(tag: str) -> None:
+        if tag in seen:
+            return
+        seen.add(tag)
+        for up in DEPENDENCIES.get(tag, []):
+            if up in tags:
+                visit(up)
+        order.append(tag)
+
+    for tag in tags:
+        visit(tag)
+    return order
+
+
+def build_jobs(inputs: dict[str, tuple[float, Optional[int]]], settings: Settings, models: dict,
+               cores: int) -> list[Job]:
+    """The jobs of a run on `cores` with their dependencies (indices into the returned list)."""
+    mags = sorted(inputs)
+    tags = active_tags(settings)
+    gated_modules = set(settings.gate_modules) if settings.quality_gate else set()
+    # evenly spread gate_pass of the MAGs pass the gate
+    passed = {m for i, m in enumerate(mags)
+              if math.floor((i + 1) * settings.gate_pass) > math.floor(i * settings.gate_pass)}
+    groups = {"batch": split_batches(mags, settings.batch_size),
+              "chunk": split_batches(mags, settings.chunk_size, prefix="chunk")}
+    group_of = {scope: {m: g for g, members in grp.items() for m in members} for scope, grp in groups.items()}
+
+    jobs: list[Job] = []
+    index: dict[str, dict[str, int]] = {}
+    for tag in _tag_order(tags):
+        scope = tags[tag]
+        gated = GATED_TAGS.get(tag) in gated_modules
+        keys = mags if scope == "mag" else list(groups[scope]) if scope in groups else [""]
+        ups = [u for u in DEPENDENCIES.get(tag, []) if u in tags and (u != "quality_gate" or gated)]
+        index[tag] = {}
+        for key in keys:
+            contigs = None
+            if scope == "mag":
+                mb, contigs = inputs[key]
+                members = [key]
+            else:
+                members = groups[scope][key] if scope in groups else mags
+                mb = sum(inputs[m][0] for m in members if not gated or m in passed)
+            threads = min(job_threads(tag, cores, settings, mb, contigs), cores)
+            if scope == "mag" and gated and key not in passed:
+                minutes = 0.05  # failed the gate: the job only writes a placeholder
+            elif tag in SHARDED_TAGS:
+                # the model is the serial job; a split MAG runs at most one contig group per contig
+                minutes = job_minutes(models, tag, mb, min(threads, contigs or 1))
+            else:
+                ref = job_threads(tag, settings.ref_threads, settings, mb, contigs)
+                minutes = job_minutes(models, tag, mb, threads / ref)
+            deps = set()
+            for up in ups:
+                up_scope, up_jobs = tags[up], index[up]
+                if up_scope == "single":
+                    deps.update(up_jobs.values())
+                elif up_scope == "mag":
+                    deps.update(up_jobs[m] for m in members)
+                else:
+                    deps.update(up_jobs[group_of[up_scope][m]] for m in members)
+            index[tag][key] = len(jobs)
+            jobs.append(Job(tag, key, mb, threads, job_mem(models, tag, mb), minutes, sorted(deps)))
+    return jobs
+
+
+def critical_path(jobs: list[Job]) -> list[Job]:
+    """Longest chain of expected runtimes (the wall time with unlimited cores); jobs are in topological order."""
+    finish, pred = [0.0] * len(jobs), [-1] * len(jobs)
+    for i, job in enumerate(jobs):
+        start = 0.0
+        for d in job.deps:
+            if finish[d] > start:
+                start, pred[i] = finish[d], d
+        finish[i] = start + job.minutes
+    node = max(range(len(jobs)), key=finish.__getitem__, default=-1)
+    path = []
+    while node >= 0:
+        path.append(jobs[node])
+        node = pred[node]
+    return path[::-1]
+
+
+def simulate(jobs: list[Job], cores: int, mem_mb: Optional[int] = None) -> dict:
+    """
+    Greedy list schedule on one machine with `cores` and an optional mem_mb cap (Snakemake --resources):
+    whenever jobs finish, ready jobs are started longest remaining chain first while their threads
+    and memory fit. Jobs reserving more than the cap are started alone.
+    Returns wall minutes, peak reserved memory, busy core-minutes and the jobs over the cap.
+    """
+    n = len(jobs)
+    downstream = [[] for _ in range(n)]
+    for i, job in enumerate(jobs):
+        for d in job.deps:
+            downstream[d].append(i)
+    level = [0.0] * n  # longest chain from the start of a job to the end of the run
+    for i in range(n - 1, -1, -1):
+        level[i] = jobs[i].minutes + max((level[j] for j in downstream[i]), default=0.0)
+    waiting = [len(job.deps) for job in jobs]
+    ready = [(-level[i], i) for i in range(n) if not waiting[i]]
+    heapq.heapify(ready)
+    running: list[tuple[float, int]] = []
+    now = busy = 0.0
+    free_cores, used_mem, peak_mem = cores, 0, 0
+    over_cap = [i for i, job in enumerate(jobs) if mem_mb and job.mem_mb > mem_mb]
+    while ready or running:
+        skipped = []
+        while ready and free_cores > 0:
+            prio, i = heapq.heappop(ready)
+            job = jobs[i]
+            mem_ok = not mem_mb or used_mem + job.mem_mb <= mem_mb or (job.mem_mb > mem_mb and not running)
+            if job.threads <= free_cores and mem_ok:
+                free_cores -= job.threads
+                used_mem += job.mem_mb
+                peak_mem = max(peak_mem, used_mem)
+                busy += job.threads * job.minutes
+                heapq.heappush(running, (now + job.minutes, i))
+            else:
+                skipped.append((prio, i))
+        for item in skipped:
+            heapq.heappush(ready, item)
+        if not running:
+            break
+        now, i = heapq.heappop(running)
+        done = [i]
+        while running and running[0][0] <= now:
+            done.append(heapq.heappop(running)[1])
+        for i in done:
+            free_cores += jobs[i].threads
+            used_mem -= jobs[i].mem_mb
+            for j in downstream[i]:
+                waiting[j] -= 1
+                if not waiting[j]:
+                    heapq.heappush(ready, (-level[j], j))
+    return {"cores": cores, "wall_min": now, "peak_mem_mb": peak_mem, "busy_core_min": busy,
+            "use": busy / (cores * now) if now > 0 else 0.0, "over_cap": [jobs[i] for i in over_cap]}
+
+
+def thread_candidates(threads: int, max_threads: int) -> list[int]:
+    """Powers of two up to max_threads plus the requested count, e.g. (24, 64) -> [1, 2, 4, 8, 16, 24, 32, 64]."""
+    counts = {threads, max_threads}
+    c = 1
+    while c < max_threads:
+        counts.add(c)
+        c *= 2
+    return sorted(x for x in counts if 1 <= x <= max_threads)
+
+
+def estimate_run(inputs: dict[str, tuple[float, Optional[int]]], settings: Settings, models: dict, threads: int,
+                 max_threads: int, mem_mb: Optional[int] = None) -> dict:
+    """
+    Simulated schedules for every candidate thread count; "run" is the one for `threads`, "optimal"
+    the largest count up to which every step up still gains MIN_GAIN of its relative core increase
+    (e.g. doubling 16 -> 32 cores must cut the wall time by at least a third).
+    """
+    runs, plans = [], {}
+    for cores in thread_candidates(threads, max(threads, max_threads)):
+        jobs = build_jobs(inputs, settings, models, cores)
+        plans[cores] = jobs
+        runs.append(simulate(jobs, cores, mem_mb))
+    optimal = runs[0]["cores"]
+    for prev, r in zip(runs, runs[1:]):
+        # marginal efficiency: speedup gained per relative increase of the cores
+        if r["wall_min"] <= 0 or (prev["wall_min"] / r["wall_min"] - 1) / (r["cores"] / prev["cores"] - 1) < MIN_GAIN:
+            break
+        optimal = r["cores"]
+    jobs = plans[threads]
+    per_tag: dict[str, dict] = {}
+    for job in jobs:
+        t = per_tag.setdefault(job.tag, {"jobs": 0, "threads": 0, "minutes": 0.0, "max_min": 0.0,
+                                         "max_mem_mb": 0, "core_h": 0.0})
+        t["jobs"] += 1
+        t["threads"] = max(t["threads"], job.threads)
+        t["minutes"] += job.minutes
+        t["max_min"] = max(t["max_min"], job.minutes)
+        t["max_mem_mb"] = max(t["max_mem_mb"], job.mem_mb)
+        t["core_h"] += job.minutes * job.threads / 60
+    return {
+        "mags": len(inputs),
+        "total_mb": sum(mb for mb, _ in inputs.values()),
+        "sharded": sum(1 for _, contigs in inputs.values() if contigs is not None),
+        "jobs": len(jobs),
+        "run": next(r for r in runs if r["cores"] == threads),
+        "scaling": runs,
+        "optimal": optimal,
+        "per_tag": dict(sorted(per_tag.items(), key=lambda kv: -kv[1]["core_h"])),
+        "critical_path": critical_path(jobs),
+    }
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+"""Persistent manifest of the input MAGs
+
+Globbing INPUT_DIR/**/*{EXT} and resolving every path on each Snakemake invocation costs
+minutes on network filesystems with 100k MAGs. The manifest records, per input directory,
+its mtime, subdirectories and MAG files (resolved path, size, mtime). A directory whose mtime
+is unchanged is taken from the manifest without listing it or stat'ing its files; only new or
+touched directories are scanned again. The manifest and input_MAGs.txt are only rewritten
+when their content changes, so their mtimes stay stable between runs.
+
+A MAG rewritten in place (same name, directory untouched) keeps its recorded size until the
+next full scan (scan_inputs(..., rescan=True), config `rescan_inputs: true`); Snakemake still
+sees its new mtime and reruns the affected jobs.
+"""
+
+import json
+import os
+from pathlib import Path
+
+MANIFEST_FILE = "input_manifest.json"
+MANIFEST_VERSION = 1
+COMPRESSED_SUFFIXES = (".gz", ".bgz")
+FASTA_SUFFIXES = (".fasta", ".fas", ".fna", ".ffn", ".fa")
+
+"""manifest sample
+{"version": 1, "input_dir": "/data/mags", "ext": ".fna",
+ "dirs": {"/data/mags": {"mtime_ns": 1760000000000000000, "subdirs": ["site2"],
+                         "files": {"MAG1.fna": ["/data/mags/MAG1.fna", 903669, 1759990000000000000]}}}}
+"""
+
+
+def _list_dir(path: str, ext: str) -> dict:
+    """One directory level: subdirectories and the resolved path, size and mtime of each MAG."""
+    real = os.path.realpath(path)
+    entry = {"mtime_ns": 0, "subdirs": [], "files": {}}
+    with os.scandir(path) as it:
+        for e in it:
+            try:
+                if e.is_dir():
+                    entry["subdirs"].append(e.name)
+                elif e.name.endswith(ext) and e.is_file():
+                    st = e.stat()
+                    resolved = os.path.realpath(e.path) if e.is_symlink() else os.path.join(real, e.name)
+                    entry["files"][e.name] = [resolved, st.st_size, st.st_mtime_ns]
+            except OSError:
+                continue
+    entry["subdirs"].sort()
+    return entry
+
+
+def is_compressed(ext: str) -> bool:
+    """True for gzip/bgzip inputs, e.g. ".fa.gz"."""
+    return ext.lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def sample_name(filename: str, ext: str) -> str:
+    """
+    MAG ID of an input file: the file name without `ext`, and without a FASTA suffix left over
+    when `ext` only names the compression.
+    Example:
+        sample_name("MAG1.fa.gz", ".fa.gz") -> "MAG1"
+        sample_name("MAG1.fa.gz", ".gz") -> "MAG1"
+        sample_name("bin.12.fna", ".fna") -> "bin.12"
+    """
+    name = filename[:-len(ext)] if ext and filename.endswith(ext) else filename
+    name = name.rstrip('.')
+    if f".{ext.lower().lstrip('.')}" in COMPRESSED_SUFFIXES:
+        for suffix in FASTA_SUFFIXES:
+            if name.lower().endswith(suffix):
+                return name[:-len(suffix)]
+    return name
+
+
+def load_manifest(path: Path, input_dir: Path, ext: str) -> dict:
+    """Cached directory entries, or {} when the manifest is missing or was made for other inputs."""
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (manifest.get("version") != MANIFEST_VERSION or manifest.get("input_dir") != str(input_dir)
+            or manifest.get("ext") != ext):
+        return {}
+    return manifest.get("dirs", {})
+
+
+def manifest_sizes(path: Path) -> dict[str, int]:
+    """
+    MAG ID -> size in bytes as last recorded in the manifest, without touching the inputs.
+    Example:
+        manifest_sizes(Path("results/input_manifest.json")) -> {'MAG1': 903669, 'MAG2': 1204220}
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    ext = manifest.get("ext", "")
+    return {sample_name(name, ext): size for entry in manifest.get("dirs", {}).values()
+            for name, (_, size, _) in entry.get("files", {}).items()}
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Atomically write `text` unless the file already holds it; True if it was written."""
+    path = Path(path)
+    try:
+        if path.read_text() == text:
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    tmp.replace(path)
+    return True
+
+
+def scan_inputs(input_dir: Path, ext: str, manifest_path: Path, rescan: bool = False) -> dict[str, tuple[str, int]]:
+    """
+    MAG ID -> (resolved path, size in bytes) for every INPUT_DIR/**/*{ext}, ordered by MAG ID.
+    The ID is the file name without its extension (sample_name); duplicates keep the last path
+    in sorted order.
+    Example:
+        scan_inputs(Path("/data/mags"), ".fna", Path("results/input_manifest.json"))
+        -> {'MAG1': ('/data/mags/MAG1.fna', 903669), 'MAG2': ('/data/mags/site2/MAG2.fna', 1204220)}
+    """
+    input_dir = Path(input_dir)
+    cached = {} if rescan else load_manifest(manifest_path, input_dir, ext)
+    dirs: dict[str, dict] = {}
+    seen_real: set[str] = set()
+    stack = [str(input_dir)]
+    while stack:
+        d = stack.pop()
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            continue
+        real = os.path.realpath(d)
+        if real in seen_real:  # symlink loop or a directory linked twice
+            continue
+        seen_real.add(real)
+        entry = cached.get(d)
+        if entry is None or entry.get("mtime_ns") != mtime:
+            try:
+                entry = _list_dir(d, ext)
+            except OSError:
+                continue
+            entry["mtime_ns"] = mtime
+        dirs[d] = entry
+        stack.extend(os.path.join(d, s) for s in entry["subdirs"])
+
+    write_if_changed(manifest_path, json.dumps(
+        {"version": MANIFEST_VERSION, "input_dir": str(input_dir), "ext": ext, "dirs": dirs},
+        sort_keys=True, separators=(',', ':')))
+
+    found = sorted((os.path.join(d, name), sample_name(name, ext), path, size)
+                   for d, entry in dirs.items() for name, (path, size, _) in entry["files"].items())
+    samples = {stem: (path, size) for _, stem, path, size in found}
+    return {stem: samples[stem] for stem in sorted(samples)}
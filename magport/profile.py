@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+"""Pipeline profile from the Snakemake benchmark files of a MAGport run
+
+Every rule writes benchmarks/{tag}.{MAG or batch}.benchmark.txt (or {tag}.benchmark.txt for
+single jobs). The profile combines them into
+  - one row per job (profile_jobs.tsv) and per rule (profile_rules.tsv): wall time, CPU time,
+    max RSS and I/O, with each rule's share of the CPU hours
+  - per-MAG cost against genome size (profile_mags.tsv and a seconds-per-Mb fit per rule)
+  - the critical path through the static MAGport DAG (magport.resources.DEPENDENCIES)
+    weighted by the measured wall times
+  - core utilisation over time: Snakemake writes a benchmark file when its job ends, so each
+    job is placed at [mtime - s, mtime] and contributes cpu_time / s cores
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from magport.manifest import is_compressed
+from magport.resources import DEPENDENCIES, GZIP_RATIO, split_batches, split_benchmark_name
+
+BENCHMARK_COLUMNS = ["s", "max_rss", "io_in", "io_out", "mean_load", "cpu_time"]
+TIMELINE_BUCKETS = 40
+
+"""profile_rules.tsv sample
+rule	jobs	wall_s	mean_s	max_s	cpu_h	cpu_share	max_rss_mb	io_in_mb	io_out_mb
+gtdbtk	1	5400.2	5400.2	5400.2	21.3	0.612	98213.5	10233.0	512.4
+trnascan	500	9021.7	18.0	95.2	2.5	0.072	310.2	2100.3	40.1
+"""
+
+
+def load_run_config(output_dir: Path) -> dict:
+    path = output_dir / "config.yaml"
+    if path.is_file():
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    return {}
+
+
+def benchmark_dir(output_dir: Path, config: dict) -> Path:
+    return output_dir / config.get("directories", {}).get("benchmarks", "benchmarks")
+
+
+def _last_row(path: Path) -> dict:
+    with open(path) as f:
+        header = f.readline().rstrip('\n').split('\t')
+        rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+    return dict(zip(header, rows[-1])) if rows else {}
+
+
+def load_jobs(bench_dir: Path) -> pd.DataFrame:
+    """One row per benchmark file: tag, wildcard, the benchmark columns, start and end (epoch s)."""
+    rows = []
+    for path in sorted(bench_dir.glob("*.benchmark.txt")):
+        try:
+            rec = _last_row(path)
+        except OSError:
+            continue
+        if not rec:
+            continue
+        tag, wildcard = split_benchmark_name(path.name)
+        row = {"rule": tag, "wildcard": wildcard, "end": path.stat().st_mtime}
+        row.update({col: rec.get(col, "") for col in BENCHMARK_COLUMNS})
+        rows.append(row)
+    jobs = pd.DataFrame(rows, columns=["rule", "wildcard", *BENCHMARK_COLUMNS, "end"])
+    jobs[BENCHMARK_COLUMNS] = jobs[BENCHMARK_COLUMNS].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    jobs["start"] = jobs["end"] - jobs["s"]
+    return jobs
+
+
+def rule_table(jobs: pd.DataFrame) -> pd.DataFrame:
+    g = jobs.groupby("rule")
+    rules = pd.DataFrame({
+        "jobs": g.size(),
+        "wall_s": g["s"].sum(),
+        "mean_s": g["s"].mean(),
+        "max_s": g["s"].max(),
+        "cpu_h": g["cpu_time"].sum() / 3600,
+        "max_rss_mb": g["max_rss"].max(),
+        "io_in_mb": g["io_in"].sum(),
+        "io_out_mb": g["io_out"].sum(),
+    })
+    total_cpu = rules["cpu_h"].sum()
+    rules.insert(5, "cpu_share", rules["cpu_h"] / total_cpu if total_cpu > 0 else 0.0)
+    return rules.sort_values("cpu_h", ascending=False).round(3)
+
+
+def read_genome_mb(output_dir: Path) -> dict[str, float]:
+    sizes = {}
+    mags_txt = output_dir / "input_MAGs.txt"
+    if mags_txt.is_file():
+        with open(mags_txt) as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) >= 2 and os.path.exists(parts[1]):
+                    factor = GZIP_RATIO if is_compressed(parts[1]) else 1.0
+                    sizes[parts[0]] = os.path.getsize(parts[1]) / 1e6 * factor
+    return sizes
+
+
+def mag_costs(jobs: pd.DataFrame, genome_mb: dict[str, float]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Per-MAG seconds of every per-MAG rule, and a seconds = a + b * Mb fit per rule."""
+    per_mag = jobs[jobs["wildcard"].isin(genome_mb.keys())]
+    if per_mag.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    table = per_mag.pivot_table(index="wildcard", columns="rule", values="s", aggfunc="sum").fillna(0.0)
+    table.insert(0, "genome_mb", [genome_mb[m] for m in table.index])
+    table["total_s"] = table.drop(columns="genome_mb").sum(axis=1)
+    table.index.name = "MAG"
+
+    fits = []
+    for rule, grp in per_mag.groupby("rule"):
+        x = np.array([genome_mb[m] for m in grp["wildcard"]])
+        y = grp["s"].to_numpy(dtype=float)
+        slope, intercept, r = 0.0, float(y.mean()), 0.0
+        if len(x) >= 3 and np.ptp(x) > 0:
+            slope, intercept = np.polyfit(x, y, 1)
+            r = float(np.corrcoef(x, y)[0, 1]) if np.ptp(y) > 0 else 0.0
+        fits.append({"rule": rule, "jobs": len(x), "s_per_mb": round(float(slope), 3),
+                     "base_s": round(float(intercept), 3) + 0.0, "r": round(r, 3)})
+    return table.round(3), pd.DataFrame(fits).set_index("rule")
+
+
+def _topological_rules(rules: list[str]) -> list[str]:
+    order, seen = [], set()
+
+    def visit(rule: str) -> None:
+        if rule in seen:
+            return
+        seen.add(rule)
+        for up in DEPENDENCIES.get(rule, []):
+            visit(up)
+        order.append(rule)
+
+    for rule in sorted(rules):
+        visit(rule)
+    present = set(rules)
+    return [r for r in order if r in present]
+
+
+def critical_path(jobs: pd.DataFrame, batches: dict[str, list[str]]) -> list[dict]:
+    """
+    Longest chain of measured wall times through the static DAG.
+    Per-MAG jobs wait for the same MAG upstream, batch (and chunk) jobs for their member MAGs, and
+    single jobs (or upstream single jobs) for everything.
+    """
+    finish: dict[str, dict[str, tuple[float, Optional[tuple[str, str]]]]] = {}
+    for rule in _topological_rules(jobs["rule"].unique().tolist()):
+        finish[rule] = {}
+        for wildcard, dur in jobs.loc[jobs["rule"] == rule, ["wildcard", "s"]].itertuples(index=False):
+            best, best_pred = 0.0, None
+            for up in DEPENDENCIES.get(rule, []):
+                up_jobs = finish.get(up, {})
+                if not up_jobs:
+                    continue
+                if "" in up_jobs or not wildcard:
+                    candidates = up_jobs.keys()
+                elif wildcard in batches:
+                    candidates = [m for m in batches[wildcard] if m in up_jobs] or up_jobs.keys()
+                else:
+                    candidates = [wildcard] if wildcard in up_jobs else []
+                for key in candidates:
+                    if up_jobs[key][0] > best:
+                        best, best_pred = up_jobs[key][0], (up, key)
+            finish[rule][wildcard] = (best + float(dur), best_pred)
+
+    end = max(((t, (rule, wc)) for rule, by_wc in finish.items() for wc, (t, _) in by_wc.items()), default=None)
+    path, node = [], end[1] if end else None
+    while node:
+        rule, wc = node
+        t, pred = finish[rule][wc]
+        path.append({"rule": rule, "wildcard": wc, "finish_s": round(t, 1)})
+        node = pred
+    path.reverse()
+    for step in path:
+        step["s"] = float(jobs.loc[(jobs["rule"] == step["rule"]) & (jobs["wildcard"] == step["wildcard"]), "s"].iloc[0])
+    return path
+
+
+def utilisation(jobs: pd.DataFrame, buckets: int = TIMELINE_BUCKETS) -> pd.DataFrame:
+    """Mean busy cores and running jobs per time bucket between the first start and the last end."""
+    if jobs.empty:
+        return pd.DataFrame(columns=["offset_s", "cores", "jobs"])
+    t0, t1 = float(jobs["start"].min()), float(jobs["end"].max())
+    edges = np.linspace(t0, t1 if t1 > t0 else t0 + 1, buckets + 1)
+    start, end = jobs["start"].to_numpy(), jobs["end"].to_numpy()
+    dur = np.maximum(jobs["s"].to_numpy(), 1e-9)
+    cores = np.clip(jobs["cpu_time"].to_numpy() / dur, 0, None)
+    rows = []
+    for b0, b1 in zip(edges[:-1], edges[1:]):
+        overlap = np.clip(np.minimum(end, b1) - np.maximum(start, b0), 0, None)
+        rows.append({"offset_s": round(b0 - t0, 1), "cores": float((overlap * cores).sum() / (b1 - b0)),
+                     "jobs": float(overlap.sum() / (b1 - b0))})
+    return pd.DataFrame(rows).round(2)
+
+
+def build_profile(output_dir: Path) -> dict:
+    output_dir = Path(output_dir)
+    config = load_run_config(output_dir)
+    bench_dir = benchmark_dir(output_dir, config)
+    jobs = load_jobs(bench_dir)
+    genome_mb = read_genome_mb(output_dir)
+    batches = split_batches(sorted(genome_mb), int(config.get("batch_size", 0) or 0))
+    batches.update(split_batches(sorted(genome_mb), int(config.get("chunk_size", 500) or 0), prefix="chunk"))
+    mags, fits = mag_costs(jobs, genome_mb)
+    span = float(jobs["end"].max() - jobs["start"].min()) if not jobs.empty else 0.0
+    return {
+        "bench_dir": bench_dir,
+        "threads": int(config.get("threads", 0) or 0),
+        "span_s": span,
+        "jobs": jobs,
+        "rules": rule_table(jobs) if not jobs.empty else pd.DataFrame(),
+        "mags": mags,
+        "fits": fits,
+        "critical_path": critical_path(jobs, batches) if not jobs.empty else [],
+        "timeline": utilisation(jobs),
+    }
+
+
+def write_profile(profile: dict) -> list[Path]:
+    bench_dir = profile["bench_dir"]
+    written = []
+    for name, key, index in [("profile_jobs.tsv", "jobs", False), ("profile_rules.tsv", "rules", True),
+                             ("profile_mags.tsv", "mags", True), ("profile_timeline.tsv", "timeline", False)]:
+        df = profile[key]
+        if df is not None and not df.empty:
+            path = bench_dir / name
+            df.to_csv(path, sep='\t', index=index)
+            written.append(path)
+    if profile["critical_path"]:
+        path = bench_dir / "profile_critical_path.tsv"
+        pd.DataFrame(profile["critical_path"]).to_csv(path, sep='\t', index=False)
+        written.append(path)
+    return written
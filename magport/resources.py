@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+"""Memory/runtime models for the MAGport rules
+
+Every rule is keyed by its benchmark tag (the part of the benchmark file name before the
+first dot, e.g. "prodigal" for benchmarks/prodigal.MAG1.benchmark.txt) and modelled as
+
+    mem_mb  = mem_base  + mem_per_mb  * input Mb
+    runtime = time_base + time_per_mb * input Mb      (minutes)
+
+where "input Mb" is the (uncompressed) size of the MAG FASTA (per-MAG rules), of all MAGs in a batch
+(CheckM2, GUNC, GTDB-Tk) or chunk (seqkit), or of all MAGs (single-job rules).
+
+The built-in DEFAULT_MODELS are refitted from the Snakemake benchmark files after each
+successful run (fit_models) and saved next to them as resource_model.yaml, so later runs
+on the same system reserve what the tools actually used.
+"""
+
+import math
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+MODEL_FILE = "resource_model.yaml"
+MEM_HEADROOM = 1.2
+TIME_HEADROOM = 1.5
+MIN_FIT_POINTS = 3
+GZIP_RATIO = 3.5  # typical FASTA size / gzip size: compressed MAGs are modelled by their plain size
+
+"""benchmark file sample (Snakemake)
+s	h:m:s	max_rss	max_vms	max_uss	max_pss	io_in	io_out	mean_load	cpu_time
+12.3062	0:00:12	143.07	331.54	139.41	139.86	0.00	5.04	95.12	11.83
+"""
+
+DEFAULT_MODELS: dict[str, dict[str, float]] = {
+    # per chunk
+    "seqkit":         {"mem_base": 200, "mem_per_mb": 0.2, "time_base": 1, "time_per_mb": 0.02},
+    # per MAG
+    "prodigal":       {"mem_base": 300, "mem_per_mb": 20, "time_base": 1, "time_per_mb": 1},
+    "domain":         {"mem_base": 300, "mem_per_mb": 10, "time_base": 1, "time_per_mb": 0.5},
+    "barrnap":        {"mem_base": 300, "mem_per_mb": 10, "time_base": 1, "time_per_mb": 0.3},
+    "trnascan":       {"mem_base": 500, "mem_per_mb": 50, "time_base": 2, "time_per_mb": 2},
+    "blast16s":       {"mem_base": 2000, "mem_per_mb": 0, "time_base": 5, "time_per_mb": 0.1},
+    # per batch
+    "checkm2":        {"mem_base": 16000, "mem_per_mb": 30, "time_base": 10, "time_per_mb": 0.5},
+    "gunc":           {"mem_base": 16000, "mem_per_mb": 30, "time_base": 10, "time_per_mb": 0.5},
+    "gtdbtk":         {"mem_base": 110000, "mem_per_mb": 50, "time_base": 60, "time_per_mb": 1},
+    # all MAGs
+    "dedup":          {"mem_base": 2000, "mem_per_mb": 0.1, "time_base": 2, "time_per_mb": 0.02},
+    "checkm1":        {"mem_base": 40000, "mem_per_mb": 20, "time_base": 30, "time_per_mb": 2},
+    "stats":          {"mem_base": 2000, "mem_per_mb": 2, "time_base": 2, "time_per_mb": 0.01},
+    # all-MAG table steps: Python start-up plus about a second per 2,000 MAGs (test/perf/run_benchmarks.py)
+    "stats_merge":    {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "gather_checkm2": {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "gather_gunc":    {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "gather_gtdbtk":  {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "quality_gate":   {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "park":           {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "mimag":          {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "summary":        {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.2, "time_per_mb": 0.0001},
+    "report_html":    {"mem_base": 500, "mem_per_mb": 0.01, "time_base": 0.5, "time_per_mb": 0.0002},
+    # fallback for rules without a model of their own
+    "table":          {"mem_base": 1000, "mem_per_mb": 1, "time_base": 5, "time_per_mb": 0.01},
+    # database downloads
+    "download":       {"mem_base": 2000, "mem_per_mb": 0, "time_base": 600, "time_per_mb": 0},
+}
+
+
+# Upstream benchmark tags of every rule: a static model of the workflow DAG. Jobs of a per-MAG
+# tag depend on the same MAG upstream, batch jobs on their members and single jobs on everything.
+DEPENDENCIES: dict[str, list[str]] = {
+    "seqkit": [], "stats": [], "stats_merge": ["seqkit"],
+    "prodigal": [], "domain": [], "barrnap": ["domain"], "trnascan": ["domain", "quality_gate"],
+    "blast16s": ["barrnap", "quality_gate"],
+    "dedup": [],
+    "checkm2": ["prodigal", "dedup"], "gather_checkm2": ["checkm2"], "checkm1": ["prodigal"],
+    "quality_gate": ["gather_checkm2", "checkm1"],
+    "gunc": ["prodigal", "dedup", "quality_gate"], "gather_gunc": ["gunc"],
+    "gtdbtk": ["dedup", "quality_gate"], "gather_gtdbtk": ["gtdbtk"],
+    "park": ["stats", "stats_merge", "gather_checkm2", "checkm1"],
+    "mimag": ["gather_checkm2", "checkm1", "trnascan", "barrnap"],
+    "summary": ["stats", "stats_merge", "gather_checkm2", "checkm1", "gather_gunc", "mimag", "park",
+                "prodigal", "trnascan", "barrnap", "domain", "gather_gtdbtk", "blast16s"],
+    "report_html": ["summary"],
+}
+
+
+def split_batches(samples: list[str], size: int, prefix: str = "batch") -> dict[str, list[str]]:
+    """
+    Deterministic CheckM2/GUNC/GTDB-Tk batches (or seqkit chunks) of the sorted MAG IDs (size 0: one batch).
+    Example:
+        split_batches(['MAG1', 'MAG2', 'MAG3'], 2) -> {'batch0000': ['MAG1', 'MAG2'], 'batch0001': ['MAG3']}
+    """
+    size = size if size > 0 else max(1, len(samples))
+    return {f"{prefix}{i // size:04d}": samples[i:i + size] for i in range(0, len(samples), size)}
+
+
+def load_models(path: Optional[Path] = None) -> dict[str, dict[str, float]]:
+    """Built-in models, overridden by a fitted resource_model.yaml when present."""
+    models = {tag: dict(m) for tag, m in DEFAULT_MODELS.items()}
+    if path is not None and Path(path).is_file():
+        with open(path) as f:
+            fitted = yaml.safe_load(f) or {}
+        for tag, m in fitted.items():
+            models.setdefault(tag, {}).update({k: float(v) for k, v in m.items()})
+    return models
+
+
+def estimate(models: dict, tag: str, size_mb: float, attempt: int = 1) -> tuple[int, int]:
+    """
+    (mem_mb, runtime minutes) for a job of `tag` on `size_mb` of input; scaled by the retry attempt.
+    Example:
+        estimate(DEFAULT_MODELS, "prodigal", 3.2) -> (437, 7)
+    """
+    m = models.get(tag, DEFAULT_MODELS["table"])
+    mem = (m["mem_base"] + m["mem_per_mb"] * size_mb) * MEM_HEADROOM * attempt
+    runtime = (m["time_base"] + m["time_per_mb"] * size_mb) * TIME_HEADROOM * attempt
+    return int(math.ceil(mem)), int(math.ceil(runtime))
+
+
+def read_benchmark(path: Path) -> Optional[tuple[float, float]]:
+    """(seconds, max_rss MB) of the last repeat in a Snakemake benchmark file."""
+    try:
+        with open(path) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+        rec = dict(zip(header, rows[-1]))
+        return float(rec["s"]), float(rec["max_rss"])
+    except (OSError, IndexError, KeyError, ValueError):
+        return None
+
+
+def split_benchmark_name(name: str) -> tuple[str, str]:
+    """
+    Example:
+        split_benchmark_name("trnascan.MAG1.benchmark.txt") -> ("trnascan", "MAG1")
+        split_benchmark_name("report_html.benchmark.txt") -> ("report_html", "")
+    """
+    stem = name[: -len(".benchmark.txt")]
+    tag, _, wildcard = stem.partition('.')
+    return tag, wildcard
+
+
+def _line_fit(xs: list[float], ys: list[float]) -> tuple[float, float]:
+    """Least-squares (intercept, slope) with the slope clamped at >= 0."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    slope = max(0.0, sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx) if sxx > 0 else 0.0
+    return my - slope * mx, slope
+
+
+def fit_models(benchmark_dir: Path, sizes: dict[str, float], total_mb: float,
+               models: Optional[dict] = None) -> dict[str, dict[str, float]]:
+    """
+    Fit the per-tag models from the benchmark files of a finished run.
+    sizes: input Mb per wildcard value (MAG IDs and batch names); benchmarks without a
+    wildcard are attributed to all MAGs (total_mb).
+    Slopes are least-squares fits once a tag has MIN_FIT_POINTS jobs (single-job tags keep the
+    slopes of `models`); the bases are the upper envelope, so every observed job fits.
+    """
+    models = models or DEFAULT_MODELS
+    points: dict[str, list[tuple[float, float, float]]] = {}
+    for path in sorted(Path(benchmark_dir).glob("*.benchmark.txt")):
+        tag, wildcard = split_benchmark_name(path.name)
+        bench = read_benchmark(path)
+        if bench is None:
+            continue
+        size = sizes.get(wildcard, total_mb if not wildcard else None)
+        if size is None:
+            continue
+        points.setdefault(tag, []).append((size, bench[0] / 60, bench[1]))
+
+    fitted = {}
+    for tag, pts in points.items():
+        prior = models.get(tag, DEFAULT_MODELS["table"])
+        xs = [p[0] for p in pts]
+        if len(pts) >= MIN_FIT_POINTS:
+            t_slope = _line_fit(xs, [p[1] for p in pts])[1]
+            m_slope = _line_fit(xs, [p[2] for p in pts])[1]
+        else:
+            t_slope, m_slope = prior["time_per_mb"], prior["mem_per_mb"]
+        fitted[tag] = {
+            "mem_base": round(max(50.0, max(p[2] - m_slope * p[0] for p in pts)), 1),
+            "mem_per_mb": round(m_slope, 3),
+            "time_base": round(max(0.5, max(p[1] - t_slope * p[0] for p in pts)), 2),
+            "time_per_mb": round(t_slope, 4),
+        }
+    return fitted
+
+
+def save_models(path: Path, fitted: dict[str, dict[str, float]]) -> None:
+    """Merge freshly fitted tags into resource_model.yaml (tags not seen this run are kept)."""
+    path = Path(path)
+    current = {}
+    if path.is_file():
+        with open(path) as f:
+            current = yaml.safe_load(f) or {}
+    current.update(fitted)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        yaml.safe_dump(current, f, sort_keys=True)
+    tmp.replace(path)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+"""Multi-node runs without a scheduler: deterministic input shards and merging of their outputs
+
+`magport --shard i/n` runs the workflow on the MAGs whose ID hashes to shard i of n, in
+<output>/shards/shard<i>of<n>. The hash (SHA-1 of the MAG ID) does not depend on the machine,
+the Python version or the other MAGs, so shards can be started independently, e.g. one per node
+over ssh, and a MAG always lands in the same shard. `magport merge <output>` then combines the
+finished shards into <output>: one result store and MAGport_summary.tsv (MAGs in ID order, as
+an unsharded run), the consolidated tool tables of MERGE_TABLES and a single report. Per-MAG
+files (genes, rRNA, tRNA, ...) stay in the shard directories.
+"""
+
+import csv
+import hashlib
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+from magport.manifest import write_if_changed
+
+SHARD_DIR = "shards"
+REPO = Path(__file__).resolve().parent.parent
+
+# (config `directories` key, default directory, file name, has a header); rows are keyed by the MAG
+# ID in the first column ("MAG@@query" for the combined 16S BLAST table)
+MERGE_TABLES = [
+    ("dedup", "00_dedup", "clusters.tsv", True),
+    ("seqkit", "01_stats/seqkit", "stats_summary.tsv", True),
+    ("checkm", "03_quality/checkm", "checkm2_summary.tsv", True),
+    ("checkm", "03_quality/checkm", "checkm1_summary.tsv", True),
+    ("gunc", "03_quality/gunc", "GUNC_summary.tsv", True),
+    ("park", "03_quality/park", "park_summary.tsv", True),
+    ("mimag", "03_quality/mimag", "MIMAG_summary.tsv", True),
+    ("gate", "03_quality/gate", "gate.tsv", True),
+    ("gtdbtk", "04_taxonomy/gtdbtk", "gtdb.merged_summary.tsv", True),
+    ("r16s", "04_taxonomy/16S", "batch_16S.blast.tsv", False),
+]
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """
+    Example:
+        parse_shard("2/8") -> (2, 8)
+        parse_shard("9/8") -> ValueError
+    """
+    try:
+        i, n = (int(x) for x in str(spec).split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like i/n (e.g. 2/8), got {spec!r}") from None
+    if not 1 <= i <= n:
+        raise ValueError(f"shard {spec!r}: i must be between 1 and n")
+    return i, n
+
+
+def shard_of(mag: str, n: int) -> int:
+    """1-based shard of a MAG ID, e.g. shard_of("MAG1", 8) -> 6; the same on every machine."""
+    return int.from_bytes(hashlib.sha1(mag.encode()).digest()[:8], "big") % n + 1
+
+
+def shard_dir(output_dir: Path, i: int, n: int) -> Path:
+    return Path(output_dir) / SHARD_DIR / f"shard{i}of{n}"
+
+
+@dataclass
+class Shard:
+    path: Path
+    config: dict
+    index: int
+    count: int
+    mags: list[tuple[str, str]]  # (MAG ID, path) from input_MAGs.txt
+    finished: bool
+
+    def out(self, key: str, default: str) -> Path:
+        return self.path / self.config.get("directories", {}).get(key, default)
+
+    @property
+    def store(self) -> Path:
+        return self.path / self.config.get("output_files", {}).get("store", "magport.sqlite")
+
+    @property
+    def summary(self) -> Path:
+        return self.path / self.config.get("output_files", {}).get("summary", "MAGport_summary.tsv")
+
+
+def read_shard(path: Path) -> Optional[Shard]:
+    """The shard run in `path`, or None if it is not the output directory of a --shard run."""
+    try:
+        with open(path / "config.yaml") as f:
+            config = yaml.safe_load(f) or {}
+    except OSError:
+        return None
+    if not config.get("shard"):
+        return None
+    i, n = parse_shard(config["shard"])
+    mags_txt = path / "input_MAGs.txt"
+    mags = []
+    if mags_txt.is_file():
+        with open(mags_txt) as f:
+            mags = [tuple(line.rstrip("\n").split("\t")[:2]) for line in f if line.strip()]
+    shard = Shard(path, config, i, n, mags, False)
+    # an empty shard has an empty input_MAGs.txt and nothing else to merge
+    shard.finished = mags_txt.is_file() and (not mags or (shard.store.is_file() and shard.summary.is_file()))
+    return shard
+
+
+def find_shards(output_dir: Path) -> list[Path]:
+    root = Path(output_dir) / SHARD_DIR
+    return sorted(p for p in root.iterdir() if (p / "config.yaml").is_file()) if root.is_dir() else []
+
+
+def check_shards(shards: list[Shard]) -> list[str]:
+    """Reasons the shards do not form one complete run ([] if they do)."""
+    problems = []
+    counts = {s.count for s in shards}
+    if len(counts) > 1:
+        problems.append(f"shards of different splits: n = {', '.join(map(str, sorted(counts)))}")
+        return problems
+    n = counts.pop() if counts else 0
+    seen: dict[int, Path] = {}
+    for s in shards:
+        if s.index in seen:
+            problems.append(f"shard {s.index}/{n} twice: {seen[s.index]} and {s.path}")
+        seen[s.index] = s.path
+        if not s.finished:
+            problems.append(f"shard {s.index}/{n} in {s.path} has not finished")
+    missing = [str(i) for i in range(1, n + 1) if i not in seen]
+    if missing:
+        problems.append(f"missing shards {', '.join(missing)} of {n}")
+    return problems
+
+
+def merge_table(paths: list[Path], out: Path, header: bool, order: dict[str, int]) -> int:
+    """Concatenate shard tables under one header, rows in MAG order (stable within a MAG); returns the row count."""
+    head = None
+    rows = []
+    for path in paths:
+        with open(path, newline="") as f:
+            reader = csv.reader(f, delimiter="\t")
+            if header:
+                first = next(reader, None)
+                head = head or first
+            for row in reader:
+                if row:
+                    rows.append((order.get(row[0].split("@@", 1)[0], len(order)), len(rows), row))
+    rows.sort(key=lambda r: r[:2])
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t", lineterminator="\n")
+        if head:
+            w.writerow(head)
+        w.writerows(row for _, _, row in rows)
+    tmp.replace(out)
+    return len(rows)
+
+
+def merge_shards(output_dir: Path, shards: list[Shard], store, log: Callable[[str], None] = print) -> list[str]:
+    """
+    Combine finished shards into output_dir (store, summary, input_MAGs.txt, tables, report and a
+    config.yaml for `magport query`/`report`); `store` is workflow/scripts/result_store.py imported
+    as a module. Returns the merged MAG IDs.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    shards = sorted(shards, key=lambda s: s.index)
+    samples = dict(sorted(m for s in shards for m in s.mags))
+    order = {mag: k for k, mag in enumerate(samples)}
+    mags = list(samples)
+    write_if_changed(output_dir / "input_MAGs.txt", "\n".join(f"{k}\t{v}" for k, v in samples.items()))
+
+    config = dict(shards[0].config)
+    config["shard"] = ""
+    config["output_dir"] = str(output_dir)
+    with open(output_dir / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
+    files = config.get("output_files", {})
+
+    # rebuilt from scratch, so MAGs of an earlier split do not linger
+    db = output_dir / files.get("store", "magport.sqlite")
+    tmp_db = db.with_name(db.name + ".merging")
+    for p in (tmp_db, Path(f"{tmp_db}-wal"), Path(f"{tmp_db}-shm")):
+        p.unlink(missing_ok=True)
+    conn = store.connect(tmp_db)
+    for s in shards:
+        if s.mags:
+            rows = store.merge(conn, s.store)
+            log(f"shard {s.index}/{s.count}: {rows} MAGs from {s.path}")
+    summary = output_dir / files.get("summary", "MAGport_summary.tsv")
+    cols = store.summary_columns(conn)
+    with open(summary.with_name(summary.name + ".tmp"), "w", newline="") as f:
+        store.write_tsv(f, cols, store.export_rows(conn, mags, cols, skipped=True))
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    summary.with_name(summary.name + ".tmp").replace(summary)
+    os.replace(tmp_db, db)
+    for p in (Path(f"{tmp_db}-wal"), Path(f"{tmp_db}-shm")):
+        p.unlink(missing_ok=True)
+    log(f"{len(mags)} MAGs in {summary}")
+
+    directories = config.get("directories", {})
+    for key, default, name, header in MERGE_TABLES:
+        paths = [s.out(key, default) / name for s in shards if (s.out(key, default) / name).is_file()]
+        if paths:
+            out = output_dir / directories.get(key, default) / name
+            rows = merge_table(paths, out, header, order)
+            log(f"{out.relative_to(output_dir)}: {rows} rows from {len(paths)} shards")
+
+    report = output_dir / files.get("report", "MAGport_report.html")
+    cmd = [sys.executable, str(REPO / "workflow" / "scripts" / "report.py"), str(summary), str(report),
+           config.get("report_title", "MAGport Report"), str(config.get("input_dir", ""))]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if proc.returncode:
+        log(f"report not built: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+    else:
+        log(f"report: {report}")
+    return mags
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+"""Progress, throughput and ETA of a MAGport run, read from its files only
+
+Nothing here talks to Snakemake or slows the pipeline down. A snapshot combines
+  - expected jobs per rule (benchmark tag) from the run's config.yaml and input_MAGs.txt:
+    one per MAG, chunk or batch, or a single job
+  - finished jobs: Snakemake writes benchmarks/{tag}.{MAG or batch}.benchmark.txt when a job
+    ends; its mtime gives the rolling throughput and its wall time the cost models
+  - running jobs: the incomplete markers Snakemake keeps in .snakemake/incomplete/ (the
+    urlsafe base64 of each output path; the marker mtime is the job start), and on Linux the
+    resident memory of the processes whose command line names one of those outputs
+  - genome sizes from input_manifest.json, so the MAG files are not stat'ed again
+
+The ETA sums the predicted wall time of every job that has not finished, per rule from a
+seconds = base + slope * Mb fit of the finished jobs (the resource models until a rule has
+MIN_FIT_POINTS jobs), and divides it by the concurrency observed over the rolling window.
+"""
+
+import base64
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from magport.manifest import MANIFEST_FILE, is_compressed, manifest_sizes
+from magport.profile import benchmark_dir, load_run_config
+from magport.resources import GZIP_RATIO, MIN_FIT_POINTS, MODEL_FILE, load_models, split_batches, split_benchmark_name
+
+WINDOW_S = 3600.0
+REPO = Path(__file__).resolve().parent.parent
+
+# output file name -> benchmark tag of the rule writing it (first match wins; "w" is the wildcard)
+OUTPUT_TAGS = [
+    (re.compile(r"(?P<w>chunk\d+)\.seqkit\.tsv"), "seqkit"),
+    (re.compile(r"stats_summary\.tsv"), "stats"),
+    (re.compile(r"clusters\.tsv"), "dedup"),
+    (re.compile(r"gate\.tsv"), "quality_gate"),
+    (re.compile(r"(?P<w>.+)\.domain\.tsv"), "domain"),
+    (re.compile(r"(?P<w>.+)\.(rRNA\.gff|rRNA\.fna|16S\.fasta)"), "barrnap"),
+    (re.compile(r"(?P<w>.+)\.trnascan\.txt"), "trnascan"),
+    (re.compile(r"(?P<w>.+)\.16S\.tsv|batch_16S\.blast\.tsv"), "blast16s"),
+    (re.compile(r"(?P<w>.+)\.(faa|gff|fna)"), "prodigal"),
+    (re.compile(r"checkm2_summary\.tsv"), "checkm2"),
+    (re.compile(r"checkm1_summary\.tsv"), "checkm1"),
+    (re.compile(r"GUNC_summary\.tsv"), "gunc"),
+    (re.compile(r"gtdb\.merged_summary\.tsv"), "gtdbtk"),
+    (re.compile(r"park_summary\.tsv"), "park"),
+    (re.compile(r"MIMAG_summary\.tsv"), "mimag"),
+    (re.compile(r".+_summary\.tsv"), "summary"),
+    (re.compile(r".+\.html"), "report_html"),
+]
+BATCH_DIR = re.compile(r"batch\d+")
+
+"""status sample (magport status)
+rule       jobs          MAGs           running   MAGs/h   mean s   left (job time)
+prodigal   41210/50000   41210/50000    14        3120     41.3     101.2 h
+gtdbtk     3/10          15000/50000    2         1480     5130.8   8.9 h
+"""
+
+
+@dataclass
+class RuleStatus:
+    tag: str
+    members: dict[str, list[str]]  # wildcard ("" for single jobs) -> MAGs it covers
+    done: dict[str, tuple[float, float]] = field(default_factory=dict)  # wildcard -> (wall s, end epoch s)
+    running: list[str] = field(default_factory=list)
+    mags_per_h: float = 0.0
+    remaining_s: float = 0.0
+
+    @property
+    def mags_total(self) -> int:
+        return sum(len(m) for m in self.members.values())
+
+    @property
+    def mags_done(self) -> int:
+        return sum(len(self.members[w]) for w in self.done)
+
+
+@dataclass
+class RunningJob:
+    tag: str
+    wildcard: str
+    started: float
+    outputs: list[str]
+    rss_mb: Optional[float] = None
+
+
+def expected_jobs(config: dict, mags: list[str]) -> dict[str, dict[str, list[str]]]:
+    """
+    Jobs of every rule for the run's config: wildcard -> member MAGs.
+    Example (batch_size 0, chunk_size 500, 2 MAGs):
+        expected_jobs(cfg, ['MAG1', 'MAG2'])["prodigal"] -> {'MAG1': ['MAG1'], 'MAG2': ['MAG2']}
+        expected_jobs(cfg, ['MAG1', 'MAG2'])["seqkit"] -> {'chunk0000': ['MAG1', 'MAG2']}
+    """
+    per_mag = {m: [m] for m in mags}
+    single = {"": list(mags)}
+    batches = split_batches(mags, int(config.get("batch_size", 0) or 0))
+    jobs = {"prodigal": per_mag, "domain": per_mag, "barrnap": per_mag, "trnascan": per_mag}
+    if config.get("dedup", False):
+        jobs["dedup"] = single
+    if config.get("stats_backend", "seqkit") == "native":
+        jobs["stats"] = single
+    else:
+        jobs["seqkit"] = split_batches(mags, int(config.get("chunk_size", 500) or 0), prefix="chunk")
+        jobs["stats_merge"] = single
+    if config.get("use_checkm", "checkm2") == "checkm2":
+        jobs.update({"checkm2": batches, "gather_checkm2": single})
+    else:
+        jobs["checkm1"] = single
+    if config.get("quality_gate", False):
+        jobs["quality_gate"] = single
+    jobs.update({"gunc": batches, "gather_gunc": single, "gtdbtk": batches, "gather_gtdbtk": single})
+    jobs["blast16s"] = single if config.get("rrna16s_batch", True) else per_mag
+    jobs.update({"park": single, "mimag": single, "summary": single, "report_html": single})
+    return jobs
+
+
+def read_mags(output_dir: Path) -> list[str]:
+    try:
+        with open(output_dir / "input_MAGs.txt") as f:
+            return [line.split('\t')[0].strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def genome_mb(output_dir: Path, mags: list[str], config: dict) -> dict[str, float]:
+    """Uncompressed Mb per MAG from the input manifest (0 for MAGs it does not list)."""
+    sizes = manifest_sizes(output_dir / MANIFEST_FILE)
+    factor = GZIP_RATIO if is_compressed(config.get("file_extension", "")) else 1.0
+    return {m: sizes.get(m, 0) / 1e6 * factor for m in mags}
+
+
+def _benchmark_seconds(path: str) -> Optional[float]:
+    try:
+        with open(path) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+        return float(dict(zip(header, rows[-1]))["s"])
+    except (OSError, IndexError, KeyError, ValueError):
+        return None
+
+
+class BenchmarkCache:
+    """Finished jobs from the benchmark directory; files already read are not opened again."""
+
+    def __init__(self, bench_dir: Path):
+        self.bench_dir = bench_dir
+        self.jobs: dict[str, tuple[str, str, float, float]] = {}  # name -> (tag, wildcard, s, end)
+
+    def refresh(self) -> list[tuple[str, str, float, float]]:
+        try:
+            entries = list(os.scandir(self.bench_dir))
+        except OSError:
+            return list(self.jobs.values())
+        for e in entries:
+            if not e.name.endswith(".benchmark.txt"):
+                continue
+            try:
+                mtime = e.stat().st_mtime
+            except OSError:
+                continue
+            known = self.jobs.get(e.name)
+            if known and known[3] == mtime:
+                continue
+            seconds = _benchmark_seconds(e.path)
+            if seconds is None:
+                continue
+            tag, wildcard = split_benchmark_name(e.name)
+            self.jobs[e.name] = (tag, wildcard, seconds, mtime)
+        return list(self.jobs.values())
+
+
+def find_snakemake_dirs(output_dir: Path, extra: Optional[Path] = None) -> list[Path]:
+    """.snakemake directories that may belong to the run (the CLI starts Snakemake from the repository)."""
+    candidates = [extra, Path.cwd(), REPO, output_dir]
+    seen, found = set(), []
+    for c in candidates:
+        if c is None:
+            continue
+        d = Path(c).resolve() / ".snakemake"
+        if d not in seen and d.is_dir():
+            seen.add(d)
+            found.append(d)
+    return found
+
+
+def _decode_marker(root: Path, path: Path) -> Optional[str]:
+    """Output path of an incomplete marker (long ids are split into '@'-prefixed directories)."""
+    parts = [p.lstrip('@') for p in path.relative_to(root).parts]
+    try:
+        return base64.urlsafe_b64decode("".join(parts).encode()).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def output_tag(path: str) -> tuple[str, str]:
+    """
+    Benchmark tag and wildcard of the rule writing `path`.
+    Example:
+        output_tag("/out/02_genes/trna/MAG1.trnascan.txt") -> ("trnascan", "MAG1")
+        output_tag("/out/03_quality/gunc/batches/batch0002/GUNC_summary.tsv") -> ("gunc", "batch0002")
+    """
+    p = Path(path)
+    for pattern, tag in OUTPUT_TAGS:
+        m = pattern.fullmatch(p.name)
+        if not m:
+            continue
+        if tag in ("checkm2", "gunc", "gtdbtk"):
+            return (tag, p.parent.name) if BATCH_DIR.fullmatch(p.parent.name) else (f"gather_{tag}", "")
+        return tag, (m.groupdict().get("w") or "")
+    return p.name, ""
+
+
+def running_jobs(smk_dirs: list[Path], output_dir: Path) -> list[RunningJob]:
+    """Jobs with an incomplete marker for an output below `output_dir`, one per (tag, wildcard)."""
+    prefix = str(output_dir.resolve()) + os.sep
+    jobs: dict[tuple[str, str], RunningJob] = {}
+    for smk in smk_dirs:
+        root = smk / "incomplete"
+        if not root.is_dir():
+            continue
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                marker = Path(dirpath) / name
+                out = _decode_marker(root, marker)
+                if not out or not out.startswith(prefix):
+                    continue
+                try:
+                    started = marker.stat().st_mtime
+                except OSError:
+                    continue
+                tag, wildcard = output_tag(out)
+                job = jobs.setdefault((tag, wildcard), RunningJob(tag, wildcard, started, []))
+                job.outputs.append(out)
+                job.started = min(job.started, started)
+    return sorted(jobs.values(), key=lambda j: j.started)
+
+
+def process_table() -> dict[int, tuple[int, float, str]]:
+    """pid -> (parent pid, RSS MB, command line) from /proc; {} where /proc is unavailable."""
+    table = {}
+    page_mb = os.sysconf("SC_PAGE_SIZE") / 1e6 if hasattr(os, "sysconf") else 0.004096
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return table
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{pid}/statm") as f:
+                rss_pages = int(f.read().split()[1])
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except (OSError, ValueError, IndexError):
+            continue
+        ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+        table[pid] = (ppid, rss_pages * page_mb, cmdline)
+    return table
+
+
+def attach_memory(jobs: list[RunningJob], procs: dict[int, tuple[int, float, str]]) -> None:
+    """RSS of each job: the processes naming one of its outputs plus all their descendants."""
+    if not jobs or not procs:
+        return
+    children: dict[int, list[int]] = {}
+    for pid, (ppid, _, _) in procs.items():
+        children.setdefault(ppid, []).append(pid)
+    for job in jobs:
+        roots = [pid for pid, (_, _, cmd) in procs.items() if any(out in cmd for out in job.outputs)]
+        if not roots:
+            continue
+        seen, stack = set(), list(roots)
+        while stack:
+            pid = stack.pop()
+            if pid not in seen:
+                seen.add(pid)
+                stack.extend(children.get(pid, []))
+        job.rss_mb = sum(procs[pid][1] for pid in seen)
+
+
+def _fit(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """(base s, s per Mb) least-squares fit with a non-negative slope."""
+    n = len(points)
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    slope = max(0.0, sum((x - mx) * (y - my) for x, y in points) / sxx) if sxx > 0 else 0.0
+    return max(0.0, my - slope * mx), slope
+
+
+@dataclass
+class Snapshot:
+    output_dir: Path
+    taken: float
+    mags: int
+    rules: list[RuleStatus]
+    running: list[RunningJob]
+    concurrency: float
+    eta_s: Optional[float]
+    since: Optional[float]
+
+    @property
+    def finished(self) -> bool:
+        return all(len(r.done) == len(r.members) for r in self.rules)
+
+
+class StatusReader:
+    """Builds Snapshots of one output directory; keep it around to refresh cheaply (dashboard)."""
+
+    def __init__(self, output_dir: Path, workdir: Optional[Path] = None, window_s: float = WINDOW_S):
+        self.output_dir = Path(output_dir).resolve()
+        self.config = load_run_config(self.output_dir)
+        self.window_s = window_s
+        self.workdir = workdir
+        self.bench = BenchmarkCache(benchmark_dir(self.output_dir, self.config))
+        self.models = load_models(self.bench.bench_dir / MODEL_FILE)
+        self._mags: list[str] = []
+        self._mags_mtime = None
+
+    def _load_inputs(self) -> None:
+        try:
+            mtime = (self.output_dir / "input_MAGs.txt").stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mags_mtime:
+            self._mags_mtime = mtime
+            self._mags = read_mags(self.output_dir)
+            self.jobs = expected_jobs(self.config, self._mags)
+            self.sizes = genome_mb(self.output_dir, self._mags, self.config)
+
+    def snapshot(self, memory: bool = True) -> Snapshot:
+        now = time.time()
+        self._load_inputs()
+        rules = {tag: RuleStatus(tag, members) for tag, members in self.jobs.items()}
+        for tag, wildcard, seconds, end in self.bench.refresh():
+            rule = rules.get(tag)
+            if rule is not None and wildcard in rule.members:
+                rule.done[wildcard] = (seconds, end)
+
+        smk_dirs = find_snakemake_dirs(self.output_dir, self.workdir)
+        running = running_jobs(smk_dirs, self.output_dir)
+        if memory:
+            attach_memory(running, process_table())
+        for job in running:
+            if job.tag == "stats" and "stats_merge" in rules:  # stats_summary.tsv of the seqkit backend
+                job.tag = "stats_merge"
+            if job.tag in rules:
+                rules[job.tag].running.append(job.wildcard)
+
+        # rolling window: the last window_s seconds, or since the current run started
+        since = self._run_start(smk_dirs)
+        window = max(1.0, min(self.window_s, now - since)) if since else self.window_s
+        busy_s = 0.0  # job seconds spent inside the window
+        for rule in rules.values():
+            points, recent = [], 0
+            for wildcard, (seconds, end) in rule.done.items():
+                mb = sum(self.sizes.get(m, 0.0) for m in rule.members[wildcard])
+                points.append((mb, seconds))
+                if end >= now - window:
+                    recent += len(rule.members[wildcard])
+                busy_s += max(0.0, min(end, now) - max(end - seconds, now - window))
+            rule.mags_per_h = recent / window * 3600
+            if len(points) >= MIN_FIT_POINTS:
+                base, slope = _fit(points)
+            else:
+                m = self.models.get(rule.tag, self.models["table"])
+                base, slope = m["time_base"] * 60, m["time_per_mb"] * 60
+            for wildcard, members in rule.members.items():
+                if wildcard not in rule.done:
+                    rule.remaining_s += base + slope * sum(self.sizes.get(m, 0.0) for m in members)
+        for job in running:
+            busy_s += min(now - job.started, window)
+            rule = rules.get(job.tag)
+            if rule is not None:  # time already spent on running jobs is not left to do
+                rule.remaining_s = max(0.0, rule.remaining_s - (now - job.started))
+
+        concurrency = busy_s / window
+        remaining = sum(r.remaining_s for r in rules.values())
+        eta = None
+        if remaining <= 0:
+            eta = 0.0
+        elif concurrency > 0 and running:
+            longest = max((r.remaining_s / max(1, len(r.members) - len(r.done)) for r in rules.values()
+                           if len(r.done) < len(r.members)), default=0.0)
+            eta = max(remaining / concurrency, longest)
+        return Snapshot(self.output_dir, now, len(self._mags), list(rules.values()), running, concurrency, eta, since)
+
+    @staticmethod
+    def _run_start(smk_dirs: list[Path]) -> Optional[float]:
+        """Start of the current Snakemake run: the oldest lock file, None when no run holds a lock."""
+        times = []
+        for smk in smk_dirs:
+            try:
+                times += [e.stat().st_mtime for e in os.scandir(smk / "locks") if e.name.endswith(".lock")]
+            except OSError:
+                continue
+        return min(times) if times else None
@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+"""Watch mode: characterise MAGs as they arrive in input_dir, in micro-batches
+
+A plain `magport` run rediscovers every MAG and, since CheckM2, GUNC and GTDB-Tk are all-MAG
+jobs, reprocesses the whole set whenever one MAG is added. The watcher instead
+  - lists input_dir with the input manifest (only directories whose mtime changed are listed
+    again), woken early by inotify when inotify_simple is installed and polling otherwise
+  - queues MAGs that are new or changed (other path or size) once their file has not been
+    modified for `settle_s`, so half-written files are not picked up
+  - cuts the queue into micro-batches of `batch_mags` MAGs, or whatever is queued once the
+    oldest MAG has waited `window_s`
+  - runs the full workflow on each batch in <output>/watch/batches/<batch>/results, at most
+    `parallel` batches at a time with threads and memory split between them
+  - merges each finished batch into the project: its rows are upserted into <output>/magport.sqlite,
+    appended to MAGport_summary.tsv and the report is rebuilt; MAGs done before are not touched
+
+Everything the watcher knows is kept in <output>/watch/state.json, written atomically after each
+change, so a restart resumes interrupted batches (Snakemake reruns only their unfinished jobs)
+and never reprocesses merged MAGs. A lock file keeps a second watcher off the same output.
+"""
+
+import fcntl
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from magport.manifest import MANIFEST_FILE, scan_inputs, write_if_changed
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # optional; without it the input directory is polled
+    INotify = None
+
+WATCH_DIR = "watch"
+STATE_FILE = "state.json"
+STATE_VERSION = 1
+LOCK_FILE = "watch.lock"
+BATCH_PREFIX = "mb"
+REPO = Path(__file__).resolve().parent.parent
+
+"""state.json sample
+{"version": 1, "next": 3,
+ "done": {"MAG1": ["/data/mags/MAG1.fna", 903669, 1760000000000000000, "mb000001"]},
+ "batches": {"mb000001": {"status": "merged", "attempts": 1, "size": 50, "finished": 1760003600.0},
+             "mb000002": {"status": "running", "attempts": 1, "created": 1760003000.0,
+                          "mags": {"MAG7": ["/data/mags/MAG7.fna", 1204220, 1760002000000000000]}}}}
+"""
+
+
+@dataclass
+class Pending:
+    path: str
+    size: int
+    mtime_ns: int
+    first_seen: float
+
+
+class WatchState:
+    """state.json: merged MAGs and the batches that are queued, running, failed or merged."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get("version") != STATE_VERSION:
+            data = {"version": STATE_VERSION, "next": 1, "done": {}, "batches": {}}
+        self.data = data
+
+    @property
+    def done(self) -> dict[str, list]:
+        return self.data["done"]
+
+    @property
+    def batches(self) -> dict[str, dict]:
+        return self.data["batches"]
+
+    def save(self) -> None:
+        write_if_changed(self.path, json.dumps(self.data, sort_keys=True, separators=(',', ':')))
+
+    def in_flight(self) -> dict[str, str]:
+        """MAG -> path for every MAG of a batch that is not merged yet."""
+        return {mag: rec[0] for batch in self.batches.values() if batch["status"] != "merged"
+                for mag, rec in batch.get("mags", {}).items()}
+
+    def new_batch(self, mags: dict[str, Pending]) -> str:
+        name = f"{BATCH_PREFIX}{self.data['next']:06d}"
+        self.data["next"] += 1
+        self.batches[name] = {"status": "queued", "attempts": 0, "created": time.time(),
+                              "mags": {m: [p.path, p.size, p.mtime_ns] for m, p in mags.items()}}
+        self.save()
+        return name
+
+
+class InputWaiter:
+    """Sleep until the poll interval ends, or earlier when inotify reports a change in input_dir."""
+
+    MASK = 0
+
+    def __init__(self, input_dir: Path):
+        self.inotify = None
+        self.watched: set[str] = set()
+        if INotify is not None:
+            self.MASK = (inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE
+                         | inotify_flags.DELETE | inotify_flags.MOVED_FROM)
+            try:
+                self.inotify = INotify()
+            except OSError:
+                self.inotify = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.inotify is not None else "polling"
+
+    def update(self, dirs: list[str]) -> None:
+        if self.inotify is None:
+            return
+        for d in dirs:
+            if d not in self.watched:
+                try:
+                    self.inotify.add_watch(d, self.MASK)
+                    self.watched.add(d)
+                except OSError:
+                    continue
+
+    def wait(self, timeout_s: float) -> None:
+        if self.inotify is None:
+            time.sleep(timeout_s)
+        else:
+            self.inotify.read(timeout=int(timeout_s * 1000), read_delay=200)
+
+
+class Watcher:
+    """
+    Long-lived micro-batch loop over one input directory and project output directory.
+    `make_cmd(input_dir, output_dir, threads, mem_gb)` writes the batch config and returns its
+    Snakemake command; `store` is workflow/scripts/result_store.py imported as a module.
+    """
+
+    def __init__(self, input_dir: Path, output_dir: Path, ext: str, config: dict,
+                 make_cmd: Callable[[str, str, int, Optional[float]], list[str]], store,
+                 threads: int, mem_gb: Optional[float] = None, batch_mags: int = 50,
+                 window_s: float = 600.0, settle_s: float = 60.0, poll_s: float = 30.0,
+                 parallel: int = 1, retries: int = 2, log: Callable[[str], None] = print):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.ext = ext
+        self.config = config
+        self.make_cmd = make_cmd
+        self.store = store
+        self.parallel = max(1, parallel)
+        self.threads = max(1, threads // self.parallel)
+        self.mem_gb = mem_gb / self.parallel if mem_gb else None
+        self.batch_mags = max(1, batch_mags)
+        self.window_s = window_s
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.retries = retries
+        self.log = log
+
+        files = config.get("output_files", {})
+        self.summary_tsv = self.output_dir / files.get("summary", "MAGport_summary.tsv")
+        self.report_html = self.output_dir / files.get("report", "MAGport_report.html")
+        self.store_db = self.output_dir / files.get("store", "magport.sqlite")
+        self.watch_dir = self.output_dir / WATCH_DIR
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        self.state = WatchState(self.watch_dir / STATE_FILE)
+        self.pending: dict[str, Pending] = {}
+        self.verified: dict[str, int] = {}  # MAG -> manifest size already checked against `done`
+        self.procs: dict[str, tuple[subprocess.Popen, float]] = {}
+        self.waiter = InputWaiter(self.input_dir)
+
+    def scan(self) -> dict[str, tuple[str, int]]:
+        found = scan_inputs(self.input_dir, self.ext, self.watch_dir / MANIFEST_FILE)
+        self.waiter.update([str(self.input_dir)] + sorted({os.path.dirname(p) for p, _ in found.values()}))
+        return found
+
+    def _changed(self, found: dict[str, tuple[str, int]]) -> dict[str, str]:
+        """MAGs that are neither merged in their current version nor in an unmerged batch."""
+        in_flight = self.state.in_flight()
+        changed = {}
+        for mag, (path, size) in found.items():
+            if in_flight.get(mag) == path:
+                continue
+            rec = self.state.done.get(mag)
+            if rec and rec[0] == path:
+                if rec[1] == size or self.verified.get(mag) == size:
+                    continue
+                # the manifest size can lag behind a file that was still growing when it was listed
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if (st.st_size, st.st_mtime_ns) == (rec[1], rec[2]):
+                    self.verified[mag] = size
+                    continue
+            changed[mag] = path
+        return changed
+
+    def update_pending(self, found: dict[str, tuple[str, int]], now: float) -> None:
+        changed = self._changed(found)
+        pending = {}
+        for mag, path in changed.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            prev = self.pending.get(mag)
+            pending[mag] = Pending(path, st.st_size, st.st_mtime_ns, prev.first_seen if prev else now)
+        self.pending = pending
+
+    def cut_batches(self, now: float) -> list[str]:
+        """Queue settled MAGs as full batches, or all of them once the oldest waited `window_s`."""
+        settled = sorted((p.first_seen, mag) for mag, p in self.pending.items()
+                         if now - p.mtime_ns / 1e9 >= self.settle_s)
+        names = []
+        while settled and (len(settled) >= self.batch_mags or now - settled[0][0] >= self.window_s):
+            chunk, settled = settled[:self.batch_mags], settled[self.batch_mags:]
+            mags = {mag: self.pending.pop(mag) for _, mag in chunk}
+            name = self.state.new_batch(mags)
+            self.log(f"{name}: queued {len(mags)} MAGs")
+            names.append(name)
+        return names
+
+    def batch_dir(self, name: str) -> Path:
+        return self.watch_dir / "batches" / name
+
+    def _link_inputs(self, name: str, mags: dict[str, list]) -> Path:
+        inputs = self.batch_dir(name) / "inputs"
+        inputs.mkdir(parents=True, exist_ok=True)
+        for entry in os.scandir(inputs):
+            if entry.is_symlink() and entry.name[:-len(self.ext)] not in mags:
+                os.unlink(entry.path)
+        for mag, (path, *_) in mags.items():
+            link = inputs / f"{mag}{self.ext}"
+            if os.path.islink(link) and os.readlink(link) == path:
+                continue
+            if os.path.lexists(link):
+                os.unlink(link)
+            os.symlink(path, link)
+        return inputs
+
+    def launch(self, name: str) -> None:
+        batch = self.state.batches[name]
+        inputs = self._link_inputs(name, batch["mags"])
+        results = self.batch_dir(name) / "results"
+        cmd = self.make_cmd(str(inputs), str(results), self.threads, self.mem_gb)
+        with open(self.batch_dir(name) / "snakemake.log", "a") as log:
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        self.procs[name] = (proc, time.time())
+        batch["status"] = "running"
+        batch["attempts"] += 1
+        self.state.save()
+        self.log(f"{name}: running {len(batch['mags'])} MAGs (attempt {batch['attempts']}, {self.threads} threads)")
+
+    def launch_queued(self) -> None:
+        queued = sorted(n for n, b in self.state.batches.items() if b["status"] == "queued" and n not in self.procs)
+        for name in queued[:self.parallel - len(self.procs)]:
+            self.launch(name)
+
+    def reap(self) -> list[str]:
+        """Collect finished batch runs; returns the names of the successful ones."""
+        finished = []
+        for name, (proc, started) in list(self.procs.items()):
+            rc = proc.poll()
+            if rc is None:
+                continue
+            del self.procs[name]
+            batch = self.state.batches[name]
+            minutes = (time.time() - started) / 60
+            if rc == 0:
+                finished.append(name)
+                continue
+            log_path = self.batch_dir(name) / "snakemake.log"
+            if batch["attempts"] <= self.retries:
+                batch["status"] = "queued"
+                self.log(f"{name}: failed with code {rc} after {minutes:.1f} min, retrying (see {log_path})")
+            else:
+                batch["status"] = "failed"
+                self.log(f"{name}: failed with code {rc} after {minutes:.1f} min, giving up (see {log_path}); "
+                         "it is retried when the watcher restarts")
+            self.state.save()
+        return finished
+
+    def merge(self, names: list[str]) -> None:
+        """Upsert finished batches into the project store, then refresh the summary, MAG list and report."""
+        conn = self.store.connect(self.store_db)
+        replaced = False
+        new_mags = []
+        for name in names:
+            batch = self.state.batches[name]
+            mags = sorted(batch["mags"])
+            results = self.batch_dir(name) / "results"
+            source = results / self.store_db.name
+            if source.is_file():
+                self.store.merge(conn, source, mags)
+            for mag in mags:
+                replaced |= mag in self.state.done
+                self.state.done.pop(mag, None)  # re-insert so `done` stays in merge order
+                self.state.done[mag] = [*batch["mags"][mag], name]
+                new_mags.append(mag)
+            self.state.batches[name] = {"status": "merged", "attempts": batch["attempts"],
+                                        "size": len(mags), "finished": time.time()}
+        self.state.save()
+
+        mags = list(self.state.done)
+        write_if_changed(self.output_dir / "input_MAGs.txt",
+                         "".join(f"{m}\t{self.state.done[m][0]}\n" for m in mags))
+        cols = self.store.summary_columns(conn)
+        if replaced or not self.summary_tsv.is_file() or self._summary_header() != cols:
+            with open(self.summary_tsv, 'w', newline='') as f:
+                self.store.write_tsv(f, cols, self.store.export_rows(conn, mags, cols, skipped=True))
+        else:
+            with open(self.summary_tsv, 'a', newline='') as f:
+                self.store.write_tsv(f, cols, self.store.export_rows(conn, new_mags, cols, skipped=True), header=False)
+        conn.close()
+        self.log(f"merged {', '.join(names)}: {len(new_mags)} MAGs, {len(mags)} in {self.summary_tsv.name}")
+        self.build_report()
+
+    def _summary_header(self) -> list[str]:
+        with open(self.summary_tsv) as f:
+            return f.readline().rstrip('\n').split('\t')
+
+    def build_report(self) -> None:
+        cmd = [sys.executable, str(REPO / "workflow" / "scripts" / "report.py"), str(self.summary_tsv),
+               str(self.report_html), self.config.get("report_title", "MAGport Report"), str(self.input_dir)]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode:
+            self.log(f"report not rebuilt: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+
+    def resume(self) -> None:
+        """Requeue batches a previous watcher left running, failed or unmerged."""
+        for name, batch in self.state.batches.items():
+            if batch["status"] in ("running", "failed"):
+                if batch["status"] == "failed":
+                    batch["attempts"] = 0
+                batch["status"] = "queued"
+                self.log(f"{name}: resuming {len(batch['mags'])} MAGs")
+        self.state.save()
+
+    def idle(self) -> bool:
+        return not self.pending and not self.procs and not any(
+            b["status"] == "queued" for b in self.state.batches.values())
+
+    def stop(self) -> None:
+        """Interrupt running batches; they stay `running` in the state and resume on restart."""
+        for proc, _ in self.procs.values():
+            if proc.poll() is None:
+                os.killpg(proc.pid, signal.SIGINT)
+        for name, (proc, _) in self.procs.items():
+            try:
+                proc.wait(timeout=120)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+            self.log(f"{name}: interrupted, resumes on restart")
+        self.procs.clear()
+
+    def run(self, once: bool = False) -> None:
+        """Watch until interrupted; with `once`, stop when everything present now is merged."""
+        signal.signal(signal.SIGTERM, _interrupt)
+        self.resume()
+        self.log(f"watching {self.input_dir} ({self.waiter.mode}, every {self.poll_s:g} s); "
+                 f"{len(self.state.done)} MAGs done")
+        try:
+            while True:
+                now = time.time()
+                self.update_pending(self.scan(), now)
+                if once and self.pending:
+                    # no more MAGs are expected: do not wait for the batch window
+                    for p in self.pending.values():
+                        p.first_seen = min(p.first_seen, now - self.window_s)
+                self.cut_batches(now)
+                self.launch_queued()
+                finished = self.reap()
+                if finished:
+                    self.merge(finished)
+                    self.launch_queued()
+                if once and self.idle():
+                    break
+                if self.procs:
+                    time.sleep(min(self.poll_s, 5.0))
+                else:
+                    self.waiter.wait(min(self.poll_s, self.settle_s) if self.pending else self.poll_s)
+        finally:
+            self.stop()
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def acquire_lock(watch_dir: Path):
+    """Exclusive lock on <output>/watch/watch.lock; returns the open file or None when held elsewhere."""
+    watch_dir.mkdir(parents=True, exist_ok=True)
+    f = open(watch_dir / LOCK_FILE, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "workflow" / "scripts"))
+from result_store import connect, upsert
+
+# Usage: python test/perf/generate.py --out /tmp/magport_perf --mags 1000 [--seed 1]
+
+"""Synthetic MAG set plus matching fake tool outputs for the performance suite
+MAGs:    {out}/mags/{MAG}.fna, contig lengths drawn from a log-normal distribution, per-MAG GC
+         drawn around --gc, and a fraction --n-frac of N bases.
+Outputs: the files the pipeline would have produced for these MAGs, laid out like a real
+         output directory ({out}/results, default `directories` of config/config.yaml):
+         input_MAGs.txt, the per-MAG ORF/tRNA/rRNA/domain results in the result store
+         (magport.sqlite), per-MAG domain and 16S tables, CheckM2, GUNC and GTDB-Tk summaries,
+         and a combined batched 16S BLAST table.
+Nothing here needs a bioinformatics tool; everything is generated with NumPy.
+"""
+
+PHYLA = ["Pseudomonadota", "Bacillota", "Actinomycetota", "Bacteroidota", "Chloroflexota",
+         "Thermoproteota", "Halobacteriota", "Patescibacteria", "Planctomycetota", "Acidobacteriota"]
+ARCHAEA = {"Thermoproteota", "Halobacteriota"}
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+def contig_lengths(rng: np.random.Generator, args) -> np.ndarray:
+    n = max(1, int(rng.poisson(args.contigs)))
+    return np.maximum(args.min_len, rng.lognormal(np.log(args.contig_len), args.contig_sigma, n)).astype(int)
+
+
+def random_sequence(rng: np.random.Generator, length: int, gc: float, n_frac: float) -> bytes:
+    # A, C, G, T with P(C) = P(G) = gc / 2, then sprinkle Ns
+    probs = [(1 - gc) / 2, gc / 2, gc / 2, (1 - gc) / 2]
+    seq = rng.choice(BASES, size=length, p=probs)
+    if n_frac > 0:
+        seq[rng.random(length) < n_frac] = ord('N')
+    return seq.tobytes()
+
+
+def write_fasta(path: Path, rng: np.random.Generator, lengths: np.ndarray, gc: float, n_frac: float,
+                width: int = 80) -> None:
+    with open(path, 'wb') as f:
+        for i, length in enumerate(lengths, 1):
+            seq = random_sequence(rng, int(length), gc, n_frac)
+            f.write(f">contig_{i} len={length}\n".encode())
+            f.write(b"\n".join(seq[j:j + width] for j in range(0, len(seq), width)) + b"\n")
+
+
+def lineage(rng: np.random.Generator) -> str:
+    phylum = PHYLA[int(rng.zipf(1.6)) % len(PHYLA)]
+    domain = "Archaea" if phylum in ARCHAEA else "Bacteria"
+    c, o, f, g, s = (int(x) for x in rng.integers(0, [20, 60, 200, 800, 3000]))
+    ranks = [f"d__{domain}", f"p__{phylum}", f"c__C{c}", f"o__O{o}", f"f__F{f}", f"g__G{g}", f"s__G{g} sp{s}"]
+    cut = int(rng.choice([7, 6, 5, 4], p=[0.5, 0.3, 0.15, 0.05]))  # novel taxa leave empty ranks
+    return ";".join(r if i < cut else r[:3] for i, r in enumerate(ranks))
+
+
+def write_table(path: Path, header: list[str], rows) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t', lineterminator='\n')
+        if header:
+            w.writerow(header)
+        w.writerows(rows)
+
+
+def generate(args) -> None:
+    rng = np.random.default_rng(args.seed)
+    out = Path(args.out)
+    mag_dir, res = out / "mags", out / "results"
+    for d in ["02_genes/domain", "03_quality/checkm",
+              "03_quality/gunc", "04_taxonomy/gtdbtk", "04_taxonomy/16S"]:
+        (res / d).mkdir(parents=True, exist_ok=True)
+    mag_dir.mkdir(parents=True, exist_ok=True)
+
+    names = [f"MAG{i:06d}" for i in range(1, args.mags + 1)]
+    checkm, gunc, gtdb, blast, per_mag = [], [], [], [], []
+    for name in names:
+        lengths = contig_lengths(rng, args)
+        gc = float(np.clip(rng.normal(args.gc, 0.08), 0.2, 0.75))
+        write_fasta(mag_dir / f"{name}.fna", rng, lengths, gc, args.n_frac)
+        size = int(lengths.sum())
+
+        comp = float(np.clip(100 - rng.gamma(2.0, 8.0), 5, 100))
+        cont = float(np.clip(rng.exponential(3.0), 0, 60))
+        taxonomy = lineage(rng)
+        domain = taxonomy.split(';')[0][3:]
+        n_trna = int(rng.integers(5, 55))
+        r5, r16, r23 = (int(x) for x in rng.binomial(2, [0.7, 0.6, 0.6]))
+        orfs = int(size / 1000 * 0.9)
+
+        per_mag.append((name, {"num_ORFs": orfs, "num_tRNAs": n_trna, "num_5S_rRNAs": r5, "num_16S_rRNAs": r16,
+                               "num_23S_rRNAs": r23, "Domain_barrnap": domain}))
+        write_table(res / "02_genes/domain" / f"{name}.domain.tsv", ["domain", "bac_score", "arc_score"],
+                    [[domain, 400.0 if domain == "Bacteria" else 100.0, 100.0 if domain == "Bacteria" else 400.0]])
+        hit = []
+        if r16:
+            ident = round(float(rng.uniform(75, 100)), 3)
+            hit = [["16S_rRNA::contig_1:100-1600(+)", "NR_000001.1", ident, 1500, 20, 1, 1, 1500, 1, 1500,
+                    0.0, 2500, 1500, 1500, 100, 562, f"{taxonomy.split(';')[5][3:] or 'Uncultured'} 16S ribosomal RNA"]]
+            blast.append([f"{name}@@{hit[0][0]}", *hit[0][1:]])
+        write_table(res / "04_taxonomy/16S" / f"{name}.16S.tsv", [], hit)
+
+        checkm.append([name, round(comp, 2), round(cont, 2), "Gradient Boost (General Model)", 11, 0.9,
+                       int(lengths.max()), 900.0, size, round(gc, 2), orfs, len(lengths), int(lengths.max()), "None"])
+        gunc.append([name, orfs, int(orfs * 0.9), len(lengths), "kingdom", 1, 0.95, 0.1, 0.05, 0.1, 0.75, 0.7,
+                     "TRUE" if rng.random() > 0.1 else "FALSE"])
+        gtdb.append([name, taxonomy] + ["N/A"] * 11 + ["taxonomic classification defined by topology and ANI",
+                                                         "N/A", "N/A", 85.0, 11, "N/A", "N/A"])
+
+    write_table(res / "input_MAGs.txt", [], [[n, str((mag_dir / f"{n}.fna").resolve())] for n in names])
+    (res / "magport.sqlite").unlink(missing_ok=True)
+    upsert(connect(res / "magport.sqlite"), per_mag)
+    write_table(res / "03_quality/checkm/checkm2_summary.tsv",
+                ["Name", "Completeness", "Contamination", "Completeness_Model_Used", "Translation_Table_Used",
+                 "Coding_Density", "Contig_N50", "Average_Gene_Length", "Genome_Size", "GC_Content",
+                 "Total_Coding_Sequences", "Total_Contigs", "Max_Contig_Length", "Additional_Notes"], checkm)
+    write_table(res / "03_quality/gunc/GUNC_summary.tsv",
+                ["genome", "n_genes_called", "n_genes_mapped", "n_contigs", "taxonomic_level",
+                 "proportion_genes_retained_in_major_clades", "genes_retained_index", "clade_separation_score",
+                 "contamination_portion", "n_effective_surplus_clades", "mean_hit_identity",
+                 "reference_representation_score", "pass.GUNC"], gunc)
+    write_table(res / "04_taxonomy/gtdbtk/gtdb.merged_summary.tsv",
+                ["user_genome", "classification", "closest_genome_reference", "closest_genome_reference_radius",
+                 "closest_genome_taxonomy", "closest_genome_ani", "closest_genome_af", "closest_placement_reference",
+                 "closest_placement_radius", "closest_placement_taxonomy", "closest_placement_ani",
+                 "closest_placement_af", "pplacer_taxonomy", "classification_method", "note",
+                 "other_related_references(genome_id,species_name,radius,ANI,AF)", "msa_percent",
+                 "translation_table", "red_value", "warnings"], gtdb)
+    write_table(res / "04_taxonomy/16S" / "batch_16S.blast.tsv", [], blast)
+    print(f"Generated {len(names)} MAGs in {mag_dir} and fake tool outputs in {res}")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--out", type=Path, required=True, help="Output directory (mags/ and results/)")
+    parser.add_argument("--mags", type=int, default=100, help="Number of MAGs (10 to 100000)")
+    parser.add_argument("--contigs", type=float, default=20, help="Mean contigs per MAG (Poisson)")
+    parser.add_argument("--contig-len", type=float, default=5000, help="Median contig length (log-normal)")
+    parser.add_argument("--contig-sigma", type=float, default=1.0, help="Log-normal sigma of contig lengths")
+    parser.add_argument("--min-len", type=int, default=500, help="Minimum contig length")
+    parser.add_argument("--gc", type=float, default=0.5, help="Mean GC fraction")
+    parser.add_argument("--n-frac", type=float, default=0.0005, help="Fraction of N bases")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic MAGs and fake MAGport tool outputs")
+    add_arguments(parser)
+    generate(parser.parse_args())
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from generate import add_arguments, generate
+
+# Usage: python test/perf/run_benchmarks.py --out /tmp/magport_perf --mags 1000 --json perf_1000.json
+#        python test/perf/run_benchmarks.py --out /tmp/magport_perf --mags 1000 --json new.json --compare old.json
+
+"""Offline performance benchmark of the Python side of MAGport
+Generates a synthetic MAG set with fake tool outputs (generate.py), then times each stage in
+its own process, exactly as the workflow calls it:
+  discovery    MAG discovery through the input manifest, as in the Snakefile
+  dag          snakemake -n on the synthetic set (DAG build and job scheduling)
+  fasta_stats  native FASTA statistics (stats_backend: native)
+  dedup        dedup.py cluster: MinHash sketches of every MAG (from scratch) and clustering
+  park         park_score.py
+  mimag        mimag.py
+  blast16s     blast16s_batch.py split of the combined BLAST table
+  summary      summary.py (all-MAG tables into the result store, streamed TSV export)
+  query        result_store.py query on the filled store (what `magport query` runs)
+  report       report.py
+Peak memory is the child's ru_maxrss. No bioinformatics tool or database is needed.
+"""
+
+"""result JSON sample
+{"magport_commit": "72fe66e", "timestamp": "2026-10-18T09:12:03+00:00", "python": "3.11.9",
+ "host": {"machine": "x86_64", "cpus": 16}, "params": {"mags": 1000, "contigs": 20, ...},
+ "stages": [{"stage": "summary", "seconds": 4.12, "peak_rss_mb": 151.3, "mags": 1000,
+             "mags_per_s": 242.7, "returncode": 0, "error": ""}, ...]}
+"""
+
+REPO = Path(__file__).resolve().parents[2]
+SCRIPTS = REPO / "workflow" / "scripts"
+STAGES = ["discovery", "dag", "fasta_stats", "dedup", "park", "mimag", "blast16s", "summary", "query", "report"]
+
+DISCOVERY = """
+import sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[3])
+from magport.manifest import scan_inputs
+SAMPLES = scan_inputs(Path(sys.argv[1]), ".fna", Path(sys.argv[2]))
+print(f"{len(SAMPLES)} MAGs discovered")
+"""
+
+
+def run_stage(cmd: list[str], cwd: Path) -> dict:
+    """Run one stage; wall seconds, peak RSS of the child and its exit status."""
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    except OSError as e:  # e.g. E2BIG when the argument list exceeds ARG_MAX
+        return {"seconds": 0.0, "peak_rss_mb": 0.0, "returncode": -1, "error": f"{type(e).__name__}: {e}"}
+    stderr = proc.stderr.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - t0
+    peak = usage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    error = stderr.strip().splitlines()[-1] if proc.returncode and stderr.strip() else ""
+    return {"seconds": round(seconds, 3), "peak_rss_mb": round(peak, 1), "returncode": proc.returncode, "error": error}
+
+
+def stage_commands(out: Path, args) -> dict[str, tuple[list[str], Path]]:
+    res, mags_txt = out / "results", out / "results" / "input_MAGs.txt"
+    checkm = res / "03_quality/checkm/checkm2_summary.tsv"
+    stats = res / "01_stats/seqkit/stats_summary.tsv"
+    mimag, park = res / "03_quality/mimag/MIMAG_summary.tsv", res / "03_quality/park/park_summary.tsv"
+    summary, store = res / "MAGport_summary.tsv", res / "magport.sqlite"
+    sketches = out / "dedup" / "sketches.sqlite"
+    for p in (stats, mimag, park, sketches):
+        p.parent.mkdir(parents=True, exist_ok=True)
+    for p in (sketches, sketches.with_name(sketches.name + "-wal"), sketches.with_name(sketches.name + "-shm")):
+        p.unlink(missing_ok=True)
+
+    py = sys.executable
+    return {
+        "discovery": ([py, "-c", DISCOVERY, str(out / "mags"), str(out / "discovery_manifest.json"), str(REPO)], REPO),
+        "dag": ([py, "-m", "snakemake", "--snakefile", str(REPO / "workflow" / "Snakefile"), "-n", "--quiet",
+                 "--cores", str(args.threads), "--directory", str(out / "dag"),
+                 "--configfile", str(REPO / "config" / "config.yaml"),
+                 "--config", f"input_dir={out / 'mags'}", f"output_dir={out / 'dag'}", "file_extension=.fna"],
+                REPO),
+        "fasta_stats": ([py, str(SCRIPTS / "fasta_stats.py"), "--mags", str(mags_txt), "--output", str(stats),
+                         "--threads", str(args.threads)], REPO),
+        "dedup": ([py, str(SCRIPTS / "dedup.py"), "cluster", "--mags", str(mags_txt), "--db", str(sketches),
+                   "--output", str(out / "dedup" / "clusters.tsv"), "--threads", str(args.threads)], REPO),
+        "park": ([py, str(SCRIPTS / "park_score.py"), "--mags", str(mags_txt), "--stats", str(stats),
+                  "--quality", str(checkm), "--output", str(park), "--method", "checkm2"], REPO),
+        "mimag": ([py, str(SCRIPTS / "mimag.py"), "--mags", str(mags_txt), "--quality", str(checkm),
+                   "--store", str(store), "--trna-dir", str(res / "02_genes/trna"),
+                   "--rrna-dir", str(res / "02_genes/rrna"),
+                   "--output", str(mimag), "--method", "checkm2"], REPO),
+        "blast16s": ([py, str(SCRIPTS / "blast16s_batch.py"), "split", "--mags", str(mags_txt),
+                      "--hits", str(res / "04_taxonomy/16S/batch_16S.blast.tsv"),
+                      "--out-dir", str(res / "04_taxonomy/16S")], REPO),
+        "summary": ([py, str(SCRIPTS / "summary.py"), "--mags", str(mags_txt), "--stats", str(stats),
+                     "--checkm", str(checkm), "--checkm-method", "checkm2",
+                     "--gunc", str(res / "03_quality/gunc/GUNC_summary.tsv"), "--mimag", str(mimag),
+                     "--park", str(park), "--store", str(store),
+                     "--gtdb", str(res / "04_taxonomy/gtdbtk/gtdb.merged_summary.tsv"),
+                     "--16s-hits", str(res / "04_taxonomy/16S/batch_16S.blast.tsv"),
+                     "--orfs-dir", str(res / "02_genes/orfs"), "--trna-dir", str(res / "02_genes/trna"),
+                     "--rrna-dir", str(res / "02_genes/rrna"), "--domain-dir", str(res / "02_genes/domain"),
+                     "--output", str(summary), "--results", str(res)], REPO),
+        "query": ([py, str(SCRIPTS / "result_store.py"), "query", "--db", str(store),
+                   "Completeness > 90 and Contamination < 5 and MIMAG_level == 'HQ'"], REPO),
+        "report": ([py, str(SCRIPTS / "report.py"), str(summary), str(res / "MAGport_report.html"),
+                    "MAGport perf", str(out / "mags")], REPO),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(new: dict, old_json: Path) -> None:
+    with open(old_json) as f:
+        old = {s["stage"]: s for s in json.load(f)["stages"]}
+    print(f"\n{'stage':<12}{'old s':>10}{'new s':>10}{'ratio':>8}{'old MB':>10}{'new MB':>10}")
+    for s in new["stages"]:
+        o = old.get(s["stage"])
+        if not o:
+            continue
+        ratio = s["seconds"] / o["seconds"] if o["seconds"] else float("nan")
+        print(f"{s['stage']:<12}{o['seconds']:>10.2f}{s['seconds']:>10.2f}{ratio:>8.2f}"
+              f"{o['peak_rss_mb']:>10.1f}{s['peak_rss_mb']:>10.1f}")
+
+
+def main(args) -> None:
+    out = Path(args.out)
+    if not args.reuse or not (out / "results" / "input_MAGs.txt").exists():
+        t0 = time.perf_counter()
+        generate(args)
+        print(f"Synthetic data generated in {time.perf_counter() - t0:.1f} s")
+
+    commands = stage_commands(out, args)
+    stages = [s for s in STAGES if s in (args.stages or STAGES)]
+    results = []
+    for stage in stages:
+        cmd, cwd = commands[stage]
+        rec = {"stage": stage, **run_stage(cmd, cwd), "mags": args.mags}
+        rec["mags_per_s"] = round(args.mags / rec["seconds"], 1) if rec["seconds"] > 0 and not rec["returncode"] else 0.0
+        results.append(rec)
+        status = "ok" if not rec["returncode"] else f"FAILED ({rec['error']})"
+        print(f"{stage:<12}{rec['seconds']:>9.2f} s {rec['peak_rss_mb']:>9.1f} MB {rec['mags_per_s']:>10.1f} MAG/s  {status}")
+
+    report = {
+        "magport_commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "host": {"machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count()},
+        "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                   if k not in ("json", "compare", "reuse", "stages")},
+        "stages": results,
+    }
+    with open(args.json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.json}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the Python stages of MAGport on synthetic MAGs (offline)")
+    add_arguments(parser)
+    parser.add_argument("--json", type=Path, default=Path("magport_perf.json"), help="Output JSON file")
+    parser.add_argument("--threads", type=int, default=4, help="Threads for snakemake -n and fasta_stats.py")
+    parser.add_argument("--stages", nargs='+', choices=STAGES, help="Only run these stages")
+    parser.add_argument("--reuse", action="store_true", help="Reuse the synthetic data already in --out")
+    parser.add_argument("--compare", type=Path, help="Earlier result JSON to compare against")
+    main(parser.parse_args())
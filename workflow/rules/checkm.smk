@@ -7,28 +7,68 @@ ORF_DIR = get_dir("orfs", "02_genes/orfs")
 rule run_checkm2:
     conda: ENV["checkm2"]
     input:
-        orfs=expand(str(ORF_DIR / "{sample}.faa"), sample=SAMPLE_LIST)
+        orfs=lambda w: expand(str(ORF_DIR / "{sample}.faa"), sample=BATCHES[w.batch]),
+        clusters=dedup_input()
     output:
-        summary=QUALITY_DIR / "checkm2_summary.tsv"
+        summary=QUALITY_DIR / "batches" / "{batch}" / "checkm2_summary.tsv"
     benchmark:
-        str(BENCHMARKS / "checkm2.benchmark.txt")
+        str(BENCHMARKS / "checkm2.{batch}.benchmark.txt")
     params:
         indir=ORF_DIR,
+        outdir=lambda w: QUALITY_DIR / "batches" / w.batch,
         db=str(CHECKM2_DB / "uniref100.KO.1.dmnd"),
+        stage_db=staged_db("checkm2", CHECKM2_DB / "uniref100.KO.1.dmnd"),
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        cache=RESULT_CACHE,
+        batch_size=BATCH_SIZE,
+        batch_index=lambda w: batch_index(w.batch),
+        dedup=dedup_option
     log:
-        str(LOGS / "checkm2.log")
-    threads: min(8, THREADS)
+        str(LOGS / "checkm2.{batch}.log")
+    resources:
+        mem_mb=mem_mb("checkm2"),
+        runtime=runtime_min("checkm2")
+    threads: batch_threads(min(8, THREADS))
     shell:
         r"""
-        mkdir -p {QUALITY_DIR}
-        (checkm2 predict --genes --threads {threads} \
-            --input {params.indir} \
-            -x .faa \
-            --output-directory {QUALITY_DIR} \
-            --database_path {params.db} --force) &> {log}
-        mv {QUALITY_DIR}/quality_report.tsv {output.summary}
+        mkdir -p {params.outdir}
+        rm -f {params.outdir}/quality_report.tsv
+        # Only MAGs of this batch missing from the result cache are staged for CheckM2
+        python workflow/scripts/result_cache.py lookup --tool checkm2 \
+            --tool-version "$(checkm2 --version 2>&1 || true)" \
+            --db {params.db} --cache-dir "{params.cache}" \
+            --mags {params.mags} --inputs-dir {params.indir} --suffix .faa \
+            --batch-size {params.batch_size} --batch-index {params.batch_index} {params.dedup} \
+            --staging {params.outdir}/input --state {params.outdir}/cache_state.tsv > {log}
+        if [ -n "$(ls -A {params.outdir}/input)" ]; then
+            {params.stage_db}
+            (checkm2 predict --genes --threads {threads} \
+                --input {params.outdir}/input \
+                -x .faa \
+                --output-directory {params.outdir} \
+                --database_path "$db" --force) &>> {log}
+        fi
+        python workflow/scripts/result_cache.py store --tool checkm2 \
+            --cache-dir "{params.cache}" --state {params.outdir}/cache_state.tsv \
+            --key-column Name --results {params.outdir}/quality_report.tsv \
+            --output {output.summary} >> {log}
+        rm -rf {params.outdir}/input {params.outdir}/quality_report.tsv
         """
 
+rule gather_checkm2:
+    input:
+        tables=expand(str(QUALITY_DIR / "batches" / "{batch}" / "checkm2_summary.tsv"), batch=BATCHES),
+        clusters=CLUSTERS_TSV if DEDUP else []
+    output:
+        summary=QUALITY_DIR / "checkm2_summary.tsv"
+    benchmark:
+        str(BENCHMARKS / "gather_checkm2.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("gather_checkm2"),
+        runtime=runtime_min("gather_checkm2")
+    shell:
+        gather_cmd("Name")
+
 rule run_checkm1:
     conda: ENV["checkm1"]
     input:
@@ -40,6 +80,9 @@ rule run_checkm1:
     params:
         indir=ORF_DIR,
         db=CHECKM1_DB
+    resources:
+        mem_mb=mem_mb("checkm1"),
+        runtime=runtime_min("checkm1")
     threads: THREADS
     shell:
         r"""
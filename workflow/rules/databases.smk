@@ -21,11 +21,22 @@ def check_db_path(db_path, db_name):
             f"2. Run 'magport download --{db_name.lower()}-path /path/to/download/location' to download it"
         )
 
+def check_staged_db(source, db_name):
+    """Validate this node's staged copy of a database (db_scratch); an invalid copy is removed and staged again"""
+    scripts_dir = os.path.join(workflow.workflow_dir, "scripts")
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    from stage_db import verify
+
+    scratch = Path(os.path.expandvars(DB_SCRATCH))
+    for problem in verify(Path(source), db_name.lower(), scratch, DB_CHECKSUM):
+        print(f"[MAGport] Warning: staged {db_name} database in {scratch}: {problem}; it will be staged again")
+
 def verify_all_databases():
     """Verify all required databases before workflow starts"""
     # 获取全局变量
     global MODULES, USE_CHECKM
-    global GTDBTK_DB, CHECKM2_DB, CHECKM1_DB, GUNC_DB, NCBI16S_DIR
+    global GTDBTK_DB, CHECKM2_DB, CHECKM1_DB, GUNC_DB, NCBI16S_DIR, DB_SCRATCH
     
     try:
         # 检查哪些模块被启用
@@ -46,6 +57,17 @@ def verify_all_databases():
         
         if "rrna16S" in enabled_modules:
             check_db_path(NCBI16S_DIR, "NCBI16S")
+
+        # node-local copies (same sources and names as staged_db in the rules)
+        if DB_SCRATCH:
+            if "gtdb" in enabled_modules:
+                check_staged_db(GTDBTK_DB, "GTDBTK")
+            if "quality" in enabled_modules and USE_CHECKM == "checkm2":
+                check_staged_db(CHECKM2_DB / "uniref100.KO.1.dmnd", "CHECKM2")
+            if "gunc" in enabled_modules:
+                check_staged_db(GUNC_DB / "gunc_db_gtdb95.dmnd", "GUNC")
+            if "rrna16S" in enabled_modules:
+                check_staged_db(NCBI16S_DIR, "NCBI16S")
     except NameError as e:
         print(f"[MAGport] Warning: Could not verify databases - {e}")
         print("[MAGport] This is normal if you're just viewing the DAG or doing a dry run.")
@@ -0,0 +1,37 @@
+# Module 0: MinHash duplicate detection (dedup: true)
+# Sketches every MAG (kept in sketches.sqlite, so later runs only sketch new MAGs) and clusters
+# genomes above dedup_ani and of near-equal length (dedup_min_length_ratio); CheckM2, GUNC and GTDB-Tk then run on the representatives only.
+
+rule dedup_cluster:
+    conda: ENV["python"]
+    input:
+        mags=MAGS
+    output:
+        clusters=CLUSTERS_TSV
+    params:
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        db=DEDUP_DIR / "sketches.sqlite",
+        ani=config.get("dedup_ani", 99.0),
+        min_length_ratio=config.get("dedup_min_length_ratio", 0.95),
+        kmer=config.get("dedup_kmer", 21),
+        sketch_size=config.get("dedup_sketch_size", 1000)
+    benchmark:
+        str(BENCHMARKS / "dedup.benchmark.txt")
+    log:
+        str(LOGS / "dedup.log")
+    resources:
+        mem_mb=mem_mb("dedup"),
+        runtime=runtime_min("dedup")
+    threads: THREADS
+    shell:
+        r"""
+        python workflow/scripts/dedup.py cluster \
+            --mags {params.mags} \
+            --db {params.db} \
+            --output {output.clusters} \
+            --ani {params.ani} \
+            --min-length-ratio {params.min_length_ratio} \
+            --kmer {params.kmer} \
+            --sketch-size {params.sketch_size} \
+            --threads {threads} > {log}
+        """
@@ -0,0 +1,41 @@
+# Module 5a: Fast domain pre-classification via barrnap (bac vs arc HMMs)
+# rrna_barrnap and trna_scan only need the domain to pick --kingdom / -A,-B, so they
+# depend on this per-MAG stage instead of waiting for the all-MAG GTDB-Tk run.
+
+DOMAIN_DIR = get_dir("domain", "02_genes/domain")
+
+rule domain_barrnap:
+    conda: ENV["barrnap"]
+    input:
+        mag=lambda wc: SAMPLES[wc.sample]
+    output:
+        tsv=str(DOMAIN_DIR / "{sample}.domain.tsv")
+    params:
+        fasta=plain_fasta
+    log:
+        str(LOGS / "domain.{sample}.log")
+    benchmark:
+        str(BENCHMARKS / "domain.{sample}.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("domain"),
+        runtime=runtime_min("domain")
+    threads: 1
+    shell:
+        r"""
+        mkdir -p {DOMAIN_DIR}
+        {params.fasta}
+        barrnap --quiet --threads {threads} --kingdom bac "$fasta" > {DOMAIN_DIR}/{wildcards.sample}.bac.gff 2> {log}
+        barrnap --quiet --threads {threads} --kingdom arc "$fasta" > {DOMAIN_DIR}/{wildcards.sample}.arc.gff 2>> {log}
+        python workflow/scripts/domain.py \
+            {DOMAIN_DIR}/{wildcards.sample}.bac.gff \
+            {DOMAIN_DIR}/{wildcards.sample}.arc.gff \
+            {output.tsv} \
+            --mag {wildcards.sample} >> {log}
+        {STORE_PUT} --id {wildcards.sample} Domain_barrnap=$(awk 'BEGIN{{FS="\t"}} NR==2 {{print $1}}' {output.tsv})
+        rm -f {DOMAIN_DIR}/{wildcards.sample}.bac.gff {DOMAIN_DIR}/{wildcards.sample}.arc.gff
+        """
+
+"""sample output
+domain	bac_score	arc_score
+Archaea	412.3	655.0
+"""
@@ -11,6 +11,9 @@ rule download_checkm2_db:
         directory(config.get("checkm2_download_path"))
     benchmark:
         str(BENCHMARKS / "download_checkm2_db.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("download"),
+        runtime=runtime_min("download")
     conda:
         ENV["checkm2"]
     message:
@@ -27,6 +30,9 @@ rule download_gunc_db:
         directory(config.get("gunc_download_path"))
     benchmark:
         str(BENCHMARKS / "download_gunc_db.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("download"),
+        runtime=runtime_min("download")
     conda:
         ENV["gunc"]
     message:
@@ -43,6 +49,9 @@ rule download_gtdbtk_db:
         directory(config.get("gtdb_download_path"))
     benchmark:
         str(BENCHMARKS / "download_gtdbtk_db.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("download"),
+        runtime=runtime_min("download")
     conda:
         ENV["gtdbtk"]  # For wget/curl and other tools
     message:
@@ -67,6 +76,9 @@ rule download_ncbi16s_db:
         "Downloading NCBI 16S BLAST database..."
     benchmark:
         str(BENCHMARKS / "download_ncbi16s_db.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("download"),
+        runtime=runtime_min("download")
     shell:
         """
         set -euo pipefail
@@ -0,0 +1,33 @@
+# Quality gate for tiered runs (quality_gate: true)
+# Marks every MAG passed / skipped_by_gate from the CheckM table; the modules in gate_modules
+# (GUNC, GTDB-Tk, tRNAscan-SE, 16S BLAST) then only process the passed MAGs.
+
+rule quality_gate:
+    conda: ENV["python"]
+    input:
+        checkm2=get_dir("checkm", "03_quality/checkm") / "checkm2_summary.tsv" if USE_CHECKM == "checkm2" else [],
+        checkm1=get_dir("checkm", "03_quality/checkm") / "checkm1_summary.tsv" if USE_CHECKM == "checkm1" else []
+    output:
+        tsv=GATE_TSV
+    params:
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        min_completeness=GATE_MIN_COMPLETENESS,
+        max_contamination=GATE_MAX_CONTAMINATION,
+        quality_input=lambda wildcards, input: input.checkm2 if USE_CHECKM == "checkm2" else input.checkm1
+    benchmark:
+        str(BENCHMARKS / "quality_gate.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("quality_gate"),
+        runtime=runtime_min("quality_gate")
+    shell:
+        r"""
+        python workflow/scripts/quality_gate.py \
+            --mags {params.mags} \
+            --quality {params.quality_input} \
+            --method {USE_CHECKM} \
+            --min-completeness {params.min_completeness} \
+            --max-contamination {params.max_contamination} \
+            --output {output.tsv}
+        """
+
+# No aggregate rule
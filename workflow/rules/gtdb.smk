@@ -6,47 +6,91 @@ GTDB_DIR = get_dir("gtdbtk", "04_taxonomy/gtdbtk")
 rule run_gtdbtk:
     conda: ENV["gtdbtk"]
     input:
-        mag=MAGS
+        mag=lambda w: [SAMPLES[s] for s in BATCHES[w.batch]],
+        clusters=dedup_input(),
+        gate=gate_input("gtdb")
     output:
-        summary=GTDB_DIR / "gtdb.merged_summary.tsv"
+        summary=GTDB_DIR / "batches" / "{batch}" / "gtdb.merged_summary.tsv"
     benchmark:
-        str(BENCHMARKS / "gtdbtk.benchmark.txt")
+        str(BENCHMARKS / "gtdbtk.{batch}.benchmark.txt")
     params:
-        indir=INPUT_DIR,
-        pplacer=lambda w: min(THREADS, 3),
+        pplacer=lambda w, threads: min(threads, 3),
+        outdir=lambda w: GTDB_DIR / "batches" / w.batch,
         db=GTDBTK_DB,
-        suffix=EXT
+        stage_db=staged_db("gtdbtk", GTDBTK_DB),
+        suffix=EXT,
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        cache=RESULT_CACHE,
+        batch_size=BATCH_SIZE,
+        batch_index=lambda w: batch_index(w.batch),
+        dedup=dedup_option,
+        gate=gate_option("gtdb"),
+        gate_spec=gate_spec("gtdb")  # reruns the job when the thresholds change
     log:
-        str(LOGS / "gtdbtk.log")
-    threads: THREADS
+        str(LOGS / "gtdbtk.{batch}.log")
+    resources:
+        mem_mb=mem_mb("gtdbtk"),
+        runtime=runtime_min("gtdbtk")
+    threads: batch_threads(THREADS)
     shell:
         r"""
-        mkdir -p {GTDB_DIR}
+        mkdir -p {params.outdir}
         # Set GTDBTK_DATA_PATH environment variable
         export GTDBTK_DATA_PATH={params.db}
-        
-        # Run GTDB-Tk classify_wf on all genomes
-        gtdbtk classify_wf \
-            --genome_dir {params.indir} \
-            --skip_ani_screen \
-            --out_dir {GTDB_DIR} \
-            --cpus {threads} \
-            --pplacer_cpus {params.pplacer} \
-            -x {params.suffix} &> {log}
+        rm -f {params.outdir}/gtdbtk.ar53.summary.tsv {params.outdir}/gtdbtk.bac120.summary.tsv {params.outdir}/gtdbtk.fresh_summary.tsv
+
+        # Only genomes of this batch missing from the result cache are staged for GTDB-Tk
+        python workflow/scripts/result_cache.py lookup --tool gtdbtk \
+            --tool-version "$(gtdbtk --version 2>&1 || true)" \
+            --db {params.db} --cache-dir "{params.cache}" \
+            --mags {params.mags} --suffix {params.suffix} \
+            --batch-size {params.batch_size} --batch-index {params.batch_index} {params.dedup} {params.gate} \
+            --staging {params.outdir}/input --state {params.outdir}/cache_state.tsv > {log}
+
+        if [ -n "$(ls -A {params.outdir}/input)" ]; then
+            # read the node-local copy of the database with db_scratch
+            {params.stage_db}
+            export GTDBTK_DATA_PATH="$db"
+            # Run GTDB-Tk classify_wf on the staged genomes
+            gtdbtk classify_wf \
+                --genome_dir {params.outdir}/input \
+                --skip_ani_screen \
+                --out_dir {params.outdir} \
+                --cpus {threads} \
+                --pplacer_cpus {params.pplacer} \
+                -x {params.suffix} &>> {log}
+        fi
 
         # if both summary files exist, merge them
-        echo "Merging GTDB-Tk summary files..."
-        if [ -s {GTDB_DIR}/gtdbtk.ar53.summary.tsv ] && [ -s {GTDB_DIR}/gtdbtk.bac120.summary.tsv ]; then
-            awk 'FNR==1 && NR>1 {{next}} NF>0' {GTDB_DIR}/gtdbtk.ar53.summary.tsv {GTDB_DIR}/gtdbtk.bac120.summary.tsv > {output.summary}
-        elif [ -s {GTDB_DIR}/gtdbtk.ar53.summary.tsv ]; then
-            mv {GTDB_DIR}/gtdbtk.ar53.summary.tsv {output.summary}
-        elif [ -s {GTDB_DIR}/gtdbtk.bac120.summary.tsv ]; then
-            mv {GTDB_DIR}/gtdbtk.bac120.summary.tsv {output.summary}
-        else
-            touch {output.summary}
+        echo "Merging GTDB-Tk summary files..." >> {log}
+        if [ -s {params.outdir}/gtdbtk.ar53.summary.tsv ] && [ -s {params.outdir}/gtdbtk.bac120.summary.tsv ]; then
+            awk 'FNR==1 && NR>1 {{next}} NF>0' {params.outdir}/gtdbtk.ar53.summary.tsv {params.outdir}/gtdbtk.bac120.summary.tsv > {params.outdir}/gtdbtk.fresh_summary.tsv
+        elif [ -s {params.outdir}/gtdbtk.ar53.summary.tsv ]; then
+            cp {params.outdir}/gtdbtk.ar53.summary.tsv {params.outdir}/gtdbtk.fresh_summary.tsv
+        elif [ -s {params.outdir}/gtdbtk.bac120.summary.tsv ]; then
+            cp {params.outdir}/gtdbtk.bac120.summary.tsv {params.outdir}/gtdbtk.fresh_summary.tsv
         fi
+        python workflow/scripts/result_cache.py store --tool gtdbtk \
+            --cache-dir "{params.cache}" --state {params.outdir}/cache_state.tsv \
+            --key-column user_genome --results {params.outdir}/gtdbtk.fresh_summary.tsv \
+            --output {output.summary} >> {log}
+        rm -rf {params.outdir}/input {params.outdir}/gtdbtk.fresh_summary.tsv
         """
 
+rule gather_gtdbtk:
+    input:
+        tables=expand(str(GTDB_DIR / "batches" / "{batch}" / "gtdb.merged_summary.tsv"), batch=BATCHES),
+        clusters=CLUSTERS_TSV if DEDUP else []
+    output:
+        summary=GTDB_DIR / "gtdb.merged_summary.tsv"
+    benchmark:
+        str(BENCHMARKS / "gather_gtdbtk.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("gather_gtdbtk"),
+        runtime=runtime_min("gather_gtdbtk")
+    shell:
+        gather_cmd("user_genome")
+
 """GTDB-Tk merged summary sample
 user_genome	classification	closest_genome_reference	closest_genome_reference_radius	closest_genome_taxonomy	closest_genome_ani	closest_genome_af	closest_placement_reference	closest_placement_radius	closest_placement_taxonomy	closest_placement_ani	closest_placement_af	pplacer_taxonomy	classification_method	note	other_related_references(genome_id,species_name,radius,ANI,AF)	msa_percent	translation_table	red_value	warnings
 2013_MS1-MC_25cm_metaG.metabat_bins_sens.tsv.073	d__Archaea;p__Thermoproteota;c__Bathyarchaeia;o__RBG-16-48-13;f__GCA-020355125;g__JBGOZA01;s__	N/A	N/A	N/A	N/A	N/A	N/A	N/A	N/A	N/A	N/A	d__Archaea;p__Thermoproteota;c__Bathyarchaeia;o__RBG-16-48-13;f__GCA-020355125;g__;s__	taxonomic novelty determined using RED	N/A	N/A	80.87	11	0.87824	N/A
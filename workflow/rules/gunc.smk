@@ -6,31 +6,73 @@ ORF_DIR = get_dir("orfs", "02_genes/orfs")
 rule gunc_run_all:
     conda: ENV["gunc"]
     input:
-        orfs=expand(str(ORF_DIR / "{sample}.faa"), sample=SAMPLE_LIST)
+        orfs=lambda w: expand(str(ORF_DIR / "{sample}.faa"), sample=BATCHES[w.batch]),
+        clusters=dedup_input(),
+        gate=gate_input("gunc")
     output:
-        summary=GUNC_DIR / "GUNC_summary.tsv"
+        summary=GUNC_DIR / "batches" / "{batch}" / "GUNC_summary.tsv"
     benchmark:
-        str(BENCHMARKS / "gunc.benchmark.txt")
+        str(BENCHMARKS / "gunc.{batch}.benchmark.txt")
     params:
         indir=ORF_DIR,
-        db=str(GUNC_DB / "gunc_db_gtdb95.dmnd")
+        outdir=lambda w: GUNC_DIR / "batches" / w.batch,
+        db=str(GUNC_DB / "gunc_db_gtdb95.dmnd"),
+        stage_db=staged_db("gunc", GUNC_DB / "gunc_db_gtdb95.dmnd"),
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        cache=RESULT_CACHE,
+        batch_size=BATCH_SIZE,
+        batch_index=lambda w: batch_index(w.batch),
+        dedup=dedup_option,
+        gate=gate_option("gunc"),
+        gate_spec=gate_spec("gunc")  # reruns the job when the thresholds change
     log:
-        str(LOGS / "gunc.log")
-    threads: min(8, THREADS)
+        str(LOGS / "gunc.{batch}.log")
+    resources:
+        mem_mb=mem_mb("gunc"),
+        runtime=runtime_min("gunc")
+    threads: batch_threads(min(8, THREADS))
     shell:
         r"""
-        mkdir -p {GUNC_DIR}
-        gunc run --gene_calls \
-            --input_dir {params.indir} \
-            --file_suffix .faa \
-            --db_file {params.db} \
-            --threads {threads} \
-            --out_dir {GUNC_DIR} &> {log}
-        echo "GUNC analysis completed. Renaming output file..."
-        # rename GUNC result
-        mv {GUNC_DIR}/GUNC.gtdb_95.maxCSS_level.tsv {output.summary}
+        mkdir -p {params.outdir}
+        rm -f {params.outdir}/GUNC.gtdb_95.maxCSS_level.tsv
+        # Only MAGs of this batch missing from the result cache are staged for GUNC
+        python workflow/scripts/result_cache.py lookup --tool gunc \
+            --tool-version "$(gunc --version 2>&1 || true)" \
+            --db {params.db} --cache-dir "{params.cache}" \
+            --mags {params.mags} --inputs-dir {params.indir} --suffix .faa \
+            --batch-size {params.batch_size} --batch-index {params.batch_index} {params.dedup} {params.gate} \
+            --staging {params.outdir}/input --state {params.outdir}/cache_state.tsv > {log}
+        if [ -n "$(ls -A {params.outdir}/input)" ]; then
+            {params.stage_db}
+            gunc run --gene_calls \
+                --input_dir {params.outdir}/input \
+                --file_suffix .faa \
+                --db_file "$db" \
+                --threads {threads} \
+                --out_dir {params.outdir} &>> {log}
+        fi
+        echo "GUNC analysis completed. Merging with cached results..." >> {log}
+        python workflow/scripts/result_cache.py store --tool gunc \
+            --cache-dir "{params.cache}" --state {params.outdir}/cache_state.tsv \
+            --key-column genome --results {params.outdir}/GUNC.gtdb_95.maxCSS_level.tsv \
+            --output {output.summary} >> {log}
+        rm -rf {params.outdir}/input {params.outdir}/GUNC.gtdb_95.maxCSS_level.tsv
         """
 
+rule gather_gunc:
+    input:
+        tables=expand(str(GUNC_DIR / "batches" / "{batch}" / "GUNC_summary.tsv"), batch=BATCHES),
+        clusters=CLUSTERS_TSV if DEDUP else []
+    output:
+        summary=GUNC_DIR / "GUNC_summary.tsv"
+    benchmark:
+        str(BENCHMARKS / "gather_gunc.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("gather_gunc"),
+        runtime=runtime_min("gather_gunc")
+    shell:
+        gather_cmd("genome")
+
 # No aggregate rule; top-level handles targets
 
 """Gunc result sample
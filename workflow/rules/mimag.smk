@@ -1,4 +1,4 @@
-# Module 10: MIMAG classification
+# Module 10: MIMAG classification (all MAGs in one job)
 
 MIMAG_DIR = get_dir("mimag", "03_quality/mimag")
 
@@ -7,21 +7,33 @@ rule mimag_classify:
     input:
         checkm2=get_dir("checkm", "03_quality/checkm") / "checkm2_summary.tsv" if USE_CHECKM == "checkm2" else [],
         checkm1=get_dir("checkm", "03_quality/checkm") / "checkm1_summary.tsv" if USE_CHECKM == "checkm1" else [],
-        trna=lambda wc: get_dir("trna", "02_genes/trna") / (wc.sample + ".tRNA.tsv"),
-        rrna=lambda wc: get_dir("rrna", "02_genes/rrna") / (wc.sample + ".rRNA.tsv")
+        # tRNA/rRNA counts are read from the result store; mimag.py counts them again from these
+        # outputs when the store lacks them
+        trna=expand(str(get_dir("trna", "02_genes/trna") / "{sample}.trnascan.txt"), sample=SAMPLE_LIST),
+        rrna=expand(str(get_dir("rrna", "02_genes/rrna") / "{sample}.rRNA.gff"), sample=SAMPLE_LIST)
     output:
-        tsv=str(MIMAG_DIR / "{sample}.MIMAG_level.tsv")
+        tsv=MIMAG_DIR / "MIMAG_summary.tsv"
     params:
+        mags=OUTPUT_DIR / "input_MAGs.txt",
+        store=STORE,
+        trna_dir=get_dir("trna", "02_genes/trna"),
+        rrna_dir=get_dir("rrna", "02_genes/rrna"),
         quality_input=lambda wildcards, input: input.checkm2 if USE_CHECKM == "checkm2" else input.checkm1
+    benchmark:
+        str(BENCHMARKS / "mimag.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("mimag"),
+        runtime=runtime_min("mimag")
     shell:
         r"""
         mkdir -p {MIMAG_DIR}
         python workflow/scripts/mimag.py \
-            {params.quality_input} \
-            {input.trna} \
-            {input.rrna} \
-            {output.tsv} \
-            --mag {wildcards.sample} \
+            --mags {params.mags} \
+            --quality {params.quality_input} \
+            --store {params.store} \
+            --trna-dir {params.trna_dir} \
+            --rrna-dir {params.rrna_dir} \
+            --output {output.tsv} \
             --method {USE_CHECKM}
         """
 
@@ -9,16 +9,25 @@ rule orfs_prodigal:
     output:
         faa=str(ORF_DIR / "{sample}.faa"),
         gff=str(ORF_DIR / "{sample}.gff"),
-        fna=str(ORF_DIR / "{sample}.fna"),
-        tsv=str(ORF_DIR / "{sample}.orfs.tsv")
-    threads: 1
+        fna=str(ORF_DIR / "{sample}.fna")
+    benchmark:
+        str(BENCHMARKS / "prodigal.{sample}.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("prodigal"),
+        runtime=runtime_min("prodigal")
+    threads: shard_threads
     shell:
         r"""
         mkdir -p {ORF_DIR}
-        prodigal -q -p meta -i {input.mag} -f gff -o {output.gff} -a {output.faa} -d {output.fna}
-        count=$(grep -c '^>' {output.faa})
-        echo -e "orf_count" > {output.tsv}
-        echo -e "$count" >> {output.tsv}
+        if [ {threads} -gt 1 ]; then
+            # large MAG: one Prodigal per contig group, gene IDs renumbered to the whole MAG
+            {SHARD} prodigal --mag {input.mag} --parts {threads} --gff {output.gff} --faa {output.faa} --fna {output.fna}
+        else
+            # Prodigal reads the MAG from stdin, so compressed inputs are streamed without a copy
+            {MAG_READER} {input.mag} | prodigal -q -p meta -f gff -o {output.gff} -a {output.faa} -d {output.fna}
+        fi
+        count=$(grep -c '^>' {output.faa} || true)
+        {STORE_PUT} --id {wildcards.sample} num_ORFs=$count
         """
 
 # No aggregate rule
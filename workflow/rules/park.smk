@@ -1,25 +1,31 @@
-# Module 3: Park Score (Python)
+# Module 3: Park Score (Python, all MAGs in one job)
 
 PARK_DIR = get_dir("park", "03_quality/park")
 
 rule park_score:
     conda: ENV["python"]
     input:
-        stats=lambda wc: get_dir("seqkit", "01_stats/seqkit") / (wc.sample + ".seqkit.tsv"),
+        stats=get_dir("seqkit", "01_stats/seqkit") / "stats_summary.tsv",
         checkm2=get_dir("checkm", "03_quality/checkm") / "checkm2_summary.tsv" if USE_CHECKM == "checkm2" else [],
         checkm1=get_dir("checkm", "03_quality/checkm") / "checkm1_summary.tsv" if USE_CHECKM == "checkm1" else []
     output:
-        tsv=str(PARK_DIR / "{sample}.park.tsv")
+        tsv=PARK_DIR / "park_summary.tsv"
     params:
+        mags=OUTPUT_DIR / "input_MAGs.txt",
         quality_input=lambda wildcards, input: input.checkm2 if USE_CHECKM == "checkm2" else input.checkm1
+    benchmark:
+        str(BENCHMARKS / "park.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("park"),
+        runtime=runtime_min("park")
     shell:
         r"""
         mkdir -p {PARK_DIR}
         python workflow/scripts/park_score.py \
-            {input.stats} \
-            {params.quality_input} \
-            {output.tsv} \
-            --mag {wildcards.sample} \
+            --mags {params.mags} \
+            --stats {input.stats} \
+            --quality {params.quality_input} \
+            --output {output.tsv} \
             --method {USE_CHECKM}
         """
 
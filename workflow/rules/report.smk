@@ -11,6 +11,9 @@ rule report_html:
     params:
         title=config.get("report_title", "MAGport Report"),
         input_dir=str(INPUT_DIR)
+    resources:
+        mem_mb=mem_mb("report_html"),
+        runtime=runtime_min("report_html")
     shell:
         r"""
         python workflow/scripts/report.py {input} {output} "{params.title}" "{params.input_dir}"
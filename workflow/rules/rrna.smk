@@ -6,45 +6,45 @@ rule rrna_barrnap:
     conda: ENV["barrnap"]
     input:
         mag=lambda wc: SAMPLES[wc.sample],
-        gtdb=GTDB_DIR / "gtdb.merged_summary.tsv"
+        domain=DOMAIN_DIR / "{sample}.domain.tsv"
     output:
         gff=str(RRNA_DIR / "{sample}.rRNA.gff"),
         rna_fasta=str(RRNA_DIR / "{sample}.rRNA.fna"),
-        tsv=str(RRNA_DIR / "{sample}.rRNA.tsv")
+        fasta_16s=str(RRNA_DIR / "{sample}.16S.fasta")
+    params:
+        fasta=plain_fasta
     log:
         str(LOGS / "barrnap.{sample}.log")
-    threads: 1
+    benchmark:
+        str(BENCHMARKS / "barrnap.{sample}.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("barrnap"),
+        runtime=runtime_min("barrnap")
+    threads: shard_threads
     shell:
         r"""
         mkdir -p {RRNA_DIR}
-        # Determine kingdom from GTDB lineage (default to bacteria if not found)
-        domain=$(awk -v mag="{wildcards.sample}" 'BEGIN{{FS="\t"}} $1==mag {{print $2}}' {input.gtdb})
+        # Determine kingdom from the fast domain pre-classification
+        domain=$(awk 'BEGIN{{FS="\t"}} NR==2 {{print $1}}' {input.domain})
         echo "Domain for {wildcards.sample}: $domain"
+        if echo "$domain" | grep -qi "Archaea"; then kingdom=arc; else kingdom=bac; fi
         # Run barrnap for rRNA prediction
-        if echo "$domain" | grep -qi "Archaea"; then
-            barrnap --quiet --threads {threads} --kingdom arc --outseq {output.rna_fasta} {input.mag} > {output.gff} 2> {log}
+        if [ {threads} -gt 1 ]; then
+            # large MAG: one barrnap per contig group, E-values rescaled to the whole MAG
+            {SHARD} barrnap --mag {input.mag} --parts {threads} --kingdom $kingdom \
+                --gff {output.gff} --outseq {output.rna_fasta} --log {log}
         else
-            barrnap --quiet --threads {threads} --kingdom bac --outseq {output.rna_fasta} {input.mag} > {output.gff} 2> {log}
+            {params.fasta}
+            barrnap --quiet --threads {threads} --kingdom $kingdom --outseq {output.rna_fasta} "$fasta" > {output.gff} 2> {log}
         fi
 
         # Count rRNAs by type
         five=$(grep -c "5S" {output.gff} || true)
         sixteen=$(grep -c "16S" {output.gff} || true)
         twentythree=$(grep -c "23S" {output.gff} || true)
-        total=$((five + sixteen + twentythree))
-        # Write counts to TSV
-        echo -e "5S\t16S\t23S\ttotal" > {output.tsv}
-        echo -e "$five\t$sixteen\t$twentythree\t$total" >> {output.tsv}
-        """
+        {STORE_PUT} --id {wildcards.sample} num_5S_rRNAs=$five num_16S_rRNAs=$sixteen num_23S_rRNAs=$twentythree
 
-# Extract the longest 16S rRNA sequence for downstream taxonomy analysis
-rule extract_longest_16s:
-    input:
-        rna_fasta=RRNA_DIR / "{sample}.rRNA.fna"
-    output:
-        fasta=RRNA_DIR / "{sample}.16S.fasta"
-    shell:
-        r"""
+        # Keep the longest 16S rRNA sequence for downstream taxonomy analysis
         awk '/^>16S_rRNA/ {{
             header=$0
             getline seq
@@ -59,7 +59,5 @@ rule extract_longest_16s:
                 print maxh
                 print maxs
             }}
-        }}' {input.rna_fasta} > {output.fasta}
+        }}' {output.rna_fasta} > {output.fasta_16s}
         """
-
-
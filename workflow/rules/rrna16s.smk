@@ -2,30 +2,99 @@
 
 R16_DIR = get_dir("r16s", "04_taxonomy/16S")
 
-rule rrna16s_blast:
-    conda: ENV["blast"]
-    input:
-        fasta=lambda wc: get_dir("rrna", "02_genes/rrna") / (wc.sample + ".16S.fasta")
-    output:
-        tsv=str(R16_DIR / "{sample}.16S.tsv")
-    params:
-        db=NCBI16S_DIR / "16S_ribosomal_RNA"  # Path to BLAST database without extension
-    threads: min(4, THREADS)
-    run:
-        shell(r"""
-        mkdir -p {R16_DIR}
-        if [ -s {input.fasta} ]; then
-            blastn -task megablast \
-                -query {input.fasta} \
-                -db {params.db} \
-                -out {output.tsv} \
-                -evalue 1e-5 \
-                -outfmt '6 std qlen slen qcovs staxids stitle' \
-                -max_target_seqs 1 \
-                -num_threads {threads}
-        else
-            touch {output.tsv}
-        fi
-        """)
+if config.get("rrna16s_batch", True):
+
+    # One multithreaded blastn for all MAGs: the 16S database is opened and paged in once.
+    # Only the combined hit table is declared: one output per MAG would make Snakemake match
+    # every requested file against all of them (quadratic DAG build). The per-MAG
+    # {MAG}.16S.tsv files are still written alongside for browsing.
+    rule rrna16s_blast_batch:
+        conda: ENV["blast"]
+        input:
+            fasta=expand(str(get_dir("rrna", "02_genes/rrna") / "{sample}.16S.fasta"), sample=SAMPLE_LIST),
+            gate=gate_input("rrna16S")
+        output:
+            hits=R16_HITS
+        params:
+            db=staged_db("ncbi16s", NCBI16S_DIR, "16S_ribosomal_RNA"),  # sets $db: BLAST database without extension
+            mags=OUTPUT_DIR / "input_MAGs.txt",
+            fasta_dir=get_dir("rrna", "02_genes/rrna"),
+            query=R16_DIR / "batch_16S.fasta",
+            gate=gate_option("rrna16S"),
+            gate_spec=gate_spec("rrna16S")  # reruns the job when the thresholds change
+        log:
+            str(LOGS / "blast16s.log")
+        benchmark:
+            str(BENCHMARKS / "blast16s.benchmark.txt")
+        resources:
+            mem_mb=mem_mb("blast16s"),
+            runtime=runtime_min("blast16s")
+        threads: THREADS
+        shell:
+            r"""
+            mkdir -p {R16_DIR}
+            python workflow/scripts/blast16s_batch.py concat \
+                --mags {params.mags} \
+                --fasta-dir {params.fasta_dir} {params.gate} \
+                --output {params.query} > {log}
+            if [ -s {params.query} ]; then
+                {params.db}
+                blastn -task megablast \
+                    -query {params.query} \
+                    -db "$db" \
+                    -out {output.hits} \
+                    -evalue 1e-5 \
+                    -outfmt '6 std qlen slen qcovs staxids stitle' \
+                    -max_target_seqs 1 \
+                    -num_threads {threads} 2>> {log}
+            else
+                : > {output.hits}
+            fi
+            python workflow/scripts/blast16s_batch.py split \
+                --mags {params.mags} \
+                --hits {output.hits} \
+                --out-dir {R16_DIR} >> {log}
+            rm -f {params.query}
+            """
+
+else:
+
+    rule rrna16s_blast:
+        conda: ENV["blast"]
+        input:
+            fasta=lambda wc: get_dir("rrna", "02_genes/rrna") / (wc.sample + ".16S.fasta"),
+            gate=gate_input("rrna16S")
+        output:
+            tsv=str(R16_DIR / "{sample}.16S.tsv")
+        params:
+            db=staged_db("ncbi16s", NCBI16S_DIR, "16S_ribosomal_RNA"),  # sets $db: BLAST database without extension
+            skipped=gate_skipped("rrna16S"),
+            gate_spec=gate_spec("rrna16S")  # reruns the job when the thresholds change
+        benchmark:
+            str(BENCHMARKS / "blast16s.{sample}.benchmark.txt")
+        resources:
+            mem_mb=mem_mb("blast16s"),
+            runtime=runtime_min("blast16s")
+        threads: min(4, THREADS)
+        run:
+            shell(r"""
+            mkdir -p {R16_DIR}
+            if {params.skipped}; then
+                # failed the quality gate: empty hit table, "skipped_by_gate" in the summary
+                touch {output.tsv}
+            elif [ -s {input.fasta} ]; then
+                {params.db}
+                blastn -task megablast \
+                    -query {input.fasta} \
+                    -db "$db" \
+                    -out {output.tsv} \
+                    -evalue 1e-5 \
+                    -outfmt '6 std qlen slen qcovs staxids stitle' \
+                    -max_target_seqs 1 \
+                    -num_threads {threads}
+            else
+                touch {output.tsv}
+            fi
+            """)
 
 # No aggregate rule
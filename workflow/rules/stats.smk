@@ -1,23 +1,98 @@
-# Module 1: Basic statistics via SeqKit
+# Module 1: Basic statistics via SeqKit (default) or the native Python engine
+# Both backends produce one consolidated table with named columns (stats_summary.tsv)
 
 STATS_DIR = get_dir("seqkit", "01_stats/seqkit")
 
-rule stats_seqkit:
-    conda: ENV["seqkit"]
-    input:
-        mag=lambda wc: SAMPLES[wc.sample]
-    output:
-        tsv=str(STATS_DIR / "{sample}.seqkit.tsv")
-    threads: 1
-    shell:
-        r"""
-        mkdir -p {STATS_DIR}
-        (
-            seqkit stats -a {input.mag} -T | awk -v OFS='\t' -v mag={wildcards.sample} 'NR==1 {{print "MAG",$0}}; NR>1 {{print mag,$0}}'
-        ) > {output.tsv}
+if STATS_BACKEND == "native":
+
+    rule stats_native:
+        conda: ENV["python"]
+        input:
+            mags=MAGS
+        output:
+            tsv=STATS_DIR / "stats_summary.tsv"
+        params:
+            mags=OUTPUT_DIR / "input_MAGs.txt"
+        benchmark:
+            str(BENCHMARKS / "stats.benchmark.txt")
+        resources:
+            mem_mb=mem_mb("stats"),
+            runtime=runtime_min("stats")
+        threads: THREADS
+        shell:
+            r"""
+            mkdir -p {STATS_DIR}
+            python workflow/scripts/fasta_stats.py \
+                --mags {params.mags} \
+                --output {output.tsv} \
+                --threads {threads}
+            """
+
+else:
+
+    def chunk_line(chunk: str, last: bool = False) -> int:
+        """
+        First (or last) line of a chunk in input_MAGs.txt (one MAG per line, SAMPLE_LIST order).
+        Example: with chunk_size 500, chunk_line("chunk0001") -> 501, chunk_line("chunk0001", True) -> 1000
         """
+        size = CHUNK_SIZE if CHUNK_SIZE > 0 else len(SAMPLE_LIST)
+        first = int(chunk[len("chunk"):]) * size + 1
+        return first + len(CHUNKS[chunk]) - 1 if last else first
 
-"""sample output
+    # One seqkit call per chunk of MAGs: the file list is cut from input_MAGs.txt by line range,
+    # so the command line stays short whatever the chunk size
+    rule stats_seqkit:
+        conda: ENV["seqkit"]
+        input:
+            mags=lambda wc: [SAMPLES[s] for s in CHUNKS[wc.chunk]]
+        output:
+            tsv=str(STATS_DIR / "{chunk}.seqkit.tsv")
+        params:
+            mags=OUTPUT_DIR / "input_MAGs.txt",
+            first=lambda wc: chunk_line(wc.chunk),
+            last=lambda wc: chunk_line(wc.chunk, last=True)
+        benchmark:
+            str(BENCHMARKS / "seqkit.{chunk}.benchmark.txt")
+        resources:
+            mem_mb=mem_mb("seqkit"),
+            runtime=runtime_min("seqkit")
+        threads: min(4, THREADS)
+        shell:
+            r"""
+            mkdir -p {STATS_DIR}
+            (
+                seqkit stats -a -T -j {threads} --infile-list <(awk -F'\t' 'NR>={params.first} && NR<={params.last} {{print $2}}' {params.mags}) \
+                    | awk -F'\t' -v OFS='\t' 'NR==FNR {{mag[$2]=$1; next}} FNR==1 {{print "MAG",$0; next}} {{print mag[$1],$0}}' {params.mags} -
+            ) > {output.tsv}
+            """
+
+    rule stats_seqkit_merge:
+        conda: ENV["python"]
+        input:
+            expand(str(STATS_DIR / "{chunk}.seqkit.tsv"), chunk=list(CHUNKS))
+        output:
+            tsv=STATS_DIR / "stats_summary.tsv"
+        params:
+            mags=OUTPUT_DIR / "input_MAGs.txt"
+        benchmark:
+            str(BENCHMARKS / "stats_merge.benchmark.txt")
+        resources:
+            mem_mb=mem_mb("stats_merge"),
+            runtime=runtime_min("stats_merge")
+        shell:
+            r"""
+            python workflow/scripts/fasta_stats.py \
+                --mags {params.mags} \
+                --output {output.tsv} \
+                --seqkit-dir {STATS_DIR}
+            """
+
+"""sample output (seqkit, per chunk)
 MAG	file	format	type	num_seqs	sum_len	min_len	avg_len	max_len	Q1	Q2	Q3	sum_gap	N50	N50_num	Q20(%)	Q30(%)	AvgQual	GC(%)	sum_n
-MAG1	test_input_MAGs/MAG1.fna	FASTA	DNA	28	903669	1924	32273.9	189547	5686	14622	43754	0	68826	4	0	0	0	38.27	0
-"""
\ No newline at end of file
+MAG1	/path/to/test_input_MAGs/MAG1.fna	FASTA	DNA	28	903669	1924	32273.9	189547	5686	14622	43754	0	68826	4	0	0	0	38.27	0
+"""
+
+"""sample output (stats_summary.tsv, both backends)
+MAG	num_contigs	sum_len	min_len	max_len	N50	GC	sum_n
+MAG1	28	903669	1924	189547	68826	38.27	0
+"""
@@ -1,5 +1,5 @@
-# Collect all per-MAG TSVs into a consolidated summary
-# stats.smk: Genome_Size_bp, num_Contigs, N50, %GC, num_ambiguous_bases
+# Collect all per-MAG results into the result store (magport.sqlite) and export a consolidated summary
+# stats.smk (stats_summary.tsv): Genome_Size_bp, num_Contigs, N50, %GC, num_ambiguous_bases
 # orfs.smk: num_ORFs
 # checkm.smk: Completeness, Contamination
 # gunc.smk: GUNC_status
@@ -7,52 +7,78 @@
 # mimag.smk: MIMAG_level
 # trnas.smk: num_tRNAs
 # rnas.smk: num_16S_rRNAs, num_23S_rRNAs, num_5S_rRNAs
+# domain.smk: Domain (reconciled with GTDB_taxonomy when both are available)
 # gtdb.smk: GTDB_taxonomy
 # 16s.smk: 16S_taxonomy
+# dedup.smk: inherited_from (cluster representative whose CheckM/GUNC/GTDB-Tk results a MAG reuses)
+# gate.smk: quality_gate (passed / skipped_by_gate; skipped MAGs show "skipped_by_gate" in the gated fields)
 
 # output columns:
-# MAG	num_contigs	genome_size_bp	N50	GC	sum_ambiguous_bases	num_ORFs	Completeness	Contamination	GUNC_status	Park_Score	MIMAG_level	num_tRNAs	num_16S_rRNAs	num_23S_rRNAs	num_5S_rRNAs	16S_taxonomy	GTDB_taxonomy
+# MAG	num_contigs	genome_size_bp	N50	GC	sum_ambiguous_bases	num_ORFs	Completeness	Contamination	GUNC_status	Park_Score	MIMAG_level	num_tRNAs	num_16S_rRNAs	num_23S_rRNAs	num_5S_rRNAs	Domain	16S_taxonomy	GTDB_taxonomy
 
 rule collect_summary:
     conda: ENV["python"]
     input:
         # Basic stats
-        seqkit=expand(get_dir("seqkit", "01_stats/seqkit") / "{sample}.seqkit.tsv", sample=SAMPLE_LIST),
+        stats=get_dir("seqkit", "01_stats/seqkit") / "stats_summary.tsv",
         # Quality assessment
         checkm2=get_dir("checkm", "03_quality/checkm") / "checkm2_summary.tsv" if USE_CHECKM == "checkm2" else [],
         checkm1=get_dir("checkm", "03_quality/checkm") / "checkm1_summary.tsv" if USE_CHECKM == "checkm1" else [],
         gunc=get_dir("gunc", "03_quality/gunc") / "GUNC_summary.tsv",
-        mimag=expand(get_dir("mimag", "03_quality/mimag") / "{sample}.MIMAG_level.tsv", sample=SAMPLE_LIST),
-        park=expand(get_dir("park", "03_quality/park") / "{sample}.park.tsv", sample=SAMPLE_LIST),
-        # Gene content
-        orfs=expand(get_dir("orfs", "02_genes/orfs") / "{sample}.orfs.tsv", sample=SAMPLE_LIST),
-        trnas=expand(get_dir("trna", "02_genes/trna") / "{sample}.tRNA.tsv", sample=SAMPLE_LIST),
-        rrnas=expand(get_dir("rrna", "02_genes/rrna") / "{sample}.rRNA.tsv", sample=SAMPLE_LIST),
+        mimag=get_dir("mimag", "03_quality/mimag") / "MIMAG_summary.tsv",
+        park=get_dir("park", "03_quality/park") / "park_summary.tsv",
+        # Gene content: counts are upserted into the result store by the per-MAG rules;
+        # summary.py counts them again from these outputs when the store lacks them
+        orfs=expand(get_dir("orfs", "02_genes/orfs") / "{sample}.faa", sample=SAMPLE_LIST),
+        trnas=expand(get_dir("trna", "02_genes/trna") / "{sample}.trnascan.txt", sample=SAMPLE_LIST),
+        rrnas=expand(get_dir("rrna", "02_genes/rrna") / "{sample}.rRNA.gff", sample=SAMPLE_LIST),
+        domains=expand(get_dir("domain", "02_genes/domain") / "{sample}.domain.tsv", sample=SAMPLE_LIST),
         # Taxonomy
         gtdb=get_dir("gtdbtk", "04_taxonomy/gtdbtk") / "gtdb.merged_summary.tsv",
-        r16s=expand(get_dir("r16s", "04_taxonomy/16S") / "{sample}.16S.tsv", sample=SAMPLE_LIST)
-        
+        r16s=R16_HITS if config.get("rrna16s_batch", True) else
+             expand(get_dir("r16s", "04_taxonomy/16S") / "{sample}.16S.tsv", sample=SAMPLE_LIST),
+        # Duplicate clusters (dedup: true)
+        clusters=CLUSTERS_TSV if DEDUP else [],
+        # Quality gate (quality_gate: true)
+        gate=GATE_TSV if GATE else []
+
     output:
         tsv=SUMMARY_TSV
     params:
         result_dir=OUTPUT_DIR,
         mags=OUTPUT_DIR / "input_MAGs.txt",
         use_checkm=USE_CHECKM,
+        store=STORE,
+        r16s=R16_HITS if config.get("rrna16s_batch", True) else get_dir("r16s", "04_taxonomy/16S"),
+        r16s_option="--16s-hits" if config.get("rrna16s_batch", True) else "--16s-dir",
+        clusters=lambda w, input: f"--clusters {input.clusters}" if DEDUP else "",
+        gate=lambda w, input: f"--gate {input.gate}" if GATE else "",
+        orfs_dir=get_dir("orfs", "02_genes/orfs"),
+        trna_dir=get_dir("trna", "02_genes/trna"),
+        rrna_dir=get_dir("rrna", "02_genes/rrna"),
+        domain_dir=get_dir("domain", "02_genes/domain"),
         checkm_input=lambda w, input: input.checkm2 if USE_CHECKM == "checkm2" else input.checkm1
+    benchmark:
+        str(BENCHMARKS / "summary.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("summary"),
+        runtime=runtime_min("summary")
     shell:
         r"""
         python workflow/scripts/summary.py \
             --mags {params.mags} \
-            --seqkit {input.seqkit} \
+            --store {params.store} \
+            --stats {input.stats} \
             --checkm {params.checkm_input} \
             --gunc {input.gunc} \
             --mimag {input.mimag} \
             --park {input.park} \
-            --orfs {input.orfs} \
-            --trnas {input.trnas} \
-            --rrnas {input.rrnas} \
             --gtdb {input.gtdb} \
-            --16s {input.r16s} \
+            {params.r16s_option} {params.r16s} {params.clusters} {params.gate} \
+            --orfs-dir {params.orfs_dir} \
+            --trna-dir {params.trna_dir} \
+            --rrna-dir {params.rrna_dir} \
+            --domain-dir {params.domain_dir} \
             --output {output.tsv} \
             --results {params.result_dir} \
             --checkm-method {params.use_checkm}
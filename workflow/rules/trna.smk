@@ -6,26 +6,44 @@ rule trna_scan:
     conda: ENV["trnascan"]
     input:
         mag=lambda wc: SAMPLES[wc.sample],
-        gtdb=GTDB_DIR / "gtdb.merged_summary.tsv"
+        domain=DOMAIN_DIR / "{sample}.domain.tsv",
+        gate=gate_input("trna")
     output:
-        tsv=str(TRNA_DIR / "{sample}.tRNA.tsv")
+        txt=str(TRNA_DIR / "{sample}.trnascan.txt")
+    params:
+        fasta=plain_fasta,
+        skipped=gate_skipped("trna"),
+        gate_spec=gate_spec("trna")  # reruns the job when the thresholds change
     log:
         str(LOGS / "tRNAscan.{sample}.log")
-    threads: 1
+    benchmark:
+        str(BENCHMARKS / "trnascan.{sample}.benchmark.txt")
+    resources:
+        mem_mb=mem_mb("trnascan"),
+        runtime=runtime_min("trnascan")
+    threads: shard_threads
     shell:
         r"""
         mkdir -p {TRNA_DIR}
+        if {params.skipped}; then
+            # failed the quality gate: no tRNAscan-SE run, num_tRNAs is "skipped_by_gate" in the summary
+            echo "# skipped_by_gate" > {output.txt}
+            {STORE_PUT} --id {wildcards.sample} num_tRNAs=
+            exit 0
+        fi
 
-        #get domain from gtdb summary. find the line for this mag, find "Archaea" or "Bacteria" in the 2nd column. if no line can be found, default to "Bacteria" for this MAG
-        domain=$(awk -v mag="{wildcards.sample}" 'BEGIN{{FS="\t"}} $1==mag {{print $2}}' {input.gtdb})
+        # get domain from the fast domain pre-classification ("Archaea" or "Bacteria")
+        domain=$(awk 'BEGIN{{FS="\t"}} NR==2 {{print $1}}' {input.domain})
         # if domain contains "Archaea" (case insensitive), set to "Archaea", else "Bacteria"
-        if echo "$domain" | grep -qi "Archaea"; then
-            tRNAscan-SE -A -o {TRNA_DIR}/{wildcards.sample}.trnascan.txt {input.mag} --log {log} --quiet --thread {threads}
+        if echo "$domain" | grep -qi "Archaea"; then kingdom=A; else kingdom=B; fi
+        if [ {threads} -gt 1 ]; then
+            # large MAG: one tRNAscan-SE per contig group, rows merged in contig order
+            {SHARD} trnascan --mag {input.mag} --parts {threads} --kingdom $kingdom --output {output.txt} --log {log}
         else
-            tRNAscan-SE -B -o {TRNA_DIR}/{wildcards.sample}.trnascan.txt {input.mag} --log {log} --quiet --thread {threads}
+            {params.fasta}
+            tRNAscan-SE -$kingdom -o {output.txt} "$fasta" --log {log} --quiet --thread {threads}
         fi
 
-        count=$(grep -vc '^#' {TRNA_DIR}/{wildcards.sample}.trnascan.txt)
-        echo -e "trna_count" > {output.tsv}
-        echo -e "$count" >> {output.tsv}
+        count=$(grep -vc '^#' {output.txt} || true)
+        {STORE_PUT} --id {wildcards.sample} num_tRNAs=$count
         """
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import csv
+from pathlib import Path
+
+# Usage: python blast16s_batch.py concat --mags input_MAGs.txt --fasta-dir 02_genes/rrna --output batch_16S.fasta [--gate gate.tsv]
+#        python blast16s_batch.py split --mags input_MAGs.txt --hits batch_16S.blast.tsv --out-dir 04_taxonomy/16S
+
+"""Batched 16S BLAST helpers
+concat: join every non-empty {MAG}.16S.fasta into one multi-query FASTA, tagging each
+        header as ">{MAG}@@{original header}" so hits can be routed back. With --gate, MAGs
+        that failed the quality gate (quality_gate.py) are left out.
+split:  write one {MAG}.16S.tsv per MAG from the combined blastn table, with the tag
+        stripped from qseqid and hit order preserved, so each file is identical to a
+        per-MAG blastn run. MAGs without 16S (or without hits) get an empty file.
+"""
+
+SEP = "@@"  # "|" would be parsed by BLAST as a seq-id database tag
+
+
+def read_mags(mags_txt: Path) -> list[str]:
+    with open(mags_txt) as f:
+        return [line.split('\t')[0].strip() for line in f if line.strip()]
+
+
+def read_gated(gate_tsv: Path) -> set[str]:
+    with open(gate_tsv, newline='') as f:
+        return {row["MAG"] for row in csv.DictReader(f, delimiter='\t') if row["gate"] != "passed"}
+
+
+def concat(mags: list[str], fasta_dir: Path, out_fasta: Path, gated: set[str] = frozenset()) -> None:
+    n = 0
+    with open(out_fasta, 'w') as out:
+        for mag in mags:
+            if mag in gated:
+                continue
+            path = fasta_dir / f"{mag}.16S.fasta"
+            if not path.exists() or path.stat().st_size == 0:
+                continue
+            with open(path) as f:
+                for line in f:
+                    if line.startswith('>'):
+                        line = f">{mag}{SEP}{line[1:]}"
+                        n += 1
+                    out.write(line)
+    print(f"{n} 16S queries from {len(mags) - len(gated & set(mags))} MAGs written to {out_fasta}"
+          + (f" ({len(gated & set(mags))} skipped by the quality gate)" if gated else ""))
+
+
+def split(mags: list[str], hits_tsv: Path, out_dir: Path) -> None:
+    hits = {mag: [] for mag in mags}
+    if hits_tsv.exists():
+        with open(hits_tsv) as f:
+            for row in csv.reader(f, delimiter='\t'):
+                if not row:
+                    continue
+                mag, _, qseqid = row[0].partition(SEP)
+                if mag in hits:
+                    hits[mag].append([qseqid] + row[1:])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for mag, rows in hits.items():
+        with open(out_dir / f"{mag}.16S.tsv", 'w', newline='') as f:
+            csv.writer(f, delimiter='\t', lineterminator='\n').writerows(rows)
+    print(f"16S hits split for {len(mags)} MAGs ({sum(1 for r in hits.values() if r)} with hits)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concatenate/split 16S queries for a single batched blastn run")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_concat = sub.add_parser("concat", help="Build the multi-query FASTA")
+    p_concat.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    p_concat.add_argument("--fasta-dir", type=Path, required=True, help="Directory with {MAG}.16S.fasta files")
+    p_concat.add_argument("--output", type=Path, required=True, help="Output multi-query FASTA")
+    p_concat.add_argument("--gate", type=Path, default=None, help="gate.tsv of quality_gate.py: passed MAGs only")
+    p_split = sub.add_parser("split", help="Split blastn hits into per-MAG tables")
+    p_split.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    p_split.add_argument("--hits", type=Path, required=True, help="Combined blastn outfmt 6 table")
+    p_split.add_argument("--out-dir", type=Path, required=True, help="Directory for {MAG}.16S.tsv files")
+    args = parser.parse_args()
+    if args.command == "concat":
+        concat(read_mags(args.mags), args.fasta_dir, args.output, read_gated(args.gate) if args.gate else set())
+    else:
+        split(read_mags(args.mags), args.hits, args.out_dir)
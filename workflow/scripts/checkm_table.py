@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+"""Shared loaders for the batched quality scripts (park_score.py, mimag.py).
+
+CheckM tables are indexed once by the exact MAG ID (checkm2 "Name", checkm1 "Bin Id"),
+so lookups never match by substring (MAG1 vs MAG10).
+"""
+
+KEY_COLUMN = {"checkm2": "Name", "checkm1": "Bin Id"}
+
+
+def read_mags(mags_txt: Path) -> list[str]:
+    """Read MAG IDs (first column) from input_MAGs.txt, keeping file order."""
+    with open(mags_txt) as f:
+        return [line.split('\t')[0].strip() for line in f if line.strip()]
+
+
+def load_checkm(quality_tsv: Path, method: str, mags: list[str]) -> pd.DataFrame:
+    """Return Completeness/Contamination indexed by MAG ID, 0.0 for MAGs missing from the table."""
+    key = KEY_COLUMN[method]
+    df = pd.read_csv(quality_tsv, sep='\t', usecols=[key, "Completeness", "Contamination"], dtype={key: str})
+    df = df.drop_duplicates(subset=key, keep="first").set_index(key)
+    df = df.apply(pd.to_numeric, errors="coerce")
+    return df.reindex(mags).fillna(0.0)
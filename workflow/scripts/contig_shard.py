@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import heapq
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Usage:
+#   python contig_shard.py prodigal --mag MAG1.fa --parts 8 --gff MAG1.gff --faa MAG1.faa --fna MAG1.fna
+#   python contig_shard.py trnascan --mag MAG1.fa --parts 8 --kingdom B --output MAG1.trnascan.txt --log tRNAscan.MAG1.log
+#   python contig_shard.py barrnap --mag MAG1.fa --parts 8 --kingdom bac --gff MAG1.rRNA.gff \
+#          --outseq MAG1.rRNA.fna --log barrnap.MAG1.log
+
+"""Contig scatter/gather for the per-MAG gene callers
+A large, fragmented MAG is split into --parts groups of contigs with similar total length
+(longest contig first into the currently shortest group), the tool runs once per group in
+parallel, and the outputs are merged back in the contig order of the MAG:
+
+prodigal: -p meta predicts each contig on its own, so only the sequence numbers differ; the
+          "seqnum=" and "ID=<seq>_<gene>" fields of the GFF, FAA and FNA are renumbered to
+          the position of the contig in the whole MAG.
+trnascan: Infernal bit scores do not depend on the other contigs; rows are concatenated
+          under a single header in contig order.
+barrnap:  nhmmer E-values scale with the searched sequence length, so each hit's E-value is
+          multiplied by (MAG length / group length) and hits above --evalue are dropped, as a
+          whole-MAG run would have reported them. Hits are sorted by contig and start like
+          barrnap does, and --outseq keeps the sequences of the remaining hits.
+
+Group FASTAs are written (uncompressed) to a temporary directory that is removed on exit.
+"""
+
+GZIP_MAGIC = b"\x1f\x8b"
+GFF_VERSION = "##gff-version"
+
+
+def open_fasta(path: str):
+    """Binary reader for a plain or gzip/bgzip-compressed FASTA (detected from the magic bytes)."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+
+def read_records(path: str) -> list[tuple[str, bytes, int]]:
+    """(contig name, record bytes including the header line, sequence length) in file order."""
+    with open_fasta(path) as f:
+        data = f.read()
+    records = []
+    for chunk in data.split(b"\n>"):
+        if not chunk.strip():
+            continue
+        record = chunk if chunk.startswith(b">") else b">" + chunk
+        header, _, seq = record.partition(b"\n")
+        name = header[1:].split(None, 1)[0].decode() if header[1:].strip() else ""
+        length = len(seq) - seq.count(b"\n") - seq.count(b"\r")
+        records.append((name, record.rstrip(b"\n") + b"\n", length))
+    return records
+
+
+def split_records(lengths: list[int], parts: int) -> list[list[int]]:
+    """
+    Contig indices per group, balancing total length (LPT); each group keeps MAG order and empty
+    groups are dropped.
+    Example:
+        split_records([50, 10, 40, 30], 2) -> [[0, 1], [2, 3]]
+    """
+    heap = [(0, p) for p in range(max(1, parts))]
+    groups: list[list[int]] = [[] for _ in heap]
+    for i in sorted(range(len(lengths)), key=lambda i: (-lengths[i], i)):
+        total, p = heapq.heappop(heap)
+        groups[p].append(i)
+        heapq.heappush(heap, (total + lengths[i], p))
+    return [sorted(g) for g in groups if g]
+
+
+def write_groups(records, groups, workdir: Path) -> list[Path]:
+    paths = []
+    for p, group in enumerate(groups):
+        path = workdir / f"part{p}.fna"
+        with open(path, 'wb') as f:
+            for i in group:
+                f.write(records[i][1])
+        paths.append(path)
+    return paths
+
+
+def run_all(cmds: list[list[str]], stdouts: list[Path | None], logs: list[Path]) -> None:
+    """Run one command per group in parallel; raise if any of them fails."""
+    def run(cmd, stdout, log):
+        with open(log, 'w') as err, (open(stdout, 'w') if stdout else open(os.devnull, 'w')) as out:
+            subprocess.run(cmd, stdout=out, stderr=err, check=True)
+    with ThreadPoolExecutor(max_workers=len(cmds)) as pool:
+        for future in [pool.submit(run, c, s, l) for c, s, l in zip(cmds, stdouts, logs)]:
+            future.result()
+
+
+def concat_logs(logs: list[Path], log: str | None) -> None:
+    if not log:
+        return
+    with open(log, 'w') as out:
+        for path in logs:
+            if path.is_file():
+                out.write(path.read_text())
+
+
+# Prodigal
+
+SEQNUM = re.compile(r"seqnum=(\d+)")
+GENE_ID = re.compile(r"ID=(\d+)_")
+
+
+def renumber(line: str, pattern: re.Pattern, index: list[int], fmt: str) -> tuple[str, int]:
+    """Replace the group-local sequence number in `line` with the MAG-wide one; returns (line, 0-based contig)."""
+    m = pattern.search(line)
+    if not m:
+        return line, -1
+    seq = index[int(m.group(1)) - 1]
+    return line[:m.start()] + fmt.format(seq + 1) + line[m.end():], seq
+
+
+def merge_gff_blocks(paths: list[Path], groups: list[list[int]], out: str) -> None:
+    """Prodigal GFF: one '# Sequence Data' block per contig, written in MAG order."""
+    blocks: dict[int, list[str]] = {}
+    header = None
+    for path, index in zip(paths, groups):
+        seq = -1
+        with open(path) as f:
+            for line in f:
+                if line.startswith(GFF_VERSION):
+                    header = header or line
+                    continue
+                if line.startswith("# Sequence Data:"):
+                    line, seq = renumber(line, SEQNUM, index, "seqnum={}")
+                    blocks[seq] = []
+                elif not line.startswith("#"):
+                    line, _ = renumber(line, GENE_ID, index, "ID={}_")
+                blocks.setdefault(seq, []).append(line)
+    with open(out, 'w') as f:
+        if header:
+            f.write(header)
+        for seq in sorted(blocks):
+            f.writelines(blocks[seq])
+
+
+def merge_fasta_genes(paths: list[Path], groups: list[list[int]], out: str) -> None:
+    """Prodigal FAA/FNA: records renumbered and ordered by contig, genes of a contig in their own order."""
+    records: list[tuple[int, int, list[str]]] = []
+    for path, index in zip(paths, groups):
+        with open(path) as f:
+            for line in f:
+                if line.startswith(">"):
+                    line, seq = renumber(line, GENE_ID, index, "ID={}_")
+                    records.append((seq, len(records), [line]))
+                elif records:
+                    records[-1][2].append(line)
+    with open(out, 'w') as f:
+        for _, _, lines in sorted(records, key=lambda r: r[:2]):
+            f.writelines(lines)
+
+
+def prodigal_main(args, records, groups, parts, workdir) -> None:
+    stems = [p.with_suffix("") for p in parts]
+    cmds = [["prodigal", "-q", "-p", "meta", "-f", "gff", "-i", str(p), "-o", f"{s}.gff",
+             "-a", f"{s}.faa", "-d", f"{s}.genes.fna"] for p, s in zip(parts, stems)]
+    logs = [s.with_suffix(".log") for s in stems]
+    run_all(cmds, [None] * len(cmds), logs)
+    merge_gff_blocks([Path(f"{s}.gff") for s in stems], groups, args.gff)
+    merge_fasta_genes([Path(f"{s}.faa") for s in stems], groups, args.faa)
+    merge_fasta_genes([Path(f"{s}.genes.fna") for s in stems], groups, args.fna)
+    concat_logs(logs, args.log)
+
+
+# tRNAscan-SE
+
+"""tRNAscan-SE output sample
+Sequence		tRNA	Bounds	tRNA	Anti	Intron Bounds	Inf
+Name    	tRNA #	Begin	End	Type	Codon	Begin	End	Score	Note
+--------	------	-----	------	----	-----	-----	----	------	------
+contig_1 	1	13472	13545	Gly	GCC	0	0	74.8
+"""
+
+
+def trnascan_main(args, records, groups, parts, workdir) -> None:
+    flag = f"-{args.kingdom}"
+    outs = [p.with_suffix(".txt") for p in parts]
+    cmds = [["tRNAscan-SE", flag, "-o", str(o), "--log", str(o.with_suffix(".trnalog")), "--quiet",
+             "--thread", "1", str(p)] for p, o in zip(parts, outs)]
+    logs = [p.with_suffix(".log") for p in parts]
+    run_all(cmds, [None] * len(cmds), logs)
+
+    order = {name: i for i, (name, _, _) in enumerate(records)}
+    header: list[str] = []
+    rows: list[tuple[int, int, str]] = []
+    for out in outs:
+        if not out.is_file():
+            continue
+        with open(out) as f:
+            lines = f.readlines()
+        # three header lines: 'Sequence', 'Name', '--------'
+        n = 3 if len(lines) >= 3 and lines[2].startswith("--") else 0
+        header = header or lines[:n]
+        for line in lines[n:]:
+            rows.append((order.get(line.split("\t", 1)[0].strip(), len(order)), len(rows), line))
+    with open(args.output, 'w') as f:
+        f.writelines(header)
+        f.writelines(line for _, _, line in sorted(rows))
+    concat_logs([o.with_suffix(".trnalog") for o in outs] + logs, args.log)
+
+
+# barrnap
+
+OUTSEQ_HEADER = re.compile(r"^>(.+?)::(.+):(\d+)-(\d+)\(([+-])\)\s*$")
+
+
+def barrnap_main(args, records, groups, parts, workdir) -> None:
+    cmds = [["barrnap", "--quiet", "--threads", "1", "--kingdom", args.kingdom, "--evalue", str(args.evalue),
+             "--outseq", str(p.with_suffix(".rrna.fna")), str(p)] for p in parts]
+    gffs = [p.with_suffix(".gff") for p in parts]
+    logs = [p.with_suffix(".log") for p in parts]
+    run_all(cmds, gffs, logs)
+
+    total = sum(length for _, _, length in records) or 1
+    header = None
+    features: list[tuple[str, int, list[str]]] = []
+    for gff, group in zip(gffs, groups):
+        scale = total / max(1, sum(records[i][2] for i in group))
+        with open(gff) as f:
+            for line in f:
+                if line.startswith("#"):
+                    header = header or (line if line.startswith(GFF_VERSION) else None)
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 9:
+                    continue
+                if scale != 1.0:
+                    evalue = float(cols[5]) * scale
+                    if evalue > args.evalue:
+                        continue
+                    cols[5] = f"{evalue:.2g}"
+                features.append((cols[0], int(cols[3]), cols))
+    features.sort(key=lambda f: (f[0], f[1]))
+
+    with open(args.gff, 'w') as f:
+        f.write(header or f"{GFF_VERSION} 3\n")
+        for _, _, cols in features:
+            f.write("\t".join(cols) + "\n")
+
+    if args.outseq:
+        kept = set()
+        for _, _, cols in features:
+            name = re.search(r"Name=([^;]+)", cols[8])
+            kept.add((name.group(1) if name else "", cols[0], int(cols[3]) - 1, int(cols[4]), cols[6]))
+        seqs: dict[tuple, str] = {}
+        unmatched: list[str] = []
+        for p in parts:
+            path = p.with_suffix(".rrna.fna")
+            if not path.is_file():
+                continue
+            for record in path.read_text().split("\n>"):
+                if not record.strip():
+                    continue
+                record = (record if record.startswith(">") else ">" + record).rstrip("\n") + "\n"
+                m = OUTSEQ_HEADER.match(record.split("\n", 1)[0])
+                if m is None:
+                    unmatched.append(record)
+                else:
+                    seqs[(m.group(1), m.group(2), int(m.group(3)), int(m.group(4)), m.group(5))] = record
+        with open(args.outseq, 'w') as f:
+            for _, _, cols in features:
+                name = re.search(r"Name=([^;]+)", cols[8])
+                key = (name.group(1) if name else "", cols[0], int(cols[3]) - 1, int(cols[4]), cols[6])
+                if key in seqs:
+                    f.write(seqs.pop(key))
+            f.writelines(unmatched)
+    concat_logs(logs, args.log)
+
+
+TOOLS = {"prodigal": prodigal_main, "trnascan": trnascan_main, "barrnap": barrnap_main}
+
+
+def main(args) -> None:
+    records = read_records(args.mag)
+    groups = split_records([length for _, _, length in records], args.parts)
+    workdir = Path(tempfile.mkdtemp(prefix=f"{Path(args.mag).name}.shards.", dir=args.tmpdir))
+    try:
+        parts = write_groups(records, groups, workdir)
+        TOOLS[args.tool](args, records, groups, parts, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"[contig_shard] {args.tool}: {len(records)} contigs of {args.mag} in {len(groups)} groups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Prodigal, tRNAscan-SE or barrnap on contig groups of one MAG in parallel")
+    sub = parser.add_subparsers(dest="tool", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--mag", required=True, help="MAG FASTA (plain or gzip/bgzip-compressed)")
+    common.add_argument("--parts", type=int, default=4, help="Number of contig groups (and parallel processes)")
+    common.add_argument("--log", help="Concatenated log of all groups")
+    common.add_argument("--tmpdir", help="Directory for the group FASTAs (default: $TMPDIR)")
+
+    p = sub.add_parser("prodigal", parents=[common], help="prodigal -p meta")
+    p.add_argument("--gff", required=True)
+    p.add_argument("--faa", required=True)
+    p.add_argument("--fna", required=True)
+
+    p = sub.add_parser("trnascan", parents=[common], help="tRNAscan-SE")
+    p.add_argument("--kingdom", choices=["A", "B"], required=True, help="-A (archaea) or -B (bacteria)")
+    p.add_argument("--output", required=True)
+
+    p = sub.add_parser("barrnap", parents=[common], help="barrnap")
+    p.add_argument("--kingdom", choices=["arc", "bac"], required=True)
+    p.add_argument("--gff", required=True)
+    p.add_argument("--outseq")
+    p.add_argument("--evalue", type=float, default=1e-6, help="E-value cutoff of the whole MAG (barrnap default)")
+
+    main(parser.parse_args())
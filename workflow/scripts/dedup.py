@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import math
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Usage:
+#   python dedup.py cluster --mags input_MAGs.txt --db 00_dedup/sketches.sqlite --output 00_dedup/clusters.tsv \
+#          [--ani 99 --min-length-ratio 0.95 --kmer 21 --sketch-size 1000 --threads 8]
+#   python dedup.py propagate --clusters 00_dedup/clusters.tsv --key-column Name --output checkm2_summary.tsv \
+#          batches/batch0000/checkm2_summary.tsv batches/batch0001/checkm2_summary.tsv
+
+"""Duplicate MAG detection with MinHash sketches
+cluster:   sketch every MAG (bottom-k MinHash of its canonical k-mers), estimate the Mash
+           ANI between genomes and group genomes above --ani and of near-equal length
+           (--min-length-ratio) around a representative.
+           Sketches are kept in an SQLite file keyed by MAG path, size and mtime, so later
+           runs only sketch new or changed MAGs; earlier representatives stay representatives
+           (unless --ani or the sketch settings change), so adding MAGs does not reshuffle
+           clusters.
+propagate: concatenate the batch tables of CheckM2, GUNC or GTDB-Tk, which only ran on the
+           representatives, and copy each representative's row to the members of its cluster.
+
+Representatives are picked greedily, largest genome first: each MAG joins the existing
+representative it shares the highest ANI with, if that ANI reaches --ani, or starts a new
+cluster. The Mash ANI of a partial genome to the full one stays high (a MAG holding 70% of
+the representative still scores ~99.1), while its completeness and contamination differ, so
+a MAG only joins a representative whose length is within --min-length-ratio (shorter/longer)
+of its own. Candidates are found through an index of sketch hashes, so each MAG is compared
+exactly only with representatives it shares hashes with.
+"""
+
+"""clusters.tsv sample
+MAG	representative	ANI	cluster_size
+MAG1	MAG1	100.0	2
+MAG1_rebinned	MAG1	99.71	2
+MAG2	MAG2	100.0	1
+"""
+
+COLUMNS = ["MAG", "representative", "ANI", "cluster_size"]
+BASES = np.full(256, 4, dtype=np.uint8)
+for _i, _c in enumerate(b"ACGT"):
+    BASES[_c] = BASES[_c + 32] = _i
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def read_fasta(path: str) -> bytes:
+    """Sequence of all contigs joined by N (k-mers never span two contigs)."""
+    with open(path, 'rb') as f:
+        gz = f.read(2) == GZIP_MAGIC
+    with (gzip.open(path, 'rb') if gz else open(path, 'rb')) as f:
+        data = f.read()
+    seqs = []
+    for record in data.split(b">")[1:]:
+        _, _, seq = record.partition(b"\n")
+        seqs.append(seq.replace(b"\n", b"").replace(b"\r", b""))
+    return b"N".join(seqs)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser: spreads k-mer codes uniformly over 64 bits."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def sketch_sequence(seq: bytes, k: int, size: int) -> np.ndarray:
+    """The `size` smallest hashes of the canonical k-mers of `seq` (sorted uint64)."""
+    codes = BASES[np.frombuffer(seq, dtype=np.uint8)]
+    n = codes.size - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = (invalid[k:] - invalid[:-k]) == 0
+    c = np.where(codes == 4, 0, codes).astype(np.uint64)
+    fwd = np.zeros(n, dtype=np.uint64)
+    rev = np.zeros(n, dtype=np.uint64)
+    for i in range(k):
+        fwd = (fwd << np.uint64(2)) | c[i:i + n]
+        rev |= (np.uint64(3) - c[i:i + n]) << np.uint64(2 * i)
+    hashes = _mix64(np.minimum(fwd, rev)[valid])
+    # a genome repeats few k-mers, so the smallest few `size` hashes almost always hold `size` distinct ones
+    take = 4 * size
+    if hashes.size > take:
+        bottom = np.unique(np.partition(hashes, take)[:take])
+        if bottom.size >= size:
+            return bottom[:size]
+    return np.unique(hashes)[:size]
+
+
+def sketch_file(job: tuple[str, str, int, int]) -> tuple[str, int, np.ndarray]:
+    mag, path, k, size = job
+    seq = read_fasta(path)
+    return mag, len(seq), sketch_sequence(seq, k, size)
+
+
+def mash_ani(a: np.ndarray, b: np.ndarray, k: int, size: int) -> float:
+    """ANI (%) from the bottom-k Jaccard estimate (Mash distance)."""
+    if a.size == 0 or b.size == 0:
+        return 0.0
+    union = np.union1d(a, b)[:size]
+    shared = np.count_nonzero(np.isin(union, a, assume_unique=True) & np.isin(union, b, assume_unique=True))
+    j = shared / union.size
+    if j <= 0:
+        return 0.0
+    return 100.0 * max(0.0, 1.0 + math.log(2 * j / (1 + j)) / k)
+
+
+def min_jaccard(ani: float, k: int) -> float:
+    """Jaccard index at which the Mash ANI equals `ani` (%)."""
+    d = 1.0 - ani / 100.0
+    return 1.0 / (2.0 * math.exp(k * d) - 1.0)
+
+
+def connect(db: Path) -> sqlite3.Connection:
+    db.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS sketches (ID TEXT PRIMARY KEY, path TEXT, size INTEGER, "
+                 "mtime_ns INTEGER, k INTEGER, sketch_size INTEGER, length INTEGER, hashes BLOB)")
+    conn.execute("CREATE TABLE IF NOT EXISTS clusters (ID TEXT PRIMARY KEY, representative TEXT, ord INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def load_sketches(conn: sqlite3.Connection, samples: list[tuple[str, str]], k: int, size: int,
+                  threads: int) -> dict[str, tuple[int, np.ndarray]]:
+    """MAG -> (sequence length, sketch); only MAGs whose file or sketch settings changed are sketched."""
+    stored = {row[0]: row[1:] for row in conn.execute(
+        "SELECT ID, path, size, mtime_ns, k, sketch_size, length, hashes FROM sketches")}
+    sketches, todo, stats = {}, [], {}
+    for mag, path in samples:
+        st = Path(path).stat()
+        stats[mag] = (path, st.st_size, st.st_mtime_ns)
+        rec = stored.get(mag)
+        if rec and tuple(rec[:5]) == (path, st.st_size, st.st_mtime_ns, k, size):
+            sketches[mag] = (rec[5], np.frombuffer(rec[6], dtype='<u8').astype(np.uint64))
+        else:
+            todo.append((mag, path, k, size))
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, threads)) as pool:
+            results = list(pool.map(sketch_file, todo, chunksize=8))
+        conn.execute("BEGIN")
+        conn.executemany("INSERT OR REPLACE INTO sketches VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         ((mag, *stats[mag], k, size, length, hashes.astype('<u8').tobytes())
+                          for mag, length, hashes in results))
+        conn.execute("COMMIT")
+        for mag, length, hashes in results:
+            sketches[mag] = (length, hashes)
+    print(f"[MAGport] dedup: {len(todo)} MAGs sketched, {len(samples) - len(todo)} sketches reused")
+    return sketches
+
+
+def length_ratio(a: int, b: int) -> float:
+    """
+    Example:
+        length_ratio(2_100_000, 3_000_000) -> 0.7
+    """
+    return min(a, b) / max(a, b) if max(a, b) > 0 else 0.0
+
+
+def cluster(sketches: dict[str, tuple[int, np.ndarray]], previous: list[str], ani: float, k: int,
+            size: int, min_length_ratio: float = 0.95) -> dict[str, tuple[str, float]]:
+    """MAG -> (representative, ANI to it); representatives of `previous` runs come first."""
+    kept = [m for m in previous if m in sketches]
+    rest = sorted((m for m in sketches if m not in set(kept)), key=lambda m: (-sketches[m][0], m))
+    min_shared = max(1, int(0.5 * min_jaccard(ani, k) * size))
+    index: dict[int, list[int]] = {}
+    reps: list[str] = []
+    assigned = {}
+    for mag in kept + rest:
+        length, hashes = sketches[mag]
+        counts = Counter(r for h in hashes.tolist() for r in index.get(h, ()))
+        best, best_ani = None, 0.0
+        for r, shared in counts.most_common():
+            if shared < min_shared:
+                break
+            if length_ratio(length, sketches[reps[r]][0]) < min_length_ratio:
+                continue
+            value = mash_ani(hashes, sketches[reps[r]][1], k, size)
+            if value > best_ani:
+                best, best_ani = reps[r], value
+        if best is not None and best_ani >= ani and mag not in kept:
+            assigned[mag] = (best, round(best_ani, 2))
+            continue
+        for h in hashes.tolist():
+            index.setdefault(h, []).append(len(reps))
+        reps.append(mag)
+        assigned[mag] = (mag, 100.0)
+    return assigned
+
+
+def cluster_main(args) -> None:
+    with open(args.mags) as f:
+        samples = [tuple(line.rstrip('\n').split('\t')[:2]) for line in f if line.strip()]
+    conn = connect(args.db)
+    sketches = load_sketches(conn, samples, args.kmer, args.sketch_size, args.threads)
+    settings = {"ani": str(args.ani), "min_length_ratio": str(args.min_length_ratio), "kmer": str(args.kmer),
+                "sketch_size": str(args.sketch_size)}
+    previous = []
+    if dict(conn.execute("SELECT key, value FROM settings").fetchall()) == settings:
+        previous = [row[0] for row in conn.execute(
+            "SELECT ID FROM clusters WHERE ID = representative ORDER BY ord")]
+    assigned = cluster(sketches, previous, args.ani, args.kmer, args.sketch_size, args.min_length_ratio)
+
+    sizes = Counter(rep for rep, _ in assigned.values())
+    reps = {m: i for i, m in enumerate(m for m, (rep, _) in assigned.items() if m == rep)}
+    conn.execute("BEGIN")
+    conn.execute("DELETE FROM clusters")
+    conn.executemany("INSERT INTO clusters VALUES (?, ?, ?)",
+                     ((m, rep, reps.get(m)) for m, (rep, _) in assigned.items()))
+    conn.execute("DELETE FROM sketches WHERE ID NOT IN (SELECT ID FROM clusters)")
+    conn.execute("DELETE FROM settings")
+    conn.executemany("INSERT INTO settings VALUES (?, ?)", settings.items())
+    conn.execute("COMMIT")
+
+    with open(args.output, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t', lineterminator='\n')
+        w.writerow(COLUMNS)
+        for mag, _ in samples:
+            rep, value = assigned[mag]
+            w.writerow([mag, rep, value, sizes[rep]])
+    print(f"[MAGport] dedup: {len(samples)} MAGs in {len(reps)} clusters at >= {args.ani}% ANI and "
+          f">= {args.min_length_ratio} length ratio; "
+          f"{len(samples) - len(reps)} MAGs inherit results from their representative")
+
+
+def read_clusters(path: Path) -> dict[str, str]:
+    """MAG -> representative."""
+    with open(path, newline='') as f:
+        return {row["MAG"]: row["representative"] for row in csv.DictReader(f, delimiter='\t')}
+
+
+def propagate_main(args) -> None:
+    header, rows = [], {}
+    for table in args.tables:
+        if not table.exists() or table.stat().st_size == 0:
+            continue
+        with open(table, newline='') as f:
+            rdr = csv.DictReader(f, delimiter='\t')
+            header = header or list(rdr.fieldnames or [])
+            for row in rdr:
+                rows[row.get(args.key_column)] = row
+    clusters = read_clusters(args.clusters)
+    inherited = 0
+    with open(args.output, 'w', newline='') as f:
+        if not header:
+            return
+        w = csv.DictWriter(f, fieldnames=header, delimiter='\t', lineterminator='\n', extrasaction='ignore')
+        w.writeheader()
+        for mag, rep in clusters.items():
+            row = rows.get(rep)
+            if row is None:
+                continue
+            if rep != mag:
+                row = {**row, args.key_column: mag}
+                inherited += 1
+            w.writerow(row)
+        w.writerows(row for key, row in rows.items() if key not in clusters)
+    print(f"[MAGport] {args.output}: {inherited} rows copied from cluster representatives")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MinHash duplicate detection for MAGport")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("cluster", help="Sketch the MAGs and cluster near-identical genomes")
+    p.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file (MAG<TAB>path)")
+    p.add_argument("--db", type=Path, required=True, help="SQLite file keeping the sketches between runs")
+    p.add_argument("--output", type=Path, required=True, help="Output clusters TSV")
+    p.add_argument("--ani", type=float, default=99.0, help="Minimum ANI (%%) to a representative")
+    p.add_argument("--min-length-ratio", type=float, default=0.95,
+                   help="Minimum length ratio (shorter/longer) of a MAG to its representative")
+    p.add_argument("--kmer", type=int, default=21, help="k-mer size (at most 32)")
+    p.add_argument("--sketch-size", type=int, default=1000, help="Hashes kept per MAG")
+    p.add_argument("--threads", type=int, default=1, help="Processes used for sketching")
+
+    p = sub.add_parser("propagate", help="Merge batch tables and copy representative rows to cluster members")
+    p.add_argument("--clusters", type=Path, required=True, help="clusters.tsv written by cluster")
+    p.add_argument("--key-column", required=True, help="Column holding the MAG ID")
+    p.add_argument("--output", type=Path, required=True, help="Merged table")
+    p.add_argument("tables", type=Path, nargs='+', help="Batch tables")
+
+    args = parser.parse_args()
+    if args.command == "cluster":
+        cluster_main(args)
+    else:
+        propagate_main(args)
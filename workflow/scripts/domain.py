@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import csv
+import math
+import argparse
+from pathlib import Path
+
+# Usage: python domain.py bac.gff arc.gff out.tsv --mag MAG1
+
+"""Fast domain pre-classification
+barrnap is run twice on the MAG, once with the bacterial and once with the archaeal
+rRNA HMMs. Each hit contributes -log10(e-value) to the score of its kingdom, and the
+kingdom with the higher total wins. MAGs without any rRNA hit (or a tie) default to
+Bacteria, matching the previous behaviour when no GTDB-Tk lineage was found.
+"""
+
+"""barrnap gff sample
+##gff-version 3
+MAG1_contig_3	barrnap:0.9	rRNA	6049	7555	1.2e-250	-	.	Name=16S_rRNA;product=16S ribosomal RNA
+MAG1_contig_3	barrnap:0.9	rRNA	2706	5601	0	-	.	Name=23S_rRNA;product=23S ribosomal RNA
+"""
+
+MAX_SCORE = 300.0  # cap for e-values reported as 0
+
+
+def score_gff(gff: Path) -> float:
+    """Sum -log10(e-value) over all barrnap hits in a GFF file."""
+    score = 0.0
+    with open(gff) as f:
+        for row in csv.reader(f, delimiter='\t'):
+            if not row or row[0].startswith('#') or len(row) < 6:
+                continue
+            try:
+                evalue = float(row[5])
+            except ValueError:
+                continue
+            score += MAX_SCORE if evalue <= 0 else min(MAX_SCORE, -math.log10(evalue))
+    return score
+
+
+def main(bac_gff: Path, arc_gff: Path, out_tsv: Path, mag_name: str) -> None:
+    bac_score = score_gff(bac_gff)
+    arc_score = score_gff(arc_gff)
+    domain = "Archaea" if arc_score > bac_score else "Bacteria"
+    print(f"domain for {mag_name}: {domain} (bac={bac_score:.1f}, arc={arc_score:.1f})")
+    out_tsv.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_tsv, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t')
+        w.writerow(["domain", "bac_score", "arc_score"])
+        w.writerow([domain, f"{bac_score:.1f}", f"{arc_score:.1f}"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Call the domain of a MAG from barrnap bac/arc hits")
+    parser.add_argument("bac_gff", type=Path, help="barrnap GFF produced with --kingdom bac")
+    parser.add_argument("arc_gff", type=Path, help="barrnap GFF produced with --kingdom arc")
+    parser.add_argument("out_tsv", type=Path, help="Output TSV file")
+    parser.add_argument("--mag", required=True, help="MAG name to process")
+    args = parser.parse_args()
+    main(args.bac_gff, args.arc_gff, args.out_tsv, args.mag)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Usage: python fasta_stats.py --mags input_MAGs.txt --output stats_summary.tsv --threads 8
+#        python fasta_stats.py --mags input_MAGs.txt --output stats_summary.tsv --seqkit-dir 01_stats/seqkit
+
+"""Native FASTA statistics engine (alternative to the per-chunk seqkit jobs)
+Each FASTA is streamed through a reusable buffer in CHUNK_SIZE blocks and every block
+is processed with NumPy byte masks, so no per-line Python work is done (gzip/bgzip inputs
+are decompressed on the fly). Files are spread over a process pool and the results are
+written as one table keyed by MAG.
+
+With --seqkit-dir the per-chunk `seqkit stats -a` tables (MAG column first) are collated
+into the same table instead, so downstream scripts only ever read named columns.
+"""
+
+"""output sample
+MAG	num_contigs	sum_len	min_len	max_len	N50	GC	sum_n
+MAG1	28	903669	1924	189547	68826	38.27	0
+"""
+
+COLUMNS = ["MAG", "num_contigs", "sum_len", "min_len", "max_len", "N50", "GC", "sum_n"]
+SEQKIT_COLUMNS = {"num_seqs": "num_contigs", "sum_len": "sum_len", "min_len": "min_len", "max_len": "max_len",
+                  "N50": "N50", "GC(%)": "GC", "sum_n": "sum_n"}
+CHUNK_SIZE = 16 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+
+NL, CR, GT = ord('\n'), ord('\r'), ord('>')
+GC_BYTES = [ord(c) for c in "GCgcSs"]
+N_BYTES = [ord(c) for c in "Nn"]
+
+
+class FastaCounter:
+    """Incremental per-file state carried across chunk boundaries."""
+
+    def __init__(self):
+        self.at_line_start = True  # previous chunk ended with a newline
+        self.in_header = False     # previous chunk ended inside a header line
+        self.contig_open = False   # at least one header has been seen
+        self.cur_len = 0
+        self.lengths = []
+        self.counts = np.zeros(256, dtype=np.int64)
+
+    def update(self, arr: np.ndarray) -> None:
+        n = arr.size
+        if n == 0:
+            return
+        newlines = np.flatnonzero(arr == NL)
+        gt = np.flatnonzero(arr == GT)
+        if gt.size:
+            line_start = np.empty(gt.size, dtype=bool)
+            line_start[gt > 0] = arr[gt[gt > 0] - 1] == NL
+            line_start[gt == 0] = self.at_line_start
+            starts = gt[line_start]
+        else:
+            starts = gt
+
+        # header lines run from '>' to the next newline (or past the end of this chunk)
+        idx = np.searchsorted(newlines, starts)
+        ends = np.full(starts.size, n, dtype=np.int64)
+        ends[idx < newlines.size] = newlines[idx[idx < newlines.size]]
+        delta = np.zeros(n + 1, dtype=np.int8)
+        if self.in_header:
+            delta[0] += 1
+            delta[newlines[0] if newlines.size else n] -= 1
+        delta[starts] += 1
+        delta[ends] -= 1
+        header = np.cumsum(delta[:-1], dtype=np.int8) > 0
+        self.in_header = bool(starts.size and ends[-1] == n) or (self.in_header and not newlines.size)
+        self.at_line_start = bool(arr[-1] == NL)
+
+        seq = ~header & (arr != NL) & (arr != CR)
+        if not self.contig_open:
+            # bytes before the first header do not belong to any contig
+            seq[: starts[0] if starts.size else n] = False
+        self.counts += np.bincount(arr[seq], minlength=256)
+
+        if starts.size == 0:
+            self.cur_len += int(np.count_nonzero(seq))
+            return
+        segs = np.add.reduceat(seq, starts, dtype=np.int64)
+        if self.contig_open:
+            self.lengths.append(np.array([self.cur_len + np.count_nonzero(seq[: starts[0]])], dtype=np.int64))
+        self.lengths.append(segs[:-1])
+        self.cur_len = int(segs[-1])
+        self.contig_open = True
+
+    def result(self) -> dict:
+        lengths = self.lengths + ([np.array([self.cur_len], dtype=np.int64)] if self.contig_open else [])
+        lengths = np.concatenate(lengths) if lengths else np.array([], dtype=np.int64)
+        sum_len = int(lengths.sum())
+        n50 = 0
+        if sum_len:
+            desc = np.sort(lengths)[::-1]
+            n50 = int(desc[np.searchsorted(np.cumsum(desc), sum_len / 2)])
+        gc = int(self.counts[GC_BYTES].sum())
+        return {
+            "num_contigs": int(lengths.size),
+            "sum_len": sum_len,
+            "min_len": int(lengths.min()) if lengths.size else 0,
+            "max_len": int(lengths.max()) if lengths.size else 0,
+            "N50": n50,
+            "GC": f"{100 * gc / sum_len:.2f}" if sum_len else "0.00",
+            "sum_n": int(self.counts[N_BYTES].sum()),
+        }
+
+
+def open_fasta(path: str):
+    """Binary reader for a plain or gzip/bgzip-compressed FASTA (detected from the magic bytes)."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+
+def fasta_stats(path: str) -> dict:
+    counter = FastaCounter()
+    buf = bytearray(CHUNK_SIZE)
+    with open_fasta(path) as f:
+        while True:
+            size = f.readinto(buf)
+            if not size:
+                break
+            counter.update(np.frombuffer(buf, dtype=np.uint8, count=size))
+    return counter.result()
+
+
+def read_samples(mags_txt: Path) -> list[tuple[str, str]]:
+    with open(mags_txt) as f:
+        return [tuple(line.rstrip('\n').split('\t')[:2]) for line in f if line.strip()]
+
+
+def native_stats(samples: list[tuple[str, str]], threads: int):
+    paths = [path for _, path in samples]
+    threads = max(1, threads)
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        for (mag, _), stats in zip(samples, pool.map(fasta_stats, paths, chunksize=max(1, len(paths) // (threads * 8)))):
+            yield {"MAG": mag, **stats}
+
+
+def seqkit_stats(samples: list[tuple[str, str]], seqkit_dir: Path):
+    records = {}
+    for path in sorted(seqkit_dir.glob("*.seqkit.tsv")):
+        with open(path) as f:
+            for rec in csv.DictReader(f, delimiter='\t'):
+                records[rec["MAG"]] = rec
+    for mag, _ in samples:
+        row = {"MAG": mag}
+        rec = records.get(mag)
+        if rec:
+            row.update({new: rec.get(old, "") for old, new in SEQKIT_COLUMNS.items()})
+        yield row
+
+
+def main(mags_txt: Path, out_tsv: Path, threads: int, seqkit_dir: Path | None) -> None:
+    samples = read_samples(mags_txt)
+    rows = seqkit_stats(samples, seqkit_dir) if seqkit_dir else native_stats(samples, threads)
+    out_tsv.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_tsv, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=COLUMNS, delimiter='\t')
+        w.writeheader()
+        w.writerows(rows)
+    print(f"FASTA statistics written for {len(samples)} MAGs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-MAG FASTA statistics into one table")
+    parser.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file (MAG<TAB>path)")
+    parser.add_argument("--output", type=Path, required=True, help="Output TSV file")
+    parser.add_argument("--threads", type=int, default=1, help="Worker processes")
+    parser.add_argument("--seqkit-dir", type=Path, default=None, help="Collate the per-chunk seqkit TSVs instead of computing")
+    args = parser.parse_args()
+    main(args.mags, args.output, args.threads, args.seqkit_dir)
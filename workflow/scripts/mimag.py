@@ -1,78 +1,84 @@
 from __future__ import annotations
 
-import sys
-import csv
+import argparse
 from pathlib import Path
 
-# Usage: python mimag.py quality.tsv trna.tsv rrna.tsv out.tsv --mag MAG1 --method checkm2
+import numpy as np
+import pandas as pd
 
-"""MIMAG classification
+from checkm_table import load_checkm, read_mags
+from result_store import connect, export_rows, restore_counts
+
+# Usage: python mimag.py --mags input_MAGs.txt --quality checkm2_summary.tsv --store magport.sqlite --trna-dir 02_genes/trna \
+#            --rrna-dir 02_genes/rrna --output MIMAG_summary.tsv --method checkm2
+
+"""MIMAG classification (all MAGs in one pass)
 HQ: Completeness > 90, Contamination < 5, tRNA >= 18, rRNA has 5S,16S,23S
 MQ: Completeness >= 50, Contamination < 10
 LQ: else
 """
 
-def main(quality_tsv: Path, trna_tsv: Path, rrna_tsv: Path, out_tsv: Path, mag_name: str, method: str) -> None:
-    comp = cont = 0.0
-    trna_count = 0
-    has_5s = has_16s = has_23s = False
-    # quality
-    with open(quality_tsv) as f:
-        if method == "checkm2":
-            # For CheckM2, find the row with matching genome name
-            for row in csv.DictReader(f, delimiter='\t'):
-                if mag_name in row.get("Name", ""):
-                    print(f"found quality row for {mag_name}")
-                    comp = float(row.get("Completeness", 0) or 0)
-                    cont = float(row.get("Contamination", 0) or 0)
-                    break
-        else:  # checkm1
-            # For CheckM1, find the row with matching bin id
-            for row in csv.DictReader(f, delimiter='\t'):
-                if mag_name in row.get("Bin Id", ""):
-                    comp = float(row.get("Completeness", 0) or 0)
-                    cont = float(row.get("Contamination", 0) or 0)
-                    break
-    # trna
-    with open(trna_tsv) as f:
-        next(f)
-        line = f.readline().strip()
-        if line:
-            try:
-                trna_count = int(line.split('\t')[0])
-            except Exception:
-                trna_count = 0
-    # rrna counts
-    with open(rrna_tsv) as f:
-        next(f)
-        vals = f.readline().strip().split('\t') if f else ["0","0","0","0"]
-        try:
-            has_5s = int(vals[0]) > 0
-            has_16s = int(vals[1]) > 0
-            has_23s = int(vals[2]) > 0
-        except Exception:
-            pass
-    quality = "LQ"
-    if comp > 90 and cont < 5 and trna_count >= 18 and has_5s and has_16s and has_23s:
-        quality = "HQ"
-    elif comp >= 50 and cont < 10:
-        quality = "MQ"
+"""output sample
+MAG	MIMAG
+MAG1	MQ
+MAG209	MQ
+"""
+
+# HQ needs Completeness > HQ_COMPLETENESS and Contamination < HQ_CONTAMINATION; quality_gate.py
+# keeps tRNAscan-SE running for MAGs within these cutoffs, whose HQ call depends on the tRNA count
+HQ_COMPLETENESS = 90
+HQ_CONTAMINATION = 5
+
+
+def load_features(store: Path, mags: list[str], trna_dir: Path, rrna_dir: Path) -> pd.DataFrame:
+    """tRNA and rRNA counts per MAG from the result store, recounted from the tool outputs when the
+    store lacks them (0 when a count is still missing, e.g. a MAG skipped by the quality gate; the gate
+    only skips tRNAscan-SE for MAGs outside the HQ completeness/contamination cutoffs, so that 0 never
+    changes a level)."""
+    conn = connect(store)
+    restore_counts(conn, mags, {"trna": trna_dir, "rrna": rrna_dir})
+    rows = list(export_rows(conn, mags, ["ID", "num_tRNAs", "num_5S_rRNAs", "num_16S_rRNAs", "num_23S_rRNAs"]))
+    conn.close()
+    features = pd.DataFrame(rows, columns=["MAG", "tRNA", "5S", "16S", "23S"]).set_index("MAG")
+    return features.apply(pd.to_numeric, errors="coerce").fillna(0).astype(int)
+
+
+def classify(comp: np.ndarray, cont: np.ndarray, trna: np.ndarray,
+             has_5s: np.ndarray, has_16s: np.ndarray, has_23s: np.ndarray) -> np.ndarray:
+    hq = (comp > HQ_COMPLETENESS) & (cont < HQ_CONTAMINATION) & (trna >= 18) & has_5s & has_16s & has_23s
+    mq = (comp >= 50) & (cont < 10)
+    return np.select([hq, mq], ["HQ", "MQ"], default="LQ")
+
+
+def main(mags_txt: Path, quality_tsv: Path, store: Path, trna_dir: Path, rrna_dir: Path, out_tsv: Path,
+         method: str) -> None:
+    mags = read_mags(mags_txt)
+    quality = load_checkm(quality_tsv, method, mags)
+    features = load_features(store, mags, trna_dir, rrna_dir)
+    level = classify(
+        quality["Completeness"].to_numpy(dtype=float),
+        quality["Contamination"].to_numpy(dtype=float),
+        features["tRNA"].to_numpy(),
+        features["5S"].to_numpy() > 0,
+        features["16S"].to_numpy() > 0,
+        features["23S"].to_numpy() > 0,
+    )
+    out = pd.DataFrame({"MAG": mags, "MIMAG": level})
     out_tsv.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_tsv, 'w', newline='') as f:
-        w = csv.writer(f, delimiter='\t')
-        w.writerow(["MIMAG"])
-        w.writerow([quality])
-    print(f"MIMAG for {mag_name}: {quality} (comp={comp}, cont={cont}, tRNA={trna_count}, 5S={has_5s},16S={has_16s},23S={has_23s})")
+    out.to_csv(out_tsv, sep='\t', index=False)
+    counts = out["MIMAG"].value_counts()
+    print(f"MIMAG for {len(mags)} MAGs: " + ", ".join(f"{k}={counts.get(k, 0)}" for k in ["HQ", "MQ", "LQ"]))
+
 
 if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser(description="Classify MAG according to MIMAG standards")
-    parser.add_argument("quality_tsv", type=Path, help="CheckM quality TSV file")
-    parser.add_argument("trna_tsv", type=Path, help="tRNA results TSV file")
-    parser.add_argument("rrna_tsv", type=Path, help="rRNA results TSV file")
-    parser.add_argument("out_tsv", type=Path, help="Output TSV file")
-    parser.add_argument("--mag", required=True, help="MAG name to process")
+    parser = argparse.ArgumentParser(description="Classify MAGs according to MIMAG standards")
+    parser.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    parser.add_argument("--quality", type=Path, required=True, help="CheckM quality TSV file")
+    parser.add_argument("--store", type=Path, required=True, help="Result store (magport.sqlite) with the tRNA/rRNA counts")
+    parser.add_argument("--trna-dir", type=Path, required=True, help="tRNAscan-SE output directory ({MAG}.trnascan.txt)")
+    parser.add_argument("--rrna-dir", type=Path, required=True, help="barrnap output directory ({MAG}.rRNA.gff)")
+    parser.add_argument("--output", type=Path, required=True, help="Output TSV file")
     parser.add_argument("--method", choices=["checkm1", "checkm2"], default="checkm2", help="CheckM version used")
     args = parser.parse_args()
-    
-    main(args.quality_tsv, args.trna_tsv, args.rrna_tsv, args.out_tsv, args.mag, args.method)
+
+    main(args.mags, args.quality, args.store, args.trna_dir, args.rrna_dir, args.output, args.method)
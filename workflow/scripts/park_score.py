@@ -1,25 +1,28 @@
 from __future__ import annotations
 
 from pathlib import Path
-import csv
 import argparse
 
-# Usage: python park_score.py stats.tsv quality.tsv out.tsv --mag MAG1 --method checkm2
+import numpy as np
+import pandas as pd
+
+from checkm_table import load_checkm, read_mags
+
+# Usage: python park_score.py --mags input_MAGs.txt --stats stats_summary.tsv --quality checkm2_summary.tsv --output park_summary.tsv --method checkm2
 
 """
-Compute Park score:
+Compute Park score for all MAGs in one pass:
 Score = Completeness - (5 * Contamination) - (5 * num_contigs / 100) - (5 * amb_bases / 100000)
-Inputs: join from stats and checkm outputs.
+Inputs: join from stats and checkm outputs, indexed by exact MAG ID.
 
-Completeness: checkm2 column 2, checkm1 column 6
-Contamination: checkm2 column 3, checkm1 column 7
-num_contigs: seqkit column 5
-amb_bases: seqkit column 20
+Completeness / Contamination: checkm2 "Name" rows, checkm1 "Bin Id" rows
+num_contigs: stats_summary.tsv column "num_contigs"
+amb_bases: stats_summary.tsv column "sum_n"
 """
 
 """stats_tsv sample
-MAG	file	format	type	num_seqs	sum_len	min_len	avg_len	max_len	Q1	Q2	Q3	sum_gap	N50	N50_num	Q20(%)	Q30(%)	AvgQual	GC(%)	sum_n
-MAG1	/mnt/hpccs01/work/microbiome/users/heyu/MAGport/test/test_input_MAGs/MAG1.fna	FASTA	DNA	28	903669	1924	32273.9	189547	5686	14622	43754	0	68826	4	0	0	0	38.27	0
+MAG	num_contigs	sum_len	min_len	max_len	N50	GC	sum_n
+MAG1	28	903669	1924	189547	68826	38.27	0
 """
 
 """checkm2 sample
@@ -35,76 +38,48 @@ Methanoperedens	p__Euryarchaeota (UID49)	95	228	153	99.67	0.65	0	3117687	1	60	60
 v-ANME2d	p__Euryarchaeota (UID49)	95	228	153	99.67	0.65	0	3042452	0	73	73	64364	64364	41677	41677	173556	173556	43.3	1.39	88.82	11	3282	1	226	1	0	0	0
 """
 
-def main(stats_tsv: Path, quality_tsv: Path, out_tsv: Path, mag_name: str, method: str) -> None:
-    metrics = {"num_contigs": 0, "amb_bases": 0}
-    comp = 0.0
-    cont = 0.0
-    # Parse seqkit stats row: mag,readable headers unknown; detect Ns and contigs
-    with open(stats_tsv) as f:
-        rdr = csv.reader(f, delimiter='\t')
-        header = next(rdr, None)
-        row = next(rdr, None)
-        # Try to infer number of sequences/contigs and N count from seqkit output order
-        # Expected columns after prepend: mag, file, format, type, num_seqs, sum_len, min_len, avg_len, max_len, Q1, N50, Q3, GC, N%
-
-        # park_score.py (rewritten per user prompt)
+"""output sample
+MAG	park_score
+MAG1	92.550
+MAG209	69.860
+"""
 
 
-def parse_seqkit(stats_tsv: Path) -> tuple[int, int]:
-    """
-    Extract num_contigs (column 5) and amb_bases (column 20) from seqkit TSV.
-    """
-    with open(stats_tsv) as f:
-        rdr = csv.reader(f, delimiter='\t')
-        header = next(rdr)
-        row = next(rdr)
-        num_contigs = int(row[4]) if len(row) > 4 else 0
-        amb_bases = int(row[19]) if len(row) > 19 else 0
-        print(f"seqkit stats: num_contigs={num_contigs}, amb_bases={amb_bases}")
-    return num_contigs, amb_bases
-
-def parse_checkm(quality_tsv: Path, mag_name: str, method: str) -> tuple[float, float]:
+def load_stats(stats_tsv: Path, mags: list[str]) -> pd.DataFrame:
     """
-    Extract Completeness and Contamination from checkm output.
-    checkm2: columns 2,3; checkm1: columns 6,7
+    Collect num_contigs and amb_bases from the consolidated stats table, by column name.
     """
-    with open(quality_tsv) as f:
-        rdr = csv.reader(f, delimiter='\t')
-        header = next(rdr)
-        for row in rdr:
-            if method == "checkm2":
-                # Completeness: col 2, Contamination: col 3
-                if row[0] == mag_name and len(row) > 3:
-                    comp = float(row[1])
-                    cont = float(row[2])
-                    print(f"quality for {mag_name}: comp={comp}, cont={cont}")
-                    return comp, cont
-            else:
-                # Completeness: col 6, Contamination: col 7
-                if row[0] == mag_name and len(row) > 7:
-                    comp = float(row[5])
-                    cont = float(row[6])
-                    print(f"quality for {mag_name}: comp={comp}, cont={cont}")
-                    return comp, cont
-    return 0.0, 0.0
-
-def main(stats_tsv: Path, quality_tsv: Path, out_tsv: Path, mag_name: str, method: str) -> None:
-    num_contigs, amb_bases = parse_seqkit(stats_tsv)
-    comp, cont = parse_checkm(quality_tsv, mag_name, method)
-    score = comp - (5 * cont) - (5 * num_contigs / 100) - (5 * amb_bases / 100000)
-    print(f"Park score for {mag_name}: {score:.3f}")
+    df = pd.read_csv(stats_tsv, sep='\t', usecols=["MAG", "num_contigs", "sum_n"], dtype={"MAG": str})
+    df = df.rename(columns={"sum_n": "amb_bases"}).drop_duplicates(subset="MAG").set_index("MAG")
+    return df.apply(pd.to_numeric, errors="coerce").reindex(mags).fillna(0)
+
+
+def park_scores(comp: np.ndarray, cont: np.ndarray, num_contigs: np.ndarray, amb_bases: np.ndarray) -> np.ndarray:
+    return comp - (5 * cont) - (5 * num_contigs / 100) - (5 * amb_bases / 100000)
+
+
+def main(mags_txt: Path, stats_tsv: Path, quality_tsv: Path, out_tsv: Path, method: str) -> None:
+    mags = read_mags(mags_txt)
+    quality = load_checkm(quality_tsv, method, mags)
+    stats = load_stats(stats_tsv, mags)
+    score = park_scores(
+        quality["Completeness"].to_numpy(dtype=float),
+        quality["Contamination"].to_numpy(dtype=float),
+        stats["num_contigs"].to_numpy(dtype=float),
+        stats["amb_bases"].to_numpy(dtype=float),
+    )
+    out = pd.DataFrame({"MAG": mags, "park_score": np.char.mod("%.3f", score)})
     out_tsv.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_tsv, 'w', newline='') as f:
-        w = csv.writer(f, delimiter='\t')
-        w.writerow(["park_score"])
-        w.writerow([f"{score:.3f}"])
+    out.to_csv(out_tsv, sep='\t', index=False)
+    print(f"Park score computed for {len(mags)} MAGs")
+
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Compute Park score for a MAG")
-    parser.add_argument("stats_tsv", type=Path, help="Seqkit stats TSV file")
-    parser.add_argument("quality_tsv", type=Path, help="CheckM quality TSV file")
-    parser.add_argument("out_tsv", type=Path, help="Output TSV file")
-    parser.add_argument("--mag", required=True, help="MAG name to process")
+    parser = argparse.ArgumentParser(description="Compute Park scores for all MAGs")
+    parser.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    parser.add_argument("--stats", type=Path, required=True, help="Consolidated stats TSV file (stats_summary.tsv)")
+    parser.add_argument("--quality", type=Path, required=True, help="CheckM quality TSV file")
+    parser.add_argument("--output", type=Path, required=True, help="Output TSV file")
     parser.add_argument("--method", choices=["checkm1", "checkm2"], default="checkm2", help="CheckM version used")
     args = parser.parse_args()
-    main(args.stats_tsv, args.quality_tsv, args.out_tsv, args.mag, args.method)
+    main(args.mags, args.stats, args.quality, args.output, args.method)
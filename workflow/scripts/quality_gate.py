@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import argparse
+import csv
+from pathlib import Path
+
+from checkm_table import load_checkm, read_mags
+from mimag import HQ_COMPLETENESS, HQ_CONTAMINATION
+from result_store import SKIPPED
+
+# Usage: python quality_gate.py --mags input_MAGs.txt --quality checkm2_summary.tsv --method checkm2 \
+#            --min-completeness 50 --max-contamination 10 --output gate.tsv
+
+"""Quality gate for tiered runs (quality_gate: true)
+Marks every MAG of input_MAGs.txt as "passed" (Completeness >= --min-completeness and
+Contamination < --max-contamination) or "skipped_by_gate" from the CheckM table, read like
+park_score.py and mimag.py do (first row per MAG, 0 for MAGs without a row). The expensive
+modules (GUNC, GTDB-Tk, tRNAscan-SE, 16S BLAST) read this table and only run on passed MAGs;
+the summary shows "skipped_by_gate" for their fields.
+
+The mimag_hq column marks MAGs within the MIMAG high-quality completeness/contamination cutoffs.
+tRNAscan-SE still runs on them when they fail a stricter gate, since their MIMAG level depends
+on the tRNA count.
+"""
+
+"""gate.tsv sample output
+MAG	Completeness	Contamination	gate	mimag_hq
+MAG1	99.82	0.31	passed	yes
+MAG2	12.4	1.2	skipped_by_gate	no
+"""
+
+PASSED = "passed"
+
+
+def gate(completeness: float, contamination: float, min_completeness: float, max_contamination: float) -> str:
+    """
+    Example:
+        gate(62.73, 8.44, 50, 10) -> "passed"
+        gate(55.82, 11.31, 50, 10) -> "skipped_by_gate"
+    """
+    return PASSED if completeness >= min_completeness and contamination < max_contamination else SKIPPED
+
+
+def main(args) -> None:
+    mags = read_mags(args.mags)
+    quality = load_checkm(args.quality, args.method, mags)
+    passed = 0
+    with open(args.output, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t', lineterminator='\n')
+        w.writerow(["MAG", "Completeness", "Contamination", "gate", "mimag_hq"])
+        for mag, comp, cont in zip(mags, quality["Completeness"].tolist(), quality["Contamination"].tolist()):
+            status = gate(comp, cont, args.min_completeness, args.max_contamination)
+            passed += status == PASSED
+            hq = comp > HQ_COMPLETENESS and cont < HQ_CONTAMINATION
+            w.writerow([mag, comp, cont, status, "yes" if hq else "no"])
+    print(f"[MAGport] Quality gate (Completeness >= {args.min_completeness}, Contamination < "
+          f"{args.max_contamination}): {passed} MAGs passed, {len(mags) - passed} skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split MAGs into passed/skipped by CheckM completeness and contamination")
+    parser.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    parser.add_argument("--quality", type=Path, required=True, help="CheckM summary TSV file")
+    parser.add_argument("--method", choices=["checkm1", "checkm2"], required=True, help="CheckM version used")
+    parser.add_argument("--min-completeness", type=float, default=50.0, help="Minimum completeness (%%) to pass")
+    parser.add_argument("--max-contamination", type=float, default=10.0, help="Contamination (%%) must be below this")
+    parser.add_argument("--output", type=Path, required=True, help="Output gate.tsv")
+    main(parser.parse_args())
@@ -1,4 +1,216 @@
-# This script will be implemented in the future
-# Planned function: 
-#  1. read summary.tsv and covert to json format
-#  2. insert data into HTML report template and generate report.html
\ No newline at end of file
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# Usage: python report.py MAGport_summary.tsv MAGport_report.html "MAGport Report" /path/to/input_MAGs
+
+"""Interactive HTML report for MAGport_summary.tsv
+The summary is streamed in CHUNK_ROWS blocks into per-column arrays (no per-row dicts).
+Every plot is pre-aggregated here: histograms, MIMAG/GUNC counts, GTDB rank counts and the
+completeness/contamination scatter, which is binned into a 2D histogram above
+SCATTER_MAX_POINTS MAGs. The table is embedded as columnar JSON (string columns with few
+distinct values are dictionary-encoded) and rendered one page at a time in the browser,
+so a 100k-MAG report stays small and loads in seconds.
+"""
+
+"""payload sample (table part)
+{"n": 3, "columns": [
+  {"name": "ID", "t": "s", "v": ["GCF_024346955.1_vmangrovi", "MAG1", "MAG209"]},
+  {"name": "N50", "t": "n", "v": [3674542, 68826, 10236]},
+  {"name": "MIMAG_level", "t": "d", "k": ["HQ", "MQ"], "v": [0, 1, 1]}]}
+"""
+
+CHUNK_ROWS = 50_000
+SCATTER_MAX_POINTS = 5_000
+SCATTER_BINS = 100
+HIST_BINS = 40
+TOP_TAXA = 20
+TOP_PHYLA_COLORS = 10
+DICT_MAX_RATIO = 0.5  # dictionary-encode string columns with at most n * ratio distinct values
+FLOAT_DIGITS = 4
+
+RANKS = [("d__", "Domain"), ("p__", "Phylum"), ("c__", "Class"), ("o__", "Order"),
+         ("f__", "Family"), ("g__", "Genus"), ("s__", "Species")]
+HISTOGRAMS = [  # column, axis title, scale factor, log10 bins
+    ("genome_size_bp", "Genome size (Mb)", 1e-6, False),
+    ("N50", "N50 (log10 bp)", 1.0, True),
+    ("GC", "GC (%)", 1.0, False),
+    ("Completeness", "Completeness (%)", 1.0, False),
+    ("Contamination", "Contamination (%)", 1.0, False),
+]
+RADAR_FIELDS = ["Completeness", "Contamination", "GC", "num_16S_rRNAs", "num_tRNAs"]
+MIMAG_ORDER = ["HQ", "MQ", "LQ"]
+TAXONOMY_COL = "GTDB_taxonomy"
+GUNC_COLS = ["pass_GUNC", "GUNC_status"]
+
+
+def read_columns(summary_tsv: Path) -> dict[str, pd.Series]:
+    """Stream the summary in chunks into one string Series per column."""
+    parts: dict[str, list[pd.Series]] = {}
+    for chunk in pd.read_csv(summary_tsv, sep='\t', dtype=str, keep_default_na=False, chunksize=CHUNK_ROWS):
+        for col in chunk.columns:
+            parts.setdefault(col, []).append(chunk[col])
+    return {col: pd.concat(series, ignore_index=True) for col, series in parts.items()}
+
+
+def numeric(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+
+
+def numeric_column(series: pd.Series) -> np.ndarray | None:
+    """Float values if every non-empty cell is a finite number, else None (checked on a sample first)."""
+    filled = series.str.len().to_numpy() > 0
+    if not filled.any() or not np.isfinite(numeric(series[filled].head(1000))).all():
+        return None
+    values = numeric(series)
+    return values if np.isfinite(values[filled]).all() else None
+
+
+def encode_column(name: str, series: pd.Series, values: np.ndarray | None) -> dict:
+    """Columnar JSON for one column: numbers, dictionary codes or plain strings."""
+    if values is not None:
+        filled = series.str.len().to_numpy() > 0
+        integral = np.all(np.mod(values[filled], 1) == 0)
+        v = (np.nan_to_num(values).astype(np.int64) if integral else np.round(values, FLOAT_DIGITS)).astype(object)
+        v[~filled] = None
+        return {"name": name, "t": "n", "v": v.tolist()}
+    codes, uniques = pd.factorize(series, sort=True)
+    if len(uniques) <= max(1, len(series) * DICT_MAX_RATIO):
+        return {"name": name, "t": "d", "k": uniques.tolist(), "v": codes.tolist()}
+    return {"name": name, "t": "s", "v": series.tolist()}
+
+
+def histogram(values: np.ndarray, scale: float, log: bool) -> dict | None:
+    values = values[np.isfinite(values)] * scale
+    if log:
+        values = np.log10(values[values > 0])
+    if values.size == 0:
+        return None
+    counts, edges = np.histogram(values, bins=HIST_BINS)
+    return {"edges": np.round(edges, FLOAT_DIGITS).tolist(), "counts": counts.tolist()}
+
+
+def category_counts(series: pd.Series, order: list[str] | None = None) -> dict:
+    counts = series.replace("", "NA").value_counts()
+    labels = [k for k in order if k in counts.index] if order else []
+    labels += [k for k in counts.index if k not in labels]
+    return {"labels": labels, "values": [int(counts[k]) for k in labels]}
+
+
+def gunc_label(series: pd.Series) -> pd.Series:
+    lowered = series.str.strip().str.lower()
+    return pd.Series(np.select([lowered.isin(["true", "1"]), lowered.isin(["false", "0"])], ["True", "False"], "NA"))
+
+
+def taxon_at(taxonomy: str, prefix: str) -> str:
+    for part in taxonomy.split(';'):
+        part = part.strip()
+        if part.startswith(prefix):
+            return part[len(prefix):] or "Unclassified"
+    return "Unclassified"
+
+
+def rank_counts(taxonomy: pd.Series) -> dict:
+    """Top taxa per GTDB rank, counted over the distinct lineages only."""
+    codes, uniques = pd.factorize(taxonomy)
+    per_lineage = pd.Series(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+    lineages = pd.Series(uniques, dtype=str)
+    ranks = {}
+    for prefix, rank in RANKS:
+        taxa = lineages.str.extract(rf"(?:^|;)\s*{prefix}([^;]*)", expand=False).str.strip()
+        taxa = taxa.fillna("").replace("", "Unclassified").where(lineages != "", "Unassigned")
+        top = per_lineage.groupby(taxa.to_numpy()).sum().sort_values(ascending=False, kind="stable").head(TOP_TAXA)
+        ranks[rank] = {"prefix": prefix, "labels": top.index.tolist(), "values": [int(v) for v in top]}
+    return ranks
+
+
+def scatter(comp: np.ndarray, cont: np.ndarray, ids: pd.Series, taxonomy: pd.Series | None) -> dict | None:
+    ok = np.isfinite(comp) & np.isfinite(cont)
+    if not ok.any():
+        return None
+    if ok.sum() > SCATTER_MAX_POINTS:
+        x_max = max(10.0, float(np.nanpercentile(cont[ok], 99.5)))
+        z, x_edges, y_edges = np.histogram2d(np.clip(cont[ok], 0, x_max), comp[ok], bins=SCATTER_BINS,
+                                             range=[[0, x_max], [0, 100]])
+        return {"mode": "binned",
+                "x": np.round((x_edges[:-1] + x_edges[1:]) / 2, 3).tolist(),
+                "y": np.round((y_edges[:-1] + y_edges[1:]) / 2, 3).tolist(),
+                "z": z.T.astype(int).tolist()}
+
+    rows = np.flatnonzero(ok)
+    phyla = (taxonomy.map(lambda t: taxon_at(t, "p__") if t else "Unassigned") if taxonomy is not None
+             else pd.Series(["NA"] * len(ids)))
+    top = phyla.iloc[rows].value_counts().index[:TOP_PHYLA_COLORS].tolist()
+    groups = phyla.where(phyla.isin(top), "Other").iloc[rows]
+    traces = []
+    for name in top + ["Other"]:
+        sel = rows[(groups == name).to_numpy()]
+        if sel.size:
+            traces.append({"name": name, "x": cont[sel].round(2).tolist(), "y": comp[sel].round(2).tolist(),
+                           "rows": sel.tolist(), "text": ids.iloc[sel].tolist()})
+    return {"mode": "points", "traces": traces}
+
+
+def build_payload(columns: dict[str, pd.Series]) -> dict:
+    n = len(next(iter(columns.values()))) if columns else 0
+    values = {name: numeric_column(series) for name, series in columns.items()}
+    id_col = next(iter(columns), "ID")
+    plots: dict = {"histograms": [], "radar": None}
+
+    mimag = columns.get("MIMAG_level")
+    if mimag is not None and n:
+        plots["mimag"] = {"column": "MIMAG_level", **category_counts(mimag, MIMAG_ORDER)}
+    gunc_col = next((c for c in GUNC_COLS if c in columns), None)
+    if gunc_col and n:
+        plots["gunc"] = {"column": gunc_col, **category_counts(gunc_label(columns[gunc_col]), ["True", "False"])}
+
+    taxonomy = columns.get(TAXONOMY_COL)
+    if taxonomy is not None and n:
+        plots["ranks"] = rank_counts(taxonomy)
+    if "Completeness" in columns and "Contamination" in columns:
+        plots["scatter"] = scatter(numeric(columns["Completeness"]), numeric(columns["Contamination"]),
+                                   columns[id_col], taxonomy)
+
+    for col, title, scale, log in HISTOGRAMS:
+        if col in columns:
+            hist = histogram(numeric(columns[col]), scale, log)
+            if hist:
+                plots["histograms"].append({"column": col, "title": title, **hist})
+
+    fields = [f for f in RADAR_FIELDS if f in columns]
+    if fields and n:
+        means = [numeric(columns[f]) for f in fields]
+        means = [float(np.nanmean(v)) if np.isfinite(v).any() else 0.0 for v in means]
+        plots["radar"] = {"fields": fields, "means": [round(m, 3) for m in means]}
+
+    table = {"n": n, "columns": [encode_column(name, series, values[name]) for name, series in columns.items()]}
+    return {"plots": plots, "table": table}
+
+
+def main(summary_tsv: Path, out_html: Path, title: str, input_dir: str) -> None:
+    columns = read_columns(summary_tsv)
+    payload = build_payload(columns)
+    env = Environment(loader=FileSystemLoader(str(Path(__file__).parent)), autoescape=select_autoescape(["html"]))
+    template = env.get_template("report_template.html")
+    # JSON goes into a <script type="application/json"> block: only "</" needs escaping
+    data = json.dumps(payload, separators=(',', ':'), allow_nan=False).replace("</", "<\\/")
+    out_html.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_html, 'w', encoding='utf-8') as f:
+        f.write(template.render(title=title, n_mag=payload["table"]["n"], input_dir=input_dir, data=data))
+    print(f"Report for {payload['table']['n']} MAGs written to {out_html} ({out_html.stat().st_size / 1024 ** 2:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the MAGport HTML report from the summary table")
+    parser.add_argument("input", type=Path, help="MAGport_summary.tsv")
+    parser.add_argument("output", type=Path, help="Output HTML file")
+    parser.add_argument("title", nargs="?", default="MAGport Report", help="Report title")
+    parser.add_argument("input_dir", nargs="?", default="", help="Input MAG directory shown in the header")
+    args = parser.parse_args()
+    main(args.input, args.output, args.title, args.input_dir)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import os
+import time
+from pathlib import Path
+
+# Usage:
+#   python result_cache.py lookup --tool checkm2 --tool-version "1.0.2" --db uniref100.KO.1.dmnd --cache-dir /shared/magport_cache \
+#          --mags input_MAGs.txt --inputs-dir 02_genes/orfs --suffix .faa --staging checkm2_input --state checkm2_cache.tsv \
+#          [--batch-size 500 --batch-index 3] [--clusters 00_dedup/clusters.tsv] [--gate 03_quality/gate/gate.tsv]
+#   python result_cache.py store --state checkm2_cache.tsv --cache-dir /shared/magport_cache --tool checkm2 \
+#          --key-column Name --results quality_report.tsv --output checkm2_summary.tsv
+#   python result_cache.py evict --cache-dir /shared/magport_cache --max-gb 50 --max-age-days 180
+
+"""Content-addressed result cache for the all-MAG tools (CheckM2, GUNC, GTDB-Tk)
+Every MAG row is cached under sha256(tool, tool version, database fingerprint, sha256 of the
+tool input), so renamed copies and other projects sharing the cache directory reuse results.
+The tool input is the file that gets staged: {MAG}{suffix} from --inputs-dir (the Prodigal
+proteins of CheckM2 and GUNC), else the MAG FASTA.
+
+lookup: hash every MAG, symlink only the cache misses into a staging directory for the tool
+        and record MAG -> key -> hit/miss in a state file
+store:  cache the fresh rows from the tool output and merge them with the cached rows into
+        the usual summary table (MAG order of input_MAGs.txt, key column renamed to the MAG ID);
+        fails when a hit was evicted in the meantime, so the rerun stages that MAG as a miss
+evict:  drop entries older than --max-age-days, then least recently used ones until the cache
+        is below --max-gb
+
+An empty --cache-dir disables caching: every MAG is a miss and store is a plain pass-through.
+With --clusters (dedup.py), MAGs that are not their cluster's representative are neither hashed
+nor staged (status "member"); their rows are copied from the representative when the batch
+tables are gathered. With --gate (quality_gate.py), MAGs that failed the quality gate are skipped
+the same way (status "gated") and get no row at all.
+"""
+
+"""cache layout
+{cache_dir}/{tool}/{key[:2]}/{key}.tsv   header + one result row
+"""
+
+HASH_BLOCK = 4 * 1024 * 1024
+
+
+def read_samples(mags_txt: Path) -> list[tuple[str, str]]:
+    with open(mags_txt) as f:
+        return [tuple(line.rstrip('\n').split('\t')[:2]) for line in f if line.strip()]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def db_fingerprint(db: str) -> str:
+    """Location-independent database identity: file names and sizes (plus GTDB-Tk metadata)."""
+    path = Path(db)
+    if not path.exists():
+        return path.name
+    if path.is_file():
+        return f"{path.name}:{path.stat().st_size}"
+    parts = sorted(f"{p.name}:{p.stat().st_size if p.is_file() else 'dir'}" for p in path.iterdir())
+    metadata = path / "metadata" / "metadata.txt"
+    if metadata.is_file():
+        parts.append(metadata.read_text())
+    return "\n".join(parts)
+
+
+def load_hash_memo(memo: Path) -> dict:
+    """Content hashes from previous runs, keyed by (path, size, mtime_ns)."""
+    data = {}
+    if memo.exists():
+        with open(memo) as f:
+            for row in csv.reader(f, delimiter='\t'):
+                if len(row) == 4:
+                    data[(row[0], row[1], row[2])] = row[3]
+    return data
+
+
+def save_hash_memo(memo: Path, data: dict) -> None:
+    tmp = memo.with_name(memo.name + f".tmp.{os.getpid()}")
+    with open(tmp, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t', lineterminator='\n')
+        for (path, size, mtime), digest in data.items():
+            w.writerow([path, size, mtime, digest])
+    os.replace(tmp, memo)
+
+
+def entry_path(cache_dir: Path, tool: str, key: str) -> Path:
+    return cache_dir / tool / key[:2] / f"{key}.tsv"
+
+
+def select_batch(samples: list[tuple[str, str]], size: int, index: int) -> list[tuple[str, str]]:
+    """Same deterministic shards as the Snakefile: sorted MAG IDs cut into runs of `size`."""
+    samples = sorted(samples)
+    return samples[index * size:(index + 1) * size] if size > 0 else samples
+
+
+def lookup(args) -> None:
+    samples = select_batch(read_samples(args.mags), args.batch_size, args.batch_index)
+    cache_dir = Path(args.cache_dir) if args.cache_dir else None
+    salt = "\0".join([args.tool, args.tool_version.strip(), db_fingerprint(args.db)])
+    memo_path = args.state.with_name(args.state.name + ".hashes")
+    memo = load_hash_memo(memo_path) if cache_dir else {}
+
+    if args.staging.exists():
+        for link in args.staging.iterdir():
+            link.unlink()
+    args.staging.mkdir(parents=True, exist_ok=True)
+
+    clusters = {}
+    if args.clusters:
+        with open(args.clusters, newline='') as f:
+            clusters = {row["MAG"]: row["representative"] for row in csv.DictReader(f, delimiter='\t')}
+
+    gated = set()
+    if args.gate:
+        with open(args.gate, newline='') as f:
+            gated = {row["MAG"] for row in csv.DictReader(f, delimiter='\t') if row["gate"] != "passed"}
+
+    hits = members = skipped = 0
+    with open(args.state, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t', lineterminator='\n')
+        w.writerow(["MAG", "key", "status"])
+        for mag, fasta in samples:
+            key, status = "", "miss"
+            if mag in gated:
+                w.writerow([mag, key, "gated"])
+                skipped += 1
+                continue
+            if clusters.get(mag, mag) != mag:
+                w.writerow([mag, key, "member"])
+                members += 1
+                continue
+            # the file the tool reads: the Prodigal proteins for CheckM2/GUNC, so different gene calls
+            # (another Prodigal version, sharded calling) never share an entry
+            src = Path(args.inputs_dir) / f"{mag}{args.suffix}" if args.inputs_dir else Path(fasta)
+            if cache_dir:
+                st = os.stat(src)
+                memo_key = (str(src), str(st.st_size), str(st.st_mtime_ns))
+                if memo_key not in memo:
+                    memo[memo_key] = file_sha256(src)
+                key = hashlib.sha256(f"{salt}\0{memo[memo_key]}".encode()).hexdigest()
+                entry = entry_path(cache_dir, args.tool, key)
+                if entry.exists():
+                    os.utime(entry)  # keeps eviction least-recently-used
+                    status = "hit"
+                    hits += 1
+            if status == "miss":
+                os.symlink(src.resolve(), args.staging / f"{mag}{args.suffix}")
+            w.writerow([mag, key, status])
+    if cache_dir:
+        save_hash_memo(memo_path, memo)
+    print(f"[MAGport] {args.tool} cache: {hits} hits, {len(samples) - hits - members - skipped} MAGs to run"
+          + (f", {members} duplicates skipped" if members else "")
+          + (f", {skipped} skipped by the quality gate" if skipped else ""))
+
+
+def read_table(path: Path) -> tuple[list[str], list[dict]]:
+    if not path.exists() or path.stat().st_size == 0:
+        return [], []
+    with open(path, newline='') as f:
+        rdr = csv.DictReader(f, delimiter='\t')
+        return list(rdr.fieldnames or []), list(rdr)
+
+
+def write_entry(path: Path, header: list[str], row: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".tmp.{os.getpid()}")
+    with open(tmp, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=header, delimiter='\t', lineterminator='\n', extrasaction='ignore')
+        w.writeheader()
+        w.writerow(row)
+    os.replace(tmp, path)
+
+
+def store(args) -> None:
+    cache_dir = Path(args.cache_dir) if args.cache_dir else None
+    header, fresh_rows = read_table(args.results)
+    fresh = {row.get(args.key_column): row for row in fresh_rows}
+    with open(args.state) as f:
+        state = list(csv.DictReader(f, delimiter='\t'))
+
+    rows, stored, lost = [], 0, []
+    for rec in state:
+        mag, key = rec["MAG"], rec["key"]
+        if rec["status"] == "hit":
+            entry_header, entry_rows = read_table(entry_path(cache_dir, args.tool, key))
+            if not entry_rows:
+                # evicted (or truncated) since lookup: the MAG was not staged, so the tool has no row for it
+                lost.append(mag)
+                continue
+            header = header or entry_header
+            row = entry_rows[0]
+        elif mag in fresh:
+            row = fresh[mag]
+            if cache_dir and key:
+                write_entry(entry_path(cache_dir, args.tool, key), header, row)
+                stored += 1
+        else:
+            continue
+        row[args.key_column] = mag
+        rows.append(row)
+    if lost:
+        raise SystemExit(f"[MAGport] Error: {args.tool} cache entries of {len(lost)} MAGs ({', '.join(lost[:5])}"
+                         f"{', ...' if len(lost) > 5 else ''}) disappeared from {cache_dir} after lookup; "
+                         f"rerun the job to recompute them")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', newline='') as f:
+        if header:
+            w = csv.DictWriter(f, fieldnames=header, delimiter='\t', lineterminator='\n', extrasaction='ignore')
+            w.writeheader()
+            w.writerows(rows)
+    print(f"[MAGport] {args.tool}: {len(rows)} rows written to {args.output} ({stored} newly cached)")
+
+
+def evict(args) -> None:
+    entries = []
+    for root, _, files in os.walk(args.cache_dir):
+        for name in files:
+            if name.endswith(".tsv"):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = freed = 0
+    for mtime, size, path in entries:
+        too_old = args.max_age_days is not None and now - mtime > args.max_age_days * 86400
+        too_big = args.max_gb is not None and total > args.max_gb * 1024 ** 3
+        if not (too_old or too_big):
+            continue
+        os.remove(path)
+        total -= size
+        freed += size
+        removed += 1
+    print(f"[MAGport] Evicted {removed} of {len(entries)} cache entries ({freed / 1024 ** 2:.1f} MB freed, "
+          f"{total / 1024 ** 2:.1f} MB kept)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed result cache for CheckM2, GUNC and GTDB-Tk")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_lookup = sub.add_parser("lookup", help="Find cached MAGs and stage the misses for the tool")
+    p_lookup.add_argument("--tool", required=True, help="Tool name (checkm2, gunc, gtdbtk)")
+    p_lookup.add_argument("--tool-version", default="", help="Tool version string")
+    p_lookup.add_argument("--db", required=True, help="Database file or directory used by the tool")
+    p_lookup.add_argument("--cache-dir", default="", help="Cache directory (empty: caching disabled)")
+    p_lookup.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file (MAG<TAB>path)")
+    p_lookup.add_argument("--inputs-dir", default="", help="Directory with the tool inputs (default: the MAG FASTA)")
+    p_lookup.add_argument("--suffix", required=True, help="Suffix of the staged tool inputs (e.g. .faa)")
+    p_lookup.add_argument("--staging", type=Path, required=True, help="Directory for symlinks to the cache misses")
+    p_lookup.add_argument("--state", type=Path, required=True, help="Output state TSV (MAG, key, status)")
+    p_lookup.add_argument("--batch-size", type=int, default=0, help="Shard size used by the workflow (0: all MAGs)")
+    p_lookup.add_argument("--batch-index", type=int, default=0, help="Shard to process")
+    p_lookup.add_argument("--clusters", type=Path, default=None, help="clusters.tsv of dedup.py: stage representatives only")
+    p_lookup.add_argument("--gate", type=Path, default=None, help="gate.tsv of quality_gate.py: stage passed MAGs only")
+
+    p_store = sub.add_parser("store", help="Cache fresh rows and write the merged summary table")
+    p_store.add_argument("--tool", required=True, help="Tool name (checkm2, gunc, gtdbtk)")
+    p_store.add_argument("--cache-dir", default="", help="Cache directory (empty: caching disabled)")
+    p_store.add_argument("--state", type=Path, required=True, help="State TSV written by lookup")
+    p_store.add_argument("--key-column", required=True, help="Column holding the MAG ID in the tool output")
+    p_store.add_argument("--results", type=Path, required=True, help="Tool output table for the cache misses")
+    p_store.add_argument("--output", type=Path, required=True, help="Merged summary TSV")
+
+    p_evict = sub.add_parser("evict", help="Remove old or least recently used cache entries")
+    p_evict.add_argument("--cache-dir", required=True, help="Cache directory")
+    p_evict.add_argument("--max-gb", type=float, default=None, help="Keep the cache below this size")
+    p_evict.add_argument("--max-age-days", type=float, default=None, help="Drop entries unused for this many days")
+
+    args = parser.parse_args()
+    {"lookup": lookup, "store": store, "evict": evict}[args.command](args)
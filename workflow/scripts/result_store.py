@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+import argparse
+import ast
+import csv
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# Usage:
+#   python result_store.py put --db magport.sqlite --id MAG1 num_ORFs=3012 num_tRNAs=41
+#   python result_store.py load --db magport.sqlite --table park_summary.tsv --key MAG --columns park_score:Park_Score
+#   python result_store.py export --db magport.sqlite --mags input_MAGs.txt --output MAGport_summary.tsv
+#   python result_store.py merge --db magport.sqlite --source watch/batches/mb000001/results/magport.sqlite
+#   python result_store.py query --db magport.sqlite "Completeness > 90 and MIMAG_level == 'HQ'" [--columns ID,N50] [--limit 20]
+
+"""Indexed per-MAG result store (SQLite)
+One row per MAG in the `results` table, keyed by ID, with one column per summary field
+(num_ORFs, Completeness, MIMAG_level, ...). Columns are added on first use and each one gets
+an index, so filters such as `Completeness > 90 and MIMAG_level == 'HQ'` are index lookups
+instead of a scan over thousands of per-MAG TSVs.
+
+put:    upsert fields of one MAG (one transaction; per-MAG rules call this)
+load:   upsert columns of an all-MAG TSV table (one transaction for the whole table)
+merge:  upsert every row of another store (a micro-batch or shard of the same project)
+export: stream the rows of the MAGs in input_MAGs.txt, in that order, as a TSV
+query:  filter with a Python-style expression (see compile_query)
+
+Numeric strings are stored as INTEGER/REAL so comparisons are numeric. The database runs in
+WAL mode with a busy timeout, so concurrent per-MAG jobs on one host just wait for each other;
+like any SQLite file it should sit on a local (or otherwise lock-safe) filesystem.
+"""
+
+"""results table sample
+ID	num_contigs	genome_size_bp	N50	GC	...	num_ORFs	Completeness	Contamination	...	MIMAG_level
+MAG1	40	2717783	136488	31.38	...	2530	99.82	0.31	...	MQ
+"""
+
+TABLE = "results"
+KEY = "ID"
+BUSY_TIMEOUT_MS = 600_000
+SUMMARY_COLUMNS = [
+    "ID", "num_contigs", "genome_size_bp", "N50", "GC", "sum_ambiguous_bases",
+    "num_ORFs", "Completeness", "Contamination", "pass_GUNC", "Park_Score", "MIMAG_level",
+    "num_tRNAs", "num_16S_rRNAs", "num_23S_rRNAs", "num_5S_rRNAs", "Domain", "16S_NCBI_taxonomy",
+    "16S_blastn_identity", "GTDB_taxonomy", "GTDB_novelty",
+]
+# appended to the summary only when some MAG has a value, e.g. inherited_from with dedup: true
+OPTIONAL_COLUMNS = ["inherited_from", "quality_gate"]
+# quality_gate: true leaves these empty for MAGs that failed the gate (quality_gate == SKIPPED);
+# the exported summary shows SKIPPED instead, the store keeps NULL so numeric filters still work
+GATED_COLUMNS = ["pass_GUNC", "num_tRNAs", "16S_NCBI_taxonomy", "16S_blastn_identity", "GTDB_taxonomy",
+                 "GTDB_novelty"]
+SKIPPED = "skipped_by_gate"
+# written by the per-MAG rules (put); restore_counts() reads them again from the rule outputs
+# ({directory key: (file suffix, columns)}) when the store lacks them
+PER_MAG_COLUMNS = ["num_ORFs", "num_tRNAs", "num_5S_rRNAs", "num_16S_rRNAs", "num_23S_rRNAs", "Domain_barrnap"]
+PER_MAG_OUTPUTS = {
+    "orfs": (".faa", ["num_ORFs"]),
+    "trna": (".trnascan.txt", ["num_tRNAs"]),
+    "rrna": (".rRNA.gff", ["num_5S_rRNAs", "num_16S_rRNAs", "num_23S_rRNAs"]),
+    "domain": (".domain.tsv", ["Domain_barrnap"]),
+}
+_INT = re.compile(r"[+-]?(0|[1-9][0-9]*)")
+_FLOAT = re.compile(r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?")
+
+
+def quote(name: str) -> str:
+    """SQL identifier, e.g. quote('16S_NCBI_taxonomy') -> '"16S_NCBI_taxonomy"'."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def coerce(value):
+    """Store numbers as numbers: "2530" -> 2530, "99.82" -> 99.82, "" -> None, "HQ" -> "HQ"."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    if _INT.fullmatch(value) and len(value) < 19:  # SQLite INTEGER is 64-bit
+        return int(value)
+    if _FLOAT.fullmatch(value):
+        return float(value)
+    return value
+
+
+def format_value(value) -> str:
+    return "" if value is None else str(value)
+
+
+def connect(db: Path) -> sqlite3.Connection:
+    db = Path(db)
+    db.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ({quote(KEY)} TEXT PRIMARY KEY)")
+    return conn
+
+
+def columns(conn: sqlite3.Connection) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+
+def _ensure_columns(conn: sqlite3.Connection, names: Iterable[str]) -> None:
+    """Add missing columns (with an index each); call inside a write transaction."""
+    existing = set(columns(conn))
+    for name in names:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {quote(name)}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {quote('idx_' + name)} ON {TABLE} ({quote(name)})")
+            existing.add(name)
+
+
+def upsert(conn: sqlite3.Connection, rows: Iterable[tuple[str, dict]], clear: Iterable[str] = ()) -> int:
+    """
+    Insert or update (ID, {column: value}) rows in one transaction; returns the number of rows.
+    Columns in `clear` are set to NULL for every MAG first, so MAGs missing from a reloaded
+    table do not keep stale values.
+    Example:
+        upsert(conn, [("MAG1", {"num_ORFs": "2530"})])
+    """
+    rows = list(rows)
+    clear = list(clear)
+    names = list(dict.fromkeys([*clear, *(k for _, fields in rows for k in fields)]))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _ensure_columns(conn, names)
+        if clear:
+            conn.execute(f"UPDATE {TABLE} SET " + ", ".join(f"{quote(c)} = NULL" for c in clear))
+        by_columns: dict[tuple, list] = {}
+        for mag, fields in rows:
+            by_columns.setdefault(tuple(fields), []).append((mag, *(coerce(v) for v in fields.values())))
+        for cols, values in by_columns.items():
+            sql = (f"INSERT INTO {TABLE} ({', '.join(quote(c) for c in (KEY, *cols))}) "
+                   f"VALUES ({', '.join('?' * (len(cols) + 1))})")
+            if cols:
+                sql += (f" ON CONFLICT({quote(KEY)}) DO UPDATE SET "
+                        + ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in cols))
+            else:
+                sql += f" ON CONFLICT({quote(KEY)}) DO NOTHING"
+            conn.executemany(sql, values)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def read_table(path: Path, key: str, mapping: dict[str, str]) -> Iterator[tuple[str, dict]]:
+    """(ID, {new name: value}) per row of a TSV with a header, renaming `mapping` columns."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f, delimiter='\t'):
+            mag = row.get(key)
+            if mag:
+                yield mag, {new: row.get(old, "") for old, new in mapping.items()}
+
+
+def read_mags(mags_txt: Path) -> list[str]:
+    with open(mags_txt) as f:
+        return [line.split('\t')[0].strip() for line in f if line.strip()]
+
+
+def count_output(kind: str, path: Path) -> dict:
+    """
+    Per-MAG columns of one rule output, counted the way the rule counts them before `put`.
+    Example:
+        count_output("rrna", Path("02_genes/rrna/MAG1.rRNA.gff"))
+        -> {"num_5S_rRNAs": 1, "num_16S_rRNAs": 1, "num_23S_rRNAs": 1}
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if kind == "orfs":
+        return {"num_ORFs": sum(line.startswith(">") for line in lines)}
+    if kind == "trna":
+        if lines and lines[0].startswith(f"# {SKIPPED}"):
+            return {}
+        return {"num_tRNAs": sum(not line.startswith("#") for line in lines)}
+    if kind == "rrna":
+        return {f"num_{name}_rRNAs": sum(name in line for line in lines) for name in ("5S", "16S", "23S")}
+    return {"Domain_barrnap": lines[1].split('\t')[0].strip() if len(lines) > 1 else ""}
+
+
+def restore_counts(conn: sqlite3.Connection, mags: list[str], dirs: dict[str, Path]) -> int:
+    """
+    Fill the PER_MAG_COLUMNS that are NULL for `mags` from the rule outputs in `dirs` ({"orfs":
+    ORF_DIR, ...}; kinds left out are not restored), so a deleted store or a MAG whose row was
+    removed while its outputs stayed up to date keeps its counts. Returns the number of MAGs filled.
+    """
+    wanted = [c for kind in dirs for c in PER_MAG_OUTPUTS[kind][1]]
+    restored = []
+    for mag, *values in list(export_rows(conn, mags, [KEY, *wanted])):
+        missing = {c for c, v in zip(wanted, values) if v is None}
+        fields = {}
+        for kind, directory in dirs.items():
+            suffix, cols = PER_MAG_OUTPUTS[kind]
+            if missing.intersection(cols):
+                try:
+                    fields.update(count_output(kind, Path(directory) / f"{mag}{suffix}"))
+                except OSError as e:
+                    print(f"[MAGport] Warning: cannot recount {mag}: {e}")
+        if fields:
+            restored.append((mag, fields))
+    if restored:
+        upsert(conn, restored)
+    return len(restored)
+
+
+def merge(conn: sqlite3.Connection, source: Path, mags: Optional[list[str]] = None) -> int:
+    """
+    Upsert the rows of the store `source` (only `mags` when given) in one transaction; returns
+    the number of rows. NULL fields in `source` overwrite existing values, so a re-processed
+    MAG does not keep results of its previous version; columns `source` lacks are left as they are.
+    """
+    conn.execute("ATTACH DATABASE ? AS src", (str(source),))
+    try:
+        src_cols = [row[1] for row in conn.execute(f"PRAGMA src.table_info({TABLE})")]
+        if not src_cols:
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _ensure_columns(conn, [c for c in src_cols if c != KEY])
+            where = "WHERE true"  # required by SQLite to parse ON CONFLICT after a SELECT
+            if mags is not None:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (mag TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM temp.keep")
+                conn.executemany("INSERT OR IGNORE INTO temp.keep VALUES (?)", ((m,) for m in mags))
+                where = f"WHERE {quote(KEY)} IN (SELECT mag FROM temp.keep)"
+            names = ", ".join(quote(c) for c in src_cols)
+            updates = ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in src_cols if c != KEY)
+            n = conn.execute(f"INSERT INTO main.{TABLE} ({names}) SELECT {names} FROM src.{TABLE} {where} "
+                             f"ON CONFLICT({quote(KEY)}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+    return n
+
+
+def summary_columns(conn: sqlite3.Connection) -> list[str]:
+    """SUMMARY_COLUMNS plus the OPTIONAL_COLUMNS that hold a value for at least one MAG."""
+    present = set(columns(conn))
+    return SUMMARY_COLUMNS + [c for c in OPTIONAL_COLUMNS if c in present and conn.execute(
+        f"SELECT 1 FROM {TABLE} WHERE {quote(c)} IS NOT NULL LIMIT 1").fetchone()]
+
+
+def export_rows(conn: sqlite3.Connection, mags: list[str], cols: list[str], skipped: bool = False) -> Iterator[tuple]:
+    """
+    Rows of `mags` (input order, NULL fields for MAGs without a row) streamed from the store.
+    skipped=True fills the empty GATED_COLUMNS of MAGs that failed the quality gate with SKIPPED.
+    """
+    present = set(columns(conn))
+
+    def field(c: str) -> str:
+        if c == KEY:
+            return "i.mag"
+        if c not in present:
+            return "NULL"
+        if skipped and c in GATED_COLUMNS and "quality_gate" in present:
+            return f"COALESCE(r.{quote(c)}, CASE WHEN r.quality_gate = '{SKIPPED}' THEN '{SKIPPED}' END)"
+        return f"r.{quote(c)}"
+
+    select = ", ".join(field(c) for c in cols)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS inputs (ord INTEGER PRIMARY KEY, mag TEXT)")
+    conn.execute("DELETE FROM temp.inputs")
+    conn.executemany("INSERT INTO temp.inputs (mag) VALUES (?)", ((m,) for m in mags))
+    sql = (f"SELECT {select} FROM temp.inputs i "
+           f"LEFT JOIN {TABLE} r ON r.{quote(KEY)} = i.mag ORDER BY i.ord")
+    yield from conn.execute(sql)
+
+
+def write_tsv(out, columns: list[str], rows: Iterable[tuple], header: bool = True) -> int:
+    w = csv.writer(out, delimiter='\t', lineterminator='\n')
+    if header:
+        w.writerow(columns)
+    n = 0
+    for row in rows:
+        w.writerow([format_value(v) for v in row])
+        n += 1
+    return n
+
+
+class QueryError(ValueError):
+    pass
+
+
+_OPS = {ast.Eq: "=", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+_FUNCTIONS = {"contains": "instr({0}, {1}) > 0", "startswith": "instr({0}, {1}) = 1"}
+
+
+def compile_query(expr: str, known: list[str]) -> tuple[str, list, list[str]]:
+    """
+    Translate a Python-style filter into a parameterised SQL WHERE clause.
+    Supported: and/or/not, ==, !=, <, <=, >, >= (chained too), in/not in a list, `is None`,
+    contains(col, "text") and startswith(col, "text"). Column names that are not Python
+    identifiers go in backticks, as in pandas. Ordered comparisons with a number only match
+    numeric values, so "NA" never passes `Park_Score > 80`.
+    Returns (where, parameters, referenced columns).
+    Example:
+        compile_query("Completeness > 90 and MIMAG_level == 'HQ'", cols)
+        -> ('("Completeness" > ? AND typeof("Completeness") IN (\'integer\', \'real\')) AND "MIMAG_level" = ?',
+            [90, 'HQ'], ['Completeness', 'MIMAG_level'])
+    """
+    backticks: dict[str, str] = {}
+
+    def _unquote(m: re.Match) -> str:
+        alias = f"__col{len(backticks)}__"
+        backticks[alias] = m.group(1)
+        return alias
+
+    source = re.sub(r"`([^`]+)`", _unquote, expr.strip())
+    try:
+        tree = ast.parse(source, mode="eval").body
+    except SyntaxError as e:
+        raise QueryError(f"cannot parse query {expr!r}: {e.msg}") from None
+    params: list = []
+    used: list[str] = []
+
+    def column(node: ast.AST) -> Optional[str]:
+        if isinstance(node, ast.Name):
+            name = backticks.get(node.id, node.id)
+            if name not in known:
+                raise QueryError(f"unknown column {name!r}; available: {', '.join(known)}")
+            if name not in used:
+                used.append(name)
+            return quote(name)
+        return None
+
+    def operand(node: ast.AST) -> str:
+        col = column(node)
+        if col:
+            return col
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            node = ast.Constant(-node.operand.value)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) and not isinstance(node.value, bool):
+            params.append(node.value)
+            return "?"
+        raise QueryError(f"unsupported value: {ast.unparse(node)}")
+
+    def is_number(node: ast.AST) -> bool:
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            node = node.operand
+        return isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+
+    def compare(left: ast.AST, op: ast.cmpop, right: ast.AST) -> str:
+        if isinstance(op, (ast.Is, ast.IsNot)):
+            if not (isinstance(right, ast.Constant) and right.value is None):
+                raise QueryError("`is` only works with None")
+            return f"{operand(left)} IS {'NOT ' if isinstance(op, ast.IsNot) else ''}NULL"
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                raise QueryError("`in` needs a list, e.g. MIMAG_level in ['HQ', 'MQ']")
+            values = ", ".join(operand(v) for v in right.elts) or "NULL"
+            return f"{operand(left)} {'NOT ' if isinstance(op, ast.NotIn) else ''}IN ({values})"
+        if type(op) not in _OPS:
+            raise QueryError(f"unsupported operator: {type(op).__name__}")
+        sql = f"{operand(left)} {_OPS[type(op)]} {operand(right)}"
+        if type(op) in (ast.Lt, ast.LtE, ast.Gt, ast.GtE):
+            guard = left if is_number(right) else right if is_number(left) else None
+            col = column(guard) if guard is not None else None
+            if col:
+                sql = f"({sql} AND typeof({col}) IN ('integer', 'real'))"
+        return sql
+
+    def visit(node: ast.AST) -> str:
+        if isinstance(node, ast.BoolOp):
+            joiner = " AND " if isinstance(node.op, ast.And) else " OR "
+            return "(" + joiner.join(visit(v) for v in node.values) + ")"
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return f"NOT ({visit(node.operand)})"
+        if isinstance(node, ast.Compare):
+            parts, left = [], node.left
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(compare(left, op, right))
+                left = right
+            return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+                and len(node.args) == 2 and not node.keywords):
+            col = column(node.args[0])
+            if not col:
+                raise QueryError(f"{node.func.id}() needs a column as first argument")
+            arg = operand(node.args[1])
+            return "(" + _FUNCTIONS[node.func.id].format(col, arg) + ")"
+        raise QueryError(f"unsupported expression: {ast.unparse(node)}")
+
+    where = visit(tree)
+    if where.startswith("(") and isinstance(tree, ast.BoolOp):
+        where = where[1:-1]
+    return where, params, used
+
+
+def query(conn: sqlite3.Connection, expr: str = "", cols: Optional[list[str]] = None,
+          limit: Optional[int] = None, sort: Optional[str] = None, descending: bool = False) -> tuple[list[str], list[tuple]]:
+    """
+    Rows matching `expr` (all rows when empty), ordered by `sort` (default ID).
+    Example:
+        query(conn, "Completeness > 90 and MIMAG_level == 'HQ'", ["ID", "Completeness"], limit=5)
+        -> (['ID', 'Completeness'], [('MAG1', 99.82), ...])
+    """
+    known = columns(conn)
+    where, params, _ = compile_query(expr, known) if expr.strip() else ("", [], [])
+    cols = cols or [c for c in SUMMARY_COLUMNS if c in known] + [c for c in known if c not in SUMMARY_COLUMNS]
+    missing = [c for c in [*cols, *([sort] if sort else [])] if c not in known]
+    if missing:
+        raise QueryError(f"unknown column(s) {', '.join(missing)}; available: {', '.join(known)}")
+    sql = f"SELECT {', '.join(quote(c) for c in cols)} FROM {TABLE}"
+    if where:
+        sql += f" WHERE {where}"
+    sql += f" ORDER BY {quote(sort or KEY)}{' DESC' if descending else ''}"
+    if limit:
+        sql += " LIMIT ?"
+        params = [*params, limit]
+    return cols, conn.execute(sql, params).fetchall()
+
+
+def _parse_pairs(pairs: list[str], sep: str) -> dict[str, str]:
+    out = {}
+    for pair in pairs:
+        k, found, v = pair.partition(sep)
+        if not found:
+            raise SystemExit(f"expected key{sep}value, got {pair!r}")
+        out[k] = v
+    return out
+
+
+def main(args) -> None:
+    conn = connect(args.db)
+    if args.command == "put":
+        upsert(conn, [(args.id, _parse_pairs(args.fields, '='))])
+    elif args.command == "load":
+        mapping = _parse_pairs(args.columns, ':')
+        n = upsert(conn, read_table(args.table, args.key, mapping), clear=mapping.values())
+        print(f"Loaded {n} rows of {args.table} into {args.db}")
+    elif args.command == "merge":
+        n = sum(merge(conn, source) for source in args.source)
+        print(f"Merged {n} rows into {args.db}")
+    elif args.command == "export":
+        cols = args.columns.split(',') if args.columns else summary_columns(conn)
+        with open(args.output, 'w', newline='') as out:
+            n = write_tsv(out, cols, export_rows(conn, read_mags(args.mags), cols, skipped=True))
+        print(f"Exported {n} MAGs to {args.output}")
+    elif args.command == "query":
+        try:
+            cols, rows = query(conn, args.expr, args.columns.split(',') if args.columns else None, args.limit)
+        except QueryError as e:
+            raise SystemExit(f"Error: {e}")
+        write_tsv(sys.stdout, cols, rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-MAG result store of MAGport (SQLite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("put", help="Upsert fields of one MAG")
+    p.add_argument("--db", type=Path, required=True, help="Result store (magport.sqlite)")
+    p.add_argument("--id", required=True, help="MAG ID")
+    p.add_argument("fields", nargs='+', help="column=value pairs")
+
+    p = sub.add_parser("load", help="Upsert columns of an all-MAG TSV table")
+    p.add_argument("--db", type=Path, required=True, help="Result store (magport.sqlite)")
+    p.add_argument("--table", type=Path, required=True, help="TSV table with a header")
+    p.add_argument("--key", required=True, help="Column holding the MAG ID")
+    p.add_argument("--columns", nargs='+', required=True, help="source:store column pairs")
+
+    p = sub.add_parser("merge", help="Upsert every row of other result stores")
+    p.add_argument("--db", type=Path, required=True, help="Result store (magport.sqlite)")
+    p.add_argument("--source", type=Path, nargs='+', required=True, help="Stores to merge in")
+
+    p = sub.add_parser("export", help="Write the rows of input_MAGs.txt as a TSV")
+    p.add_argument("--db", type=Path, required=True, help="Result store (magport.sqlite)")
+    p.add_argument("--mags", type=Path, required=True, help="input_MAGs.txt file")
+    p.add_argument("--output", type=Path, required=True, help="Output TSV file")
+    p.add_argument("--columns", help="Comma-separated columns (default: the summary columns)")
+
+    p = sub.add_parser("query", help="Filter MAGs, e.g. \"Completeness > 90 and MIMAG_level == 'HQ'\"")
+    p.add_argument("--db", type=Path, required=True, help="Result store (magport.sqlite)")
+    p.add_argument("expr", nargs='?', default="", help="Filter expression")
+    p.add_argument("--columns", help="Comma-separated columns to print")
+    p.add_argument("--limit", type=int, help="At most this many rows")
+
+    main(parser.parse_args())
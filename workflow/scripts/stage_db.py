@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Usage:
+#   python stage_db.py stage --name gunc --source /shared/db/gunc_db/gunc_db_gtdb95.dmnd --scratch /local/magport_db \
+#          [--max-gb 200 --checksum --threads 8]
+#   python stage_db.py verify --source /shared/db/gunc_db/gunc_db_gtdb95.dmnd --scratch /local/magport_db [--checksum]
+#   python stage_db.py evict --scratch /local/magport_db --max-gb 200
+
+"""Node-local staging of the reference databases
+stage:  print the path of a local copy of --source under --scratch, copying it first if this
+        node has no valid copy yet. The copy goes to a temporary directory and is renamed into
+        place once complete, under a per-database lock, so concurrent jobs on one node copy a
+        database once and never see a partial copy. If the copy cannot be made (e.g. not
+        enough space), the source path is printed instead.
+verify: check the staged copies of --source against their manifests (sizes, and SHA-256 with
+        --checksum); invalid or outdated copies are removed so the next job stages it again
+evict:  remove copies of changed sources, then least recently used copies until the scratch
+        directory is below --max-gb
+
+Copies are keyed by the source path and its signature (name, size and mtime of the file, or of
+the top-level entries of a directory), so a changed source is staged next to the old copy
+instead of replacing it: tools such as GTDB-Tk open database files by path while they run.
+Jobs hold a shared flock on the staged path while the tool runs; eviction skips copies that are
+locked or were used in the last GRACE_S seconds, and removes outdated ones once they are free.
+"""
+
+"""scratch layout
+{scratch}/{key}/manifest.json          source, signature, bytes, files {relpath: [size, sha256]}
+{scratch}/{key}/last_used              touched by every stage call (LRU order)
+{scratch}/{key}/{basename}             the database file or directory
+{scratch}/.{key}.lock, .evict.lock     flock files
+{scratch}/.{key}.tmp.{pid}/            copy in progress
+key = {name}-{sha1(source path, signature)[:12]}
+"""
+
+MANIFEST = "manifest.json"
+LAST_USED = "last_used"
+COPY_BLOCK = 16 * 1024 * 1024
+GRACE_S = 300
+
+
+class Locked:
+    """flock on `path` (created if missing), exclusive unless shared=True; blocking unless wait=False."""
+
+    def __init__(self, path: Path, shared: bool = False, wait: bool = True):
+        self.path, self.shared, self.wait = path, shared, wait
+        self.fd = None
+
+    def __enter__(self) -> bool:
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | (0 if self.wait else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(self.fd, flags)
+            return True
+        except BlockingIOError:
+            return False
+
+    def __exit__(self, *exc) -> None:
+        os.close(self.fd)
+
+
+def in_use(path: Path) -> bool:
+    """True if a job holds a shared flock on the staged database `path`."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+
+def entry_key(name: str, source: Path, sig: list) -> str:
+    """e.g. entry_key("gunc", Path("/db/gunc_db_gtdb95.dmnd"), signature(...)) -> 'gunc-3f0c2a1b9d4e'"""
+    return f"{name}-{hashlib.sha1(json.dumps([str(source), sig]).encode()).hexdigest()[:12]}"
+
+
+def signature(source: Path) -> list:
+    """Cheap identity of the source: name, size and mtime of the file or of the top-level entries of a directory."""
+    if source.is_file():
+        st = source.stat()
+        return [[source.name, st.st_size, st.st_mtime_ns]]
+    entries = []
+    with os.scandir(source) as it:
+        for e in it:
+            st = e.stat()
+            entries.append([e.name, st.st_size if e.is_file() else -1, st.st_mtime_ns])
+    return sorted(entries)
+
+
+def superseded(manifest: dict) -> bool:
+    """True if the source of a staged copy changed since (a newer copy has another key); False if it is unreachable."""
+    try:
+        return signature(Path(manifest["source"])) != manifest["signature"]
+    except OSError:
+        return False
+
+
+def list_files(source: Path) -> list[tuple[str, int]]:
+    """(path relative to the source's parent, size) of every file of the database."""
+    if source.is_file():
+        return [(source.name, source.stat().st_size)]
+    files = []
+    for root, _, names in os.walk(source, followlinks=True):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, source.parent), os.stat(path).st_size))
+    return sorted(files)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def copy_file(src: Path, dst: Path, checksum: bool) -> str | None:
+    """Copy src to dst, hashing the source stream with checksum=True; returns the hex digest or None."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256() if checksum else None
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        for block in iter(lambda: fin.read(COPY_BLOCK), b""):
+            fout.write(block)
+            if h:
+                h.update(block)
+    shutil.copystat(src, dst)
+    return h.hexdigest() if h else None
+
+
+def read_manifest(entry: Path) -> dict | None:
+    try:
+        with open(entry / MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check_copy(entry: Path, manifest: dict, checksum: bool) -> list[str]:
+    """Problems of a staged copy against its manifest, [] if it is intact."""
+    problems = []
+    for rel, (size, digest) in manifest["files"].items():
+        path = entry / rel
+        if not path.is_file():
+            problems.append(f"missing {rel}")
+        elif path.stat().st_size != size:
+            problems.append(f"size of {rel}: {path.stat().st_size} != {size}")
+        elif checksum and digest and file_sha256(path) != digest:
+            problems.append(f"checksum of {rel} differs")
+    return problems
+
+
+def remove_entry(entry: Path) -> None:
+    """
+    Rename out of the way first, so a half-removed copy is never taken for a staged one. Callers
+    hold the entry's lock and check that no job uses it.
+    """
+    if not entry.exists():
+        return
+    trash = entry.with_name(f".{entry.name}.trash.{os.getpid()}")
+    os.rename(entry, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def entries(scratch: Path) -> list[tuple[float, int, Path, dict]]:
+    """(last used, bytes, entry dir, manifest) of every staged copy, least recently used first."""
+    found = []
+    for entry in scratch.iterdir():
+        if entry.name.startswith(".") or not entry.is_dir():
+            continue
+        manifest = read_manifest(entry)
+        if manifest is None:
+            continue
+        try:
+            used = (entry / LAST_USED).stat().st_mtime
+        except OSError:
+            used = 0.0
+        found.append((used, manifest.get("bytes", 0), entry, manifest))
+    return sorted(found, key=lambda e: e[0])
+
+
+def evict(scratch: Path, max_bytes: float, keep: str = "") -> tuple[int, int]:
+    """
+    Drop copies of changed sources, then least recently used copies, until the total is below
+    max_bytes; `keep` and copies in use stay. Returns (removed, freed).
+    """
+    removed = freed = 0
+    with Locked(scratch / ".evict.lock"):
+        # copies left behind by killed stage calls
+        for tmp in scratch.glob(".*.tmp.*"):
+            key = tmp.name[1:].split(".tmp.")[0]
+            with Locked(scratch / f".{key}.lock", wait=False) as free:
+                if free:
+                    shutil.rmtree(tmp, ignore_errors=True)
+        found = entries(scratch)
+        total = sum(size for _, size, _, _ in found)
+        now = time.time()
+        # outdated copies first, then least recently used ones
+        outdated = {entry for _, _, entry, manifest in found if superseded(manifest)}
+        found.sort(key=lambda e: e[2] not in outdated)
+        for used, size, entry, manifest in found:
+            if total <= max_bytes and entry not in outdated:
+                break
+            if entry.name == keep or now - used < GRACE_S:
+                continue
+            with Locked(scratch / f".{entry.name}.lock", wait=False) as free:
+                if not free or in_use(entry / manifest["target"]):
+                    continue
+                remove_entry(entry)
+            total -= size
+            freed += size
+            removed += 1
+    return removed, freed
+
+
+def stage(source: Path, name: str, scratch: Path, max_gb: float, checksum: bool, threads: int) -> Path:
+    """Local copy of `source` (staged now if needed), or `source` itself if it cannot be staged."""
+    source, scratch = source.resolve(), scratch.absolute()
+    scratch.mkdir(parents=True, exist_ok=True)
+    current = signature(source)
+    key = entry_key(name, source, current)
+    entry = scratch / key
+    with Locked(scratch / f".{key}.lock"):
+        manifest = read_manifest(entry)
+        if manifest and not check_copy(entry, manifest, checksum=False):
+            (entry / LAST_USED).touch()
+            evict(scratch, float("inf"), keep=key)  # copies of earlier source versions no job uses anymore
+            return entry / manifest["target"]
+        if manifest and in_use(entry / manifest["target"]):
+            print(f"[stage_db] Staged copy {entry} is damaged but in use; using {source}", file=sys.stderr)
+            return source
+
+        files = list_files(source)
+        needed = sum(size for _, size in files)
+        evict(scratch, max_gb * 1024 ** 3 - needed if max_gb > 0 else float("inf"), keep=key)
+        if shutil.disk_usage(scratch).free < needed:
+            print(f"[stage_db] Not enough space in {scratch} for {name} ({needed / 1024 ** 3:.1f} GB); "
+                  f"using {source}", file=sys.stderr)
+            return source
+
+        start = time.time()
+        tmp = scratch / f".{key}.tmp.{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+                digests = list(pool.map(lambda f: copy_file(source.parent / f[0], tmp / f[0], checksum), files))
+            manifest = {"name": name, "source": str(source), "target": source.name, "signature": current,
+                        "bytes": needed, "staged_at": time.time(),
+                        "files": {rel: [size, digest] for (rel, size), digest in zip(files, digests)}}
+            problems = check_copy(tmp, manifest, checksum)
+            if problems:
+                raise OSError("; ".join(problems[:5]))
+            with open(tmp / MANIFEST, 'w') as f:
+                json.dump(manifest, f)
+            (tmp / LAST_USED).touch()
+            remove_entry(entry)
+            os.rename(tmp, entry)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print(f"[stage_db] Staging {name} to {scratch} failed ({e}); using {source}", file=sys.stderr)
+            return source
+        print(f"[stage_db] Staged {name}: {len(files)} files, {needed / 1024 ** 3:.2f} GB in "
+              f"{time.time() - start:.0f} s -> {entry}", file=sys.stderr)
+        return entry / manifest["target"]
+
+
+def verify(source: Path, name: str, scratch: Path, checksum: bool) -> list[str]:
+    """
+    Problems of this node's staged copies of `source` ([] if they are valid or none is staged);
+    invalid copies and copies of an earlier version of the source are removed unless in use.
+    """
+    source = source.resolve()
+    if not scratch.is_dir():
+        return []
+    problems = []
+    for _, _, entry, manifest in entries(scratch):
+        if manifest.get("name") != name or manifest["source"] != str(source):
+            continue
+        with Locked(scratch / f".{entry.name}.lock"):
+            manifest = read_manifest(entry)
+            if manifest is None:
+                continue
+            found = check_copy(entry, manifest, checksum)
+            if superseded(manifest):
+                found.insert(0, f"source {source} changed since {entry.name} was staged")
+            if found and not in_use(entry / manifest["target"]):
+                remove_entry(entry)
+            problems += found
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage reference databases to node-local scratch")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_stage = sub.add_parser("stage", help="Print the path of a local copy of a database, staging it if needed")
+    p_stage.add_argument("--source", type=Path, required=True, help="Database file or directory on shared storage")
+    p_stage.add_argument("--name", required=True, help="Database name (checkm2, gunc, gtdbtk, ncbi16s)")
+    p_stage.add_argument("--scratch", type=Path, required=True, help="Node-local staging directory")
+    p_stage.add_argument("--max-gb", type=float, default=0, help="Evict least recently used copies above this size (0: no limit)")
+    p_stage.add_argument("--checksum", action="store_true", help="Verify the copy with SHA-256 instead of sizes only")
+    p_stage.add_argument("--threads", type=int, default=4, help="Files copied in parallel")
+
+    p_verify = sub.add_parser("verify", help="Check a staged copy against its manifest")
+    p_verify.add_argument("--source", type=Path, required=True)
+    p_verify.add_argument("--name", required=True)
+    p_verify.add_argument("--scratch", type=Path, required=True)
+    p_verify.add_argument("--checksum", action="store_true")
+
+    p_evict = sub.add_parser("evict", help="Remove least recently used copies")
+    p_evict.add_argument("--scratch", type=Path, required=True)
+    p_evict.add_argument("--max-gb", type=float, required=True)
+
+    args = parser.parse_args()
+    if args.command == "stage":
+        try:
+            path = stage(args.source, args.name, args.scratch, args.max_gb, args.checksum, args.threads)
+        except OSError as e:  # scratch not writable, lock unavailable, ...
+            print(f"[stage_db] Cannot stage {args.name} to {args.scratch} ({e}); using {args.source}", file=sys.stderr)
+            path = args.source
+        print(path)
+    elif args.command == "verify":
+        problems = verify(args.source, args.name, args.scratch, args.checksum)
+        for problem in problems:
+            print(f"[stage_db] {args.name}: {problem}")
+        sys.exit(1 if problems else 0)
+    else:
+        removed, freed = evict(args.scratch, args.max_gb * 1024 ** 3)
+        print(f"[stage_db] Evicted {removed} staged databases ({freed / 1024 ** 3:.2f} GB freed)")